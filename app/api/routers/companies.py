@@ -0,0 +1,110 @@
+from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from app.core.config import SCHEDULER_MODE
+from app.core.dependencies import get_itk_service
+from app.models.company import Company, CompanyAdded, CompanyCreate, CompanyScrape, CompanyUpdate, CompanyURLs
+from app.services.itk_service import ITKService
+
+router = APIRouter(prefix="/companies", tags=["Companies"])
+
+
+def _scrape(background_tasks: BackgroundTasks, itk_service: ITKService, urls: List[str]) -> CompanyScrape:
+    """Start scraping the URLs, or queue them for the scheduler, and say which job they are in"""
+    job, created = itk_service.create_scrape_job(trigger="api", urls=urls)
+    active = itk_service.jobs.active()
+    if not created:
+        message = f"The URLs are already in scrape job {job.id}, which is {job.status}"
+    elif active is not None and active.id != job.id:
+        message = f"Scrape job queued behind scrape job {active.id}"
+    elif SCHEDULER_MODE != "embedded":
+        message = "Scrape job queued for the scheduler"
+    else:
+        message = "Scraping started"
+    if created and SCHEDULER_MODE == "embedded":
+        background_tasks.add_task(itk_service.run_scrape_job, job.id)
+    return CompanyScrape(job_id=job.id, status=job.status, created=created, message=message)
+
+
+@router.get("", response_model=List[Company])
+async def list_companies(
+    itk_service: ITKService = Depends(get_itk_service),
+):
+    return await itk_service.companies.list_items()
+
+@router.post("", response_model=CompanyAdded, status_code=201)
+async def add_company(
+    company: CompanyCreate,
+    background_tasks: BackgroundTasks,
+    scrape: bool = Query(False, description="scrape the new URLs now instead of at the next scheduled scrape"),
+    itk_service: ITKService = Depends(get_itk_service),
+):
+    """Add a company, or add URLs to a company already registered under the same name"""
+    existing = await itk_service.companies.get_item(company.name)
+    known = set(existing["urls"]) if existing else set()
+    try:
+        added = await itk_service.add_company(company.name, company.urls)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    new_urls = [url for url in added["urls"] if url not in known]
+    if scrape and new_urls:
+        added["scrape"] = _scrape(background_tasks, itk_service, new_urls)
+    return added
+
+@router.get("/{company_id}", response_model=Company)
+async def get_company(
+    company_id: str,
+    itk_service: ITKService = Depends(get_itk_service),
+):
+    company = await itk_service.companies.get_item(company_id)
+    if company is None:
+        raise HTTPException(status_code=404, detail=f"Company {company_id} not found")
+    return company
+
+@router.patch("/{company_id}", response_model=Company)
+async def update_company(
+    company_id: str,
+    updates: CompanyUpdate,
+    itk_service: ITKService = Depends(get_itk_service),
+):
+    try:
+        return await itk_service.update_company(company_id, updates.model_dump(exclude_none=True))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Company {company_id} not found")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.delete("/{company_id}", status_code=204)
+async def remove_company(
+    company_id: str,
+    purge: bool = Query(False, description="also delete the company's stored chunks"),
+    itk_service: ITKService = Depends(get_itk_service),
+):
+    if not await itk_service.remove_company(company_id, purge=purge):
+        raise HTTPException(status_code=404, detail=f"Company {company_id} not found")
+
+@router.post("/{company_id}/urls", response_model=Company)
+async def add_urls(
+    company_id: str,
+    body: CompanyURLs,
+    itk_service: ITKService = Depends(get_itk_service),
+):
+    company = await itk_service.companies.get_item(company_id)
+    if company is None:
+        raise HTTPException(status_code=404, detail=f"Company {company_id} not found")
+    try:
+        return await itk_service.add_company(company["name"], body.urls)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.delete("/{company_id}/urls", response_model=Company)
+async def remove_urls(
+    company_id: str,
+    url: List[str] = Query(..., description="URL to stop scraping; repeat for several"),
+    itk_service: ITKService = Depends(get_itk_service),
+):
+    """Stop scraping URLs for a company. Chunks already stored from them are kept"""
+    try:
+        return await itk_service.remove_company_urls(company_id, url)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Company {company_id} not found")
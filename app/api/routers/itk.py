@@ -1,24 +1,56 @@
-from typing import Optional, Literal
-from fastapi import APIRouter, Depends, HTTPException, Form
+import json
+from typing import List, Optional, Literal
+from fastapi import APIRouter, Depends, File, HTTPException, Form, UploadFile
+from fastapi.responses import StreamingResponse
 from app.core.dependencies import get_itk_service
 from app.services.itk_service import ITKService
 from app.utils.logging import logger
-from app.utils.helpers import get_companies_from_csv
+from app.utils.helpers import read_batch_requests, sse_event
 
 router = APIRouter(prefix="/itk", tags=["ITK"])
-companies = get_companies_from_csv("sample_data/companies.csv")
+
+
+def known_companies(itk_service: ITKService = Depends(get_itk_service)) -> List[str]:
+    """Companies that can be chatted about, as registered now"""
+    return itk_service.companies.names()
+
+
+def _check_companies(names: List[Optional[str]], companies: List[str]):
+    """Reject company names outside the known companies"""
+    unknown = [name for name in names if name and name not in companies]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown company: {', '.join(unknown)}")
 
 
 @router.post("/chat")
 async def chat_itk(
     query: str = Form(..., description="query"),
-    company_name: Optional[Literal[*companies]] = Form(None, description="company"),
+    company_name: Optional[str] = Form(None, description="company"),
+    company_names: Optional[List[str]] = Form(
+        None, alias="companies", description="companies to search when no single company is given"
+    ),
+    stream: bool = Form(False, description="stream the answer as Server-Sent Events"),
+    mode: Optional[Literal["structured", "direct"]] = Form(
+        None, description="direct skips the intermediate summaries when the context fits the token budget"
+    ),
     itk_service: ITKService = Depends(get_itk_service),
+    companies: List[str] = Depends(known_companies),
 ):
+    _check_companies([company_name, *(company_names or [])], companies)
+
+    if stream:
+        return StreamingResponse(
+            _stream_chat(itk_service, query, company_name, mode, company_names),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
     try:        
         response = await itk_service.chat(
             query=query,
-            company_name=company_name
+            company_name=company_name,
+            mode=mode,
+            companies=company_names
         )
         return response
         
@@ -26,6 +58,51 @@ async def chat_itk(
         logger.error(f"Error chatting with ITK")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/chat/batch")
+async def chat_batch_itk(
+    file: UploadFile = File(..., description='JSONL file with one {"query", "company", "id"} object per line'),
+    mode: Optional[Literal["structured", "direct"]] = Form(
+        None, description="direct skips the intermediate summaries when the context fits the token budget"
+    ),
+    itk_service: ITKService = Depends(get_itk_service),
+    companies: List[str] = Depends(known_companies),
+):
+    try:
+        content = (await file.read()).decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Batch file must be UTF-8 encoded JSONL")
+
+    requests, invalid = read_batch_requests(content.splitlines(), companies)
+    return StreamingResponse(
+        _stream_batch(itk_service, requests, invalid, mode),
+        media_type="application/x-ndjson"
+    )
+
+async def _stream_batch(itk_service: ITKService, requests, invalid, mode: Optional[str]):
+    """Write one JSON result per line as each window of the batch completes"""
+    for result in invalid:
+        yield result.model_dump_json() + "\n"
+    try:
+        async for result in itk_service.chat_batch(requests, mode=mode):
+            yield result.model_dump_json() + "\n"
+
+    except Exception as e:
+        logger.error(f"Error running ITK chat batch: {str(e)}")
+        yield json.dumps({"error": str(e)}) + "\n"
+
+async def _stream_chat(itk_service: ITKService, query: str, company_name: Optional[str], mode: Optional[str],
+                       company_names: Optional[List[str]] = None):
+    """Relay answer tokens as `token` events, ending with `done` or `error`"""
+    try:
+        async for token in itk_service.chat_stream(query=query, company_name=company_name, mode=mode,
+                                                   companies=company_names):
+            yield sse_event({"token": token}, event="token")
+        yield sse_event({}, event="done")
+
+    except Exception as e:
+        logger.error(f"Error streaming chat with ITK: {str(e)}")
+        yield sse_event({"detail": str(e)}, event="error")
+
 def itk_banner():
     return """
 ██╗████████╗██╗  ██╗
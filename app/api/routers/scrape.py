@@ -1,5 +1,9 @@
+from typing import List
 from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
+from app.core.config import SCHEDULER_MODE
 from app.core.dependencies import get_itk_service
+from app.models.job import ScrapeJob
+from app.models.scrape import FetchFailure
 from app.services.itk_service import ITKService
 from app.utils.logging import logger
 
@@ -11,12 +15,58 @@ async def scrape(
     itk_service: ITKService = Depends(get_itk_service),
 ):
     try:    
-        background_tasks.add_task(
-            itk_service.scrape_and_store_data, 
-            "sample_data/companies.csv"
-        )
-        return {"message": "Scraping triggered successfully"}
+        job, created = itk_service.create_scrape_job(trigger="api")
+        if SCHEDULER_MODE != "embedded":
+            # Leave the scraping to the process running the scheduler, which polls for jobs
+            return {"message": "Scrape job queued for the scheduler", "job_id": job.id}
+        # Joining an active job picks up any shard whose worker has died
+        background_tasks.add_task(itk_service.run_scrape_job, job.id)
+        active = itk_service.jobs.active()
+        if created and active is not None and active.id != job.id:
+            return {"message": f"Scrape job queued behind scrape job {active.id}", "job_id": job.id}
+        if created:
+            return {"message": "Scraping triggered successfully", "job_id": job.id}
+        return {"message": f"Scrape job already {job.status}, joined it", "job_id": job.id}
     
     except Exception as e:
         logger.error(f"Error scraping and storing data: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs", response_model=List[ScrapeJob])
+async def list_jobs(
+    limit: int = 20,
+    itk_service: ITKService = Depends(get_itk_service),
+):
+    return itk_service.jobs.recent(limit)
+
+@router.get("/jobs/{job_id}", response_model=ScrapeJob)
+async def job_status(
+    job_id: str,
+    itk_service: ITKService = Depends(get_itk_service),
+):
+    job = itk_service.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Scrape job {job_id} not found")
+    return job
+
+@router.get("/failures", response_model=List[FetchFailure])
+async def list_failures(
+    limit: int = 100,
+    failing_only: bool = True,
+    itk_service: ITKService = Depends(get_itk_service),
+):
+    return itk_service.ledger.failures(limit, failing_only=failing_only)
+
+@router.post("/retry")
+async def retry(
+    background_tasks: BackgroundTasks,
+    itk_service: ITKService = Depends(get_itk_service),
+):
+    due = itk_service.ledger.due_retries()
+    if not due:
+        return {"message": "No failed URLs are due a retry"}
+    if SCHEDULER_MODE != "embedded":
+        job, _ = itk_service.create_scrape_job(trigger="api", urls=due)
+        return {"message": f"Retry of {len(due)} failed URLs queued for the scheduler", "job_id": job.id}
+    background_tasks.add_task(itk_service.retry_failed_urls, "api")
+    return {"message": f"Retrying {len(due)} failed URLs"}
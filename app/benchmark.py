@@ -0,0 +1,335 @@
+"""
+Offline throughput benchmark.
+
+Runs `ITKService.scrape_and_store_data` and `ITKService.chat` against local stand-ins:
+an aiohttp server serving synthetic company sites, some pages of which answer with a
+non-200 to exercise the browser fallback, and fake embeddings, chat model and web
+search with configurable latency. State is written to a temporary directory, so the
+real ./data and ./chroma_db are never touched and nothing is sent over the network.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from aiohttp import ClientSession, web
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+WORDS = (
+    "market revenue growth payments lending customers platform merchants funding regulation product launch "
+    "partnership expansion subscribers analytics settlement transfers savings credit insurance wallet "
+    "infrastructure compliance quarterly investors acquisition banking retail enterprise mobile"
+).split()
+
+
+class FakeSites:
+    """Synthetic company sites served by a local aiohttp server"""
+
+    def __init__(self, sites: int, pages: int, words: int, blocked_ratio: float, latency: float, seed: int = 0):
+        self.sites = sites
+        self.pages = pages
+        self.words = words
+        self.latency = latency
+        rng = random.Random(seed)
+        self.blocked = {
+            (site, page) for site in range(sites) for page in range(pages) if rng.random() < blocked_ratio
+        }
+        self.url = None
+        self._runner = None
+
+    @staticmethod
+    def company(site: int) -> str:
+        return f"Company{site:04d}"
+
+    def page_html(self, site: int, page: int) -> str:
+        rng = random.Random(site * 100003 + page)
+        company = self.company(site)
+        paragraphs = []
+        for _ in range(max(1, self.words // 60)):
+            paragraphs.append(" ".join(rng.choice(WORDS) for _ in range(60)))
+        body = "".join(f"<p>{company} {text}.</p>" for text in paragraphs)
+        return (
+            f"<html><head><title>{company} page {page}</title></head><body>"
+            f"<nav><a href='/'>Home</a> <a href='/about'>About</a> <a href='/contact'>Contact</a></nav>"
+            f"<main><h1>{company} update {page}</h1>{body}</main>"
+            f"<footer>Copyright {company}. All rights reserved.</footer></body></html>"
+        )
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        site, page = int(request.match_info["site"]), int(request.match_info["page"])
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        status = 403 if (site, page) in self.blocked else 200
+        return web.Response(text=self.page_html(site, page), status=status, content_type="text/html")
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        app = web.Application()
+        app.router.add_get("/site{site:\\d+}/page{page:\\d+}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def rows(self) -> Iterator[Tuple[str, str]]:
+        for site in range(self.sites):
+            for page in range(self.pages):
+                yield self.company(site), f"{self.url}/site{site}/page{page}"
+
+
+class FakeBrowserPool:
+    """Stand-in for the Playwright pool that reads the page whatever its status"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self._session: Optional[ClientSession] = None
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    async def start(self):
+        if self._session is None:
+            self._session = ClientSession()
+
+    async def stop(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch(self, url: str) -> Tuple[str, str]:
+        await self.start()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        async with self._session.get(url) as response:
+            return await response.text(), str(response.url)
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic pseudo-random unit vectors, with a fixed latency per call"""
+
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = np.random.default_rng(seed).standard_normal(self.size).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model answering after a fixed latency, with JSON for the structured prompts"""
+
+    latency: float = 0.0
+    answer_words: int = 120
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    def _text(self, messages: List[BaseMessage]) -> str:
+        prompt = str(messages[-1].content)
+        if "JSON instance" in prompt:
+            if "result_summary" in prompt:
+                return json.dumps({"query": "", "results": [], "result_summary": "Summary of the chunks.", "metadata": {}})
+            return json.dumps({"search_summary": "Summary of the web results.", "metadata": {}})
+        return " ".join(WORDS[i % len(WORDS)] for i in range(self.answer_words))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._text(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._text(messages)))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any):
+        await asyncio.sleep(self.latency)
+        for word in self._text(messages).split(" "):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Peak resident set size of this process and of its finished children, such as parse workers"""
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"p50": round(float(p50), 4), "p95": round(float(p95), 4), "p99": round(float(p99), 4),
+            "max": round(max(latencies), 4)}
+
+
+async def run(args) -> Dict:
+    # Configuration is read on import, so the app is imported once the environment points at scratch space
+    from app.services.company_service import CompanyRegistry
+    from app.services.itk_service import ITKService
+    from app.services.ledger_service import FetchLedger
+    from app.services.llm_service import LLMService
+    from app.services.scrape_service import CompanyWebScraper
+    from app.services.search_service import SearchBackend, WebSearchService
+    from app.services.vectorstore_service import VectorStoreService
+
+    class FakeSearchBackend(SearchBackend):
+        async def search(self, query: str) -> str:
+            await asyncio.sleep(args.search_latency)
+            return " ".join(f"Snippet {i} about {query}." for i in range(5))
+
+    sites = FakeSites(args.sites, args.pages, args.page_words, args.blocked_ratio, args.site_latency)
+    await sites.start()
+    rows = list(sites.rows())
+    registry = CompanyRegistry(seed_csv="")
+    for company, url in rows:
+        await registry.save_item({"name": company, "urls": [url]})
+
+    ledger = FetchLedger()
+    browser_pool = FakeBrowserPool(args.browser_latency) if args.browser == "fake" else None
+    itk = ITKService(
+        ledger=ledger,
+        companies=registry,
+        scrape_service=CompanyWebScraper(browser_pool=browser_pool, ledger=ledger),
+        vector_store_service=VectorStoreService(embeddings=FakeEmbeddings(latency=args.embed_latency)),
+        llm_service=LLMService(
+            model=FakeChatModel(latency=args.llm_latency),
+            search_service=WebSearchService(backend=FakeSearchBackend(), ttl=0, rate=0)
+        )
+    )
+
+    report: Dict[str, Any] = {
+        "sites": args.sites, "pages_per_site": args.pages, "urls": len(rows), "blocked_urls": len(sites.blocked),
+        "browser": args.browser,
+    }
+    try:
+        start = time.perf_counter()
+        stats = await itk.scrape_and_store_data()
+        elapsed = time.perf_counter() - start
+        report["scrape"] = {
+            "seconds": round(elapsed, 3),
+            "urls_per_second": round(stats.urls / elapsed, 2),
+            "chunks": stats.chunks,
+            "chunks_per_second": round(stats.chunks / elapsed, 2),
+            "near_duplicates": stats.near_duplicates,
+            "blocked": stats.blocked,
+            "failed": stats.failed,
+            "embed_failures": stats.embed_failures,
+            "raw_bytes": stats.raw_bytes,
+            "indexed_bytes": stats.indexed_bytes,
+            "chunks_saved": stats.chunks_saved,
+        }
+
+        companies = [sites.company(site) for site in range(args.sites)]
+        semaphore = asyncio.Semaphore(args.concurrency)
+        latencies, errors = [], 0
+
+        async def one(i: int):
+            nonlocal errors
+            company = companies[i % len(companies)]
+            query = f"What did {company} announce about {WORDS[i % len(WORDS)]}? ({i})"
+            async with semaphore:
+                began = time.perf_counter()
+                try:
+                    await itk.chat(query, company_name=company if args.scoped else None, mode=args.mode)
+                    latencies.append(time.perf_counter() - began)
+                except Exception as e:
+                    errors += 1
+                    print(f"chat failed: {e!r}", file=sys.stderr)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.queries)))
+        elapsed = time.perf_counter() - start
+        report["chat"] = {
+            "queries": args.queries,
+            "concurrency": args.concurrency,
+            "mode": args.mode or "default",
+            "errors": errors,
+            "queries_per_second": round(len(latencies) / elapsed, 2),
+            "latency_seconds": percentiles(latencies),
+        }
+    finally:
+        await itk.scrape_service.close()
+        await sites.stop()
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ITK scrape and chat benchmark")
+    parser.add_argument("--sites", type=int, default=20, help="Synthetic companies, one site each")
+    parser.add_argument("--pages", type=int, default=5, help="Pages scraped per site")
+    parser.add_argument("--page-words", type=int, default=600, help="Words of body text per page")
+    parser.add_argument("--blocked-ratio", type=float, default=0.1,
+                        help="Share of pages answering 403, which go through the browser fallback")
+    parser.add_argument("--browser", choices=["playwright", "fake"], default="playwright",
+                        help="Fallback for blocked pages: the real Playwright pool, or a plain GET stand-in")
+    parser.add_argument("--site-latency", type=float, default=0.02, help="Seconds each page takes to serve")
+    parser.add_argument("--browser-latency", type=float, default=0.2, help="Extra seconds per fake browser fetch")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per embedding call")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per chat model call")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="Seconds per web search")
+    parser.add_argument("--queries", type=int, default=100, help="Chat queries to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="Chat queries in flight")
+    parser.add_argument("--mode", choices=["structured", "direct"], default=None, help="Chat mode")
+    parser.add_argument("--scoped", action="store_true", help="Ask each query about one company")
+    parser.add_argument("--response-cache", action="store_true", help="Keep the chat response cache enabled")
+    parser.add_argument("--output", "-o", type=str, default=None, help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="itk-benchmark-") as scratch:
+        os.environ["ITK_DATA_DIR"] = scratch
+        os.environ["ITK_CHROMA_PERSIST_DIRECTORY"] = os.path.join(scratch, "chroma_db")
+        os.environ["ITK_RESPONSE_CACHE_ENABLED"] = "true" if args.response_cache else "false"
+        os.environ.setdefault("ITK_METRICS_LOG", "false")
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+        report = asyncio.run(run(args))
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
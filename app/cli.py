@@ -1,23 +1,40 @@
 import asyncio
 import argparse
+import sys
+from app.core.container import container
 from app.services.scheduler_service import start_scheduler, stop_scheduler
-from app.services.itk_service import ITKService
 from app.api.routers.itk import itk_banner
-from app.utils.helpers import get_companies_from_csv
+from app.utils.helpers import read_batch_requests
 from app.utils.logging import logger
 
 async def initial_scrape():
     """Perform initial scraping of company data"""
     try:
-        itk = ITKService()
-        await itk.scrape_and_store_data("sample_data/companies.csv")
+        itk = container.itk_service
+        await itk.scrape_and_store_data(trigger="cli")
     
     except Exception as e:
         logger.error(f"Error during initial scraping: {str(e)}")
 
-async def chat_loop(company=None):
+async def scrape_worker(shards=None):
+    """Work on the active scrape job, or a new one, until its shards are done"""
+    itk = container.itk_service
+    job, _ = itk.create_scrape_job(trigger="cli")
+    await itk.run_scrape_job(job.id, shards)
+    job = itk.jobs.get(job.id)
+    print(f"Scrape job {job.id} is {job.status}: {job.progress:.0%} of {job.total} URLs done")
+
+async def scheduler_worker():
+    """Run the scheduled scrapes in this process until interrupted, while it holds the scheduler lease"""
+    await start_scheduler(mode="elected")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stop_scheduler()
+
+async def chat_loop(company=None, stream=False, mode=None):
     """Interactive chat loop with ITK"""
-    itk = ITKService()
+    itk = container.itk_service
     print(itk_banner())
     print("Welcome to ITK Chat!\n")
     
@@ -27,38 +44,120 @@ async def chat_loop(company=None):
             break
         
         try:
-            response = await itk.chat(query=query, company_name=company)
-            print(f"ITK: {response}\n")
+            if stream:
+                print("ITK: ", end="", flush=True)
+                async for token in itk.chat_stream(query=query, company_name=company, mode=mode):
+                    print(token, end="", flush=True)
+                print("\n")
+            else:
+                response = await itk.chat(query=query, company_name=company, mode=mode)
+                print(f"ITK: {response}\n")
         except Exception as e:
             logger.error(f"Error during chat: {str(e)}")
             print("Sorry, there was an error processing your query. Please try again.")
 
+async def chat_batch(input_path, output_path=None, mode=None, concurrency=None):
+    """Answer every query in a JSONL file, writing one JSON result per line as they complete"""
+    itk = container.itk_service
+    with open(input_path) as f:
+        requests, invalid = read_batch_requests(f, itk.companies.names())
+
+    out = open(output_path, "w") if output_path else sys.stdout
+    try:
+        for result in invalid:
+            out.write(result.model_dump_json() + "\n")
+        kwargs = {"concurrency": concurrency} if concurrency else {}
+        async for result in itk.chat_batch(requests, mode=mode, **kwargs):
+            out.write(result.model_dump_json() + "\n")
+            out.flush()
+    finally:
+        if output_path:
+            out.close()
+
+def compact_store():
+    """Remove duplicate chunks from the persisted vector store"""
+    itk = container.itk_service
+    removed = itk.vector_store_service.compact()
+    print(f"Removed {sum(removed.values())} duplicate chunks from {len(removed)} collections")
+
 async def main():
     # Set up argument parser
     parser = argparse.ArgumentParser(description='ITK Chat Interface')
     parser.add_argument('--company', '-c', 
                        type=str,
                        help='Company name to focus the chat on',
-                       choices=get_companies_from_csv("sample_data/companies.csv"),
+                       choices=container.companies.names(),
+                       default=None)
+    parser.add_argument('--stream', '-s',
+                       action='store_true',
+                       help='Print the answer as it is generated')
+    parser.add_argument('--mode', '-m',
+                       type=str,
+                       choices=['structured', 'direct'],
+                       help='direct skips the intermediate summaries when the context fits the token budget',
+                       default=None)
+    parser.add_argument('--batch', '-b',
+                       type=str,
+                       help='JSONL file of {"query", "company", "id"} objects to answer, then exit',
+                       default=None)
+    parser.add_argument('--output', '-o',
+                       type=str,
+                       help='File to write batch results to (default: stdout)',
+                       default=None)
+    parser.add_argument('--concurrency',
+                       type=int,
+                       help='LLM and search calls in flight for --batch',
+                       default=None)
+    parser.add_argument('--compact',
+                       action='store_true',
+                       help='Remove duplicate and near-duplicate chunks from ./chroma_db and exit')
+    parser.add_argument('--worker',
+                       action='store_true',
+                       help='Scrape shards of the active scrape job, starting one if none is active, then exit')
+    parser.add_argument('--scheduler',
+                       action='store_true',
+                       help='Run the scheduled and queued scrapes until interrupted, alongside API workers started with ITK_SCHEDULER=off')
+    parser.add_argument('--shards',
+                       type=lambda value: [int(shard) for shard in value.split(',')],
+                       help='Comma-separated shard numbers a --worker may claim (default: any)',
                        default=None)
     args = parser.parse_args()
 
-    # Start scheduler
-    await start_scheduler()
+    if args.compact:
+        compact_store()
+        return
 
     try:
-        # Perform initial scrape
-        await initial_scrape()
-        
-        # Start interactive chat loop
-        await chat_loop(company=args.company)
+        if args.worker:
+            await scrape_worker(args.shards)
+            return
 
-    except Exception as e:
-        logger.error(f"Error in main: {str(e)}")
+        if args.scheduler:
+            await scheduler_worker()
+            return
+
+        if args.batch:
+            await chat_batch(args.batch, args.output, mode=args.mode, concurrency=args.concurrency)
+            return
+
+        # Start scheduler
+        await start_scheduler()
+
+        try:
+            # Perform initial scrape
+            await initial_scrape()
+            
+            # Start interactive chat loop
+            await chat_loop(company=args.company, stream=args.stream, mode=args.mode)
+
+        except Exception as e:
+            logger.error(f"Error in main: {str(e)}")
+        finally:
+            # Clean shutdown
+            await stop_scheduler()
+            print("\nScheduler stopped. Goodbye!")
     finally:
-        # Clean shutdown
-        await stop_scheduler()
-        print("\nScheduler stopped. Goodbye!")
+        await container.aclose()
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,135 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _bool(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+# Scraping
+USER_AGENT = os.getenv(
+    "ITK_USER_AGENT",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+)
+
+# Playwright fallback pool
+BROWSER_POOL_SIZE = int(os.getenv("ITK_BROWSER_POOL_SIZE", "2"))
+BROWSER_MAX_PAGES = int(os.getenv("ITK_BROWSER_MAX_PAGES", "8"))
+BROWSER_PAGE_TIMEOUT = float(os.getenv("ITK_BROWSER_PAGE_TIMEOUT", "30"))
+BROWSER_PERSISTENT = _bool("ITK_BROWSER_PERSISTENT")
+
+# Fetch scheduling
+SCRAPE_MAX_CONCURRENT = int(os.getenv("ITK_SCRAPE_MAX_CONCURRENT", "100"))
+SCRAPE_PER_HOST_CONCURRENT = int(os.getenv("ITK_SCRAPE_PER_HOST_CONCURRENT", "4"))
+SCRAPE_CONNECT_TIMEOUT = float(os.getenv("ITK_SCRAPE_CONNECT_TIMEOUT", "10"))
+SCRAPE_READ_TIMEOUT = float(os.getenv("ITK_SCRAPE_READ_TIMEOUT", "30"))
+SCRAPE_MAX_RETRIES = int(os.getenv("ITK_SCRAPE_MAX_RETRIES", "2"))
+SCRAPE_BACKOFF_BASE = float(os.getenv("ITK_SCRAPE_BACKOFF_BASE", "0.5"))
+SCRAPE_BACKOFF_MAX = float(os.getenv("ITK_SCRAPE_BACKOFF_MAX", "30"))
+
+# Local state
+DATA_DIR = os.getenv("ITK_DATA_DIR", "./data")
+FETCH_LEDGER_PATH = os.getenv("ITK_FETCH_LEDGER_PATH", os.path.join(DATA_DIR, "fetch_ledger.db"))
+
+# Company registry, seeded once from the CSV when first created
+COMPANY_REGISTRY_PATH = os.getenv("ITK_COMPANY_REGISTRY_PATH", os.path.join(DATA_DIR, "companies.db"))
+COMPANIES_SEED_CSV = os.getenv("ITK_COMPANIES_SEED_CSV", "sample_data/companies.csv")
+
+# Scrape jobs
+JOB_STORE_PATH = os.getenv("ITK_JOB_STORE_PATH", os.path.join(DATA_DIR, "scrape_jobs.db"))
+SCRAPE_SHARDS = int(os.getenv("ITK_SCRAPE_SHARDS", "1"))
+SCRAPE_LEASE_SECONDS = float(os.getenv("ITK_SCRAPE_LEASE_SECONDS", "120"))
+SCRAPE_SHARD_ATTEMPTS = int(os.getenv("ITK_SCRAPE_SHARD_ATTEMPTS", "3"))
+
+# Retry queue for blocked and failed URLs
+SCRAPE_RETRY_BASE = float(os.getenv("ITK_SCRAPE_RETRY_BASE", "900"))
+SCRAPE_RETRY_MAX = float(os.getenv("ITK_SCRAPE_RETRY_MAX", "86400"))
+SCRAPE_RETRY_MAX_ATTEMPTS = int(os.getenv("ITK_SCRAPE_RETRY_MAX_ATTEMPTS", "8"))
+SCRAPE_RETRY_INTERVAL_MINUTES = int(os.getenv("ITK_SCRAPE_RETRY_INTERVAL_MINUTES", "30"))
+
+# Scheduler: "embedded" runs it in every process, "elected" in the one process holding
+# the scheduler lease, "off" never
+SCHEDULER_MODE = os.getenv("ITK_SCHEDULER", "embedded")
+SCHEDULER_POLL_SECONDS = float(os.getenv("ITK_SCHEDULER_POLL_SECONDS", "30"))
+
+# Vector store
+CHROMA_PERSIST_DIRECTORY = os.getenv("ITK_CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+# A Chroma server to use instead of the persist directory, needed when several processes write
+CHROMA_HOST = os.getenv("ITK_CHROMA_HOST", "")
+CHROMA_PORT = int(os.getenv("ITK_CHROMA_PORT", "8000"))
+
+# Embeddings
+EMBEDDING_MODEL = os.getenv("ITK_EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_BATCH_SIZE = int(os.getenv("ITK_EMBEDDING_BATCH_SIZE", "256"))
+EMBEDDING_CONCURRENCY = int(os.getenv("ITK_EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_CACHE_PATH = os.getenv("ITK_EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.db"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("ITK_EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+# OpenAI HTTP connection pools, shared by the chat and embedding clients
+OPENAI_MAX_CONNECTIONS = int(os.getenv("ITK_OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("ITK_OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_TIMEOUT = float(os.getenv("ITK_OPENAI_TIMEOUT", "60"))
+
+# Chat response cache
+RESPONSE_CACHE_ENABLED = _bool("ITK_RESPONSE_CACHE_ENABLED", "true")
+RESPONSE_CACHE_EXACT_TTL = float(os.getenv("ITK_RESPONSE_CACHE_EXACT_TTL", "3600"))
+RESPONSE_CACHE_SEMANTIC_TTL = float(os.getenv("ITK_RESPONSE_CACHE_SEMANTIC_TTL", "1800"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("ITK_RESPONSE_CACHE_SIMILARITY", "0.95"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("ITK_RESPONSE_CACHE_MAX_ENTRIES", "2000"))
+
+# Chat pipeline
+CHAT_MODEL = os.getenv("ITK_CHAT_MODEL", "gpt-4o-mini")
+CHAT_MODE = os.getenv("ITK_CHAT_MODE", "structured")
+DIRECT_CONTEXT_TOKEN_BUDGET = int(os.getenv("ITK_DIRECT_CONTEXT_TOKEN_BUDGET", "3000"))
+
+# Batch chat
+BATCH_CONCURRENCY = int(os.getenv("ITK_BATCH_CONCURRENCY", "8"))
+BATCH_WINDOW_SIZE = int(os.getenv("ITK_BATCH_WINDOW_SIZE", "64"))
+
+# Scrape pipeline
+PIPELINE_QUEUE_SIZE = int(os.getenv("ITK_PIPELINE_QUEUE_SIZE", "64"))
+PIPELINE_PARSE_WORKERS = int(os.getenv("ITK_PIPELINE_PARSE_WORKERS", "2"))
+PIPELINE_EMBED_BATCH_CHUNKS = int(os.getenv("ITK_PIPELINE_EMBED_BATCH_CHUNKS", "256"))
+
+# HTML parsing
+HTML_PARSER = os.getenv("ITK_HTML_PARSER", "html.parser")
+PARSE_PROCESSES = int(os.getenv("ITK_PARSE_PROCESSES", "2"))
+
+# Main-content extraction
+MAIN_CONTENT_EXTRACTION = _bool("ITK_MAIN_CONTENT_EXTRACTION", "true")
+MAIN_CONTENT_MIN_WORDS = int(os.getenv("ITK_MAIN_CONTENT_MIN_WORDS", "3"))
+MAIN_CONTENT_MAX_LINK_DENSITY = float(os.getenv("ITK_MAIN_CONTENT_MAX_LINK_DENSITY", "0.5"))
+COLLAPSE_REPEATED_BLOCKS = _bool("ITK_COLLAPSE_REPEATED_BLOCKS", "true")
+
+# Chunking
+CHUNK_TOKENS = int(os.getenv("ITK_CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("ITK_CHUNK_OVERLAP_TOKENS", "32"))
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("ITK_NEAR_DUPLICATE_DISTANCE", "3"))
+FINGERPRINT_INDEX_PATH = os.getenv("ITK_FINGERPRINT_INDEX_PATH", os.path.join(DATA_DIR, "fingerprints.db"))
+CHUNKING_OVERRIDES_PATH = os.getenv("ITK_CHUNKING_OVERRIDES_PATH", "")
+
+# Retrieval
+RETRIEVAL_K = int(os.getenv("ITK_RETRIEVAL_K", "2"))
+RETRIEVAL_FETCH_K = int(os.getenv("ITK_RETRIEVAL_FETCH_K", "8"))
+RETRIEVAL_MMR_LAMBDA = float(os.getenv("ITK_RETRIEVAL_MMR_LAMBDA", "0.7"))
+RETRIEVAL_HYBRID = _bool("ITK_RETRIEVAL_HYBRID", "true")
+RETRIEVAL_RRF_K = int(os.getenv("ITK_RETRIEVAL_RRF_K", "60"))
+RETRIEVAL_MAX_COMPANIES = int(os.getenv("ITK_RETRIEVAL_MAX_COMPANIES", "8"))
+
+# Web search
+WEB_SEARCH_BACKEND = os.getenv("ITK_WEB_SEARCH_BACKEND", "duckduckgo")
+WEB_SEARCH_CACHE_TTL = float(os.getenv("ITK_WEB_SEARCH_CACHE_TTL", "900"))
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("ITK_WEB_SEARCH_CACHE_MAX_ENTRIES", "1000"))
+WEB_SEARCH_RATE = float(os.getenv("ITK_WEB_SEARCH_RATE", "1"))
+WEB_SEARCH_BURST = int(os.getenv("ITK_WEB_SEARCH_BURST", "3"))
+
+# Metrics
+METRICS_LOG = _bool("ITK_METRICS_LOG", "true")
+
+# Keyword index
+BM25_INDEX_PATH = os.getenv("ITK_BM25_INDEX_PATH", os.path.join(DATA_DIR, "bm25_index.db"))
+BM25_MMAP_SIZE = int(os.getenv("ITK_BM25_MMAP_SIZE", str(256 * 1024 * 1024)))
+BM25_K1 = float(os.getenv("ITK_BM25_K1", "1.2"))
+BM25_B = float(os.getenv("ITK_BM25_B", "0.75"))
@@ -0,0 +1,105 @@
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict
+from app.core.config import OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE, OPENAI_TIMEOUT
+
+if TYPE_CHECKING:
+    import httpx
+    from app.services.company_service import CompanyRegistry
+    from app.services.itk_service import ITKService
+    from app.services.job_service import JobStore
+    from app.services.ledger_service import FetchLedger
+    from app.services.llm_service import LLMService
+    from app.services.vectorstore_service import VectorStoreService
+
+
+def _service(build: Callable[["Container"], Any]) -> property:
+    """A container attribute built on first use, once even when first asked for from several threads"""
+    name = build.__name__
+
+    def get(self: "Container"):
+        service = self._services.get(name)
+        if service is None:
+            with self._lock:
+                if name not in self._services:
+                    self._services[name] = build(self)
+                service = self._services[name]
+        return service
+
+    return property(get, doc=build.__doc__)
+
+
+class Container:
+    """
+    The services of the application, built on first use and shared by the API, the
+    scheduler and the CLI of a process.
+
+    Nothing is built, and none of the heavy client libraries are imported, until a
+    service is first asked for, so importing the app stays cheap. The chat and
+    embedding clients share one pool of HTTP connections to OpenAI.
+    """
+
+    def __init__(self):
+        self._services: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def _limits(self) -> "httpx.Limits":
+        import httpx
+        return httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_KEEPALIVE)
+
+    @_service
+    def http_client(self) -> "httpx.Client":
+        """Pooled HTTP client for blocking OpenAI calls"""
+        import httpx
+        return httpx.Client(limits=self._limits(), timeout=OPENAI_TIMEOUT)
+
+    @_service
+    def http_async_client(self) -> "httpx.AsyncClient":
+        """Pooled HTTP client for async OpenAI calls"""
+        import httpx
+        return httpx.AsyncClient(limits=self._limits(), timeout=OPENAI_TIMEOUT)
+
+    @_service
+    def ledger(self) -> "FetchLedger":
+        from app.services.ledger_service import FetchLedger
+        return FetchLedger()
+
+    @_service
+    def jobs(self) -> "JobStore":
+        from app.services.job_service import JobStore
+        return JobStore()
+
+    @_service
+    def companies(self) -> "CompanyRegistry":
+        from app.services.company_service import CompanyRegistry
+        return CompanyRegistry()
+
+    @_service
+    def vector_store_service(self) -> "VectorStoreService":
+        from app.services.vectorstore_service import VectorStoreService
+        return VectorStoreService(http_client=self.http_client, http_async_client=self.http_async_client)
+
+    @_service
+    def llm_service(self) -> "LLMService":
+        from app.services.llm_service import LLMService
+        return LLMService(http_client=self.http_client, http_async_client=self.http_async_client)
+
+    @_service
+    def itk_service(self) -> "ITKService":
+        from app.services.itk_service import ITKService
+        return ITKService(
+            ledger=self.ledger, jobs=self.jobs, companies=self.companies,
+            vector_store_service=self.vector_store_service, llm_service=self.llm_service
+        )
+
+    async def aclose(self):
+        """Close the scraper sessions and HTTP pools that were opened"""
+        itk_service = self._services.get("itk_service")
+        if itk_service is not None:
+            await itk_service.close()
+        if "http_async_client" in self._services:
+            await self._services.pop("http_async_client").aclose()
+        if "http_client" in self._services:
+            self._services.pop("http_client").close()
+
+
+container = Container()
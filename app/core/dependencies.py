@@ -1,14 +1,9 @@
-from functools import lru_cache
-from app.services.itk_service import ITKService
+from typing import TYPE_CHECKING
+from app.core.container import container
 
-_itk_service = None
+if TYPE_CHECKING:
+    from app.services.itk_service import ITKService
 
-@lru_cache()
-def get_itk_service() -> ITKService:
-    """Get or create ITKService instance"""
-    global _itk_service
-    
-    if _itk_service is None:
-        _itk_service = ITKService()
-        
-    return _itk_service
\ No newline at end of file
+def get_itk_service() -> "ITKService":
+    """Get the ITKService instance shared by the process"""
+    return container.itk_service
@@ -1,20 +1,36 @@
 from app.services.scheduler_service import start_scheduler, stop_scheduler
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import argparse
+import os
+import signal
+import subprocess
+import sys
 import uvicorn
-from app.api.routers import itk, scrape
+from app.api.routers import companies, itk, scrape
+from app.core.config import CHROMA_HOST
+from app.core.container import container
+from app.core.dependencies import get_itk_service
 from app.utils.logging import logger
+from app.utils.metrics import metrics
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting ITK")
+    try:
+        itk_service = get_itk_service()
+        await itk_service.vector_store_service.warmup(itk_service.companies.names())
+    except Exception as e:
+        logger.error(f"Error warming up vector stores: {str(e)}")
     await start_scheduler()
     yield
     # Shutdown
     logger.info("Shutting down ITK")
     await stop_scheduler()
+    await container.aclose()
 
 app = FastAPI(
     title="ITK Platform",
@@ -43,10 +59,19 @@ app.add_middleware(CORSMiddleware,
 # Include routers
 app.include_router(itk.router)
 app.include_router(scrape.router)
+app.include_router(companies.router)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"} 
+    """Vector store health, with a 503 when it is unhealthy so load balancers stop routing here"""
+    vector_store = await get_itk_service().vector_store_service.health()
+    status_code = 200 if vector_store["status"] == "healthy" else 503
+    return JSONResponse({"status": vector_store["status"], "vector_store": vector_store}, status_code=status_code)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Counters and latency histograms in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
@@ -56,5 +81,31 @@ async def root():
         }
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ITK API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes; with more than one, the scheduled scrapes run in a separate process")
+    args = parser.parse_args()
+
     logger.info(itk.itk_banner())
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000)
\ No newline at end of file
+    scheduler = None
+    if args.workers > 1:
+        if "ITK_SCHEDULER" not in os.environ:
+            # Keep the scrapes, the browser pool and the parse processes out of the chat workers:
+            # the workers inherit ITK_SCHEDULER=off and one scheduler process runs beside them
+            os.environ["ITK_SCHEDULER"] = "off"
+            scheduler = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), "cli.py"), "--scheduler"])
+            logger.info(f"Started the scheduler process {scheduler.pid}")
+        if not CHROMA_HOST:
+            logger.warning("Several workers writing to a local Chroma directory can corrupt it, set ITK_CHROMA_HOST")
+    try:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        if scheduler is not None and scheduler.poll() is None:
+            # An interrupt lets it release the scheduler lease
+            scheduler.send_signal(signal.SIGINT)
+            try:
+                scheduler.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                scheduler.kill()
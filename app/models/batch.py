@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class BatchChatRequest(BaseModel):
+    """Model for one line of a batch chat JSONL file"""
+
+    id: Optional[str] = Field(None, description="Caller supplied identifier echoed back in the result")
+    query: str = Field(..., description="The query to answer")
+    company: Optional[str] = Field(None, description="Company to focus the answer on")
+    companies: Optional[List[str]] = Field(None, description="Companies to search when no single company is given")
+
+class BatchChatResult(BaseModel):
+    """Model for one line of a batch chat result stream"""
+
+    id: Optional[str] = Field(None, description="Identifier of the request this answers")
+    query: str = Field(..., description="The query that was answered")
+    company: Optional[str] = Field(None, description="Company the answer focused on")
+    response: Optional[str] = Field(None, description="The answer, if the query succeeded")
+    error: Optional[str] = Field(None, description="Why the query failed, if it did")
@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+from app.core.config import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, NEAR_DUPLICATE_DISTANCE
+
+class ChunkingSettings(BaseModel):
+    """Model for how a company's pages are chunked and deduplicated"""
+
+    chunk_tokens: int = Field(CHUNK_TOKENS, description="Largest chunk in embedding-model tokens")
+    overlap_tokens: int = Field(CHUNK_OVERLAP_TOKENS, description="Tokens repeated between consecutive chunks of a section")
+    near_duplicate_distance: int = Field(
+        NEAR_DUPLICATE_DISTANCE, description="Largest SimHash distance of a near-duplicate chunk, negative to keep every chunk"
+    )
@@ -0,0 +1,41 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class Company(BaseModel):
+    """Model for a registered company and the URLs scraped for it"""
+
+    id: str = Field(..., description="Normalized company name, also the key of its vector store collection")
+    name: str = Field(..., description="Company name as given when it was added")
+    urls: List[str] = Field(default_factory=list, description="URLs scraped for the company")
+    created_at: str = Field(..., description="When the company was added")
+    updated_at: str = Field(..., description="When the company or its URLs last changed")
+
+class CompanyCreate(BaseModel):
+    """Model for adding a company, or URLs to a company already registered"""
+
+    name: str = Field(..., min_length=1, description="Company name")
+    urls: List[str] = Field(default_factory=list, description="http(s) URLs to scrape for the company")
+
+class CompanyUpdate(BaseModel):
+    """Model for changing a registered company"""
+
+    name: Optional[str] = Field(None, min_length=1, description="New spelling of the name; it must normalize to the same ID")
+    urls: Optional[List[str]] = Field(None, description="URLs replacing those scraped for the company")
+
+class CompanyURLs(BaseModel):
+    """Model for URLs added to or removed from a company"""
+
+    urls: List[str] = Field(..., min_length=1, description="http(s) URLs")
+
+class CompanyScrape(BaseModel):
+    """Model for the scrape of a company's new URLs requested with `scrape=true`"""
+
+    job_id: str = Field(..., description="Scrape job the new URLs are in")
+    status: str = Field(..., description="Status of that job: pending, running or completed")
+    created: bool = Field(..., description="Whether a new job was created, rather than an active one covering the URLs joined")
+    message: str = Field(..., description="What happens next, e.g. started, queued behind another job or queued for the scheduler")
+
+class CompanyAdded(Company):
+    """Model for a company just added or given new URLs"""
+
+    scrape: Optional[CompanyScrape] = Field(None, description="Scrape of the new URLs, when requested and there are any")
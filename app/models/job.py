@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+class ShardStatus(BaseModel):
+    """Model for the progress of one shard of a scrape job"""
+
+    shard: int = Field(..., description="Shard number")
+    total: int = Field(..., description="URLs in the shard")
+    remaining: int = Field(..., description="URLs not yet checkpointed")
+    done: bool = Field(False, description="Whether a worker finished the shard")
+    attempts: int = Field(0, description="Times a worker claimed the shard")
+    owner: Optional[str] = Field(None, description="Worker holding the shard lease")
+    lease_expires: Optional[str] = Field(None, description="When the lease lapses unless renewed")
+
+class ScrapeJob(BaseModel):
+    """Model for a durable scrape run and its progress"""
+
+    id: str = Field(..., description="Job identifier")
+    status: str = Field(..., description="pending, running, completed, or failed once a shard ran out of attempts")
+    trigger: str = Field(..., description="What started the job, e.g. api, scheduler or cli")
+    source: str = Field(..., description="Where the URLs were read from")
+    force: bool = Field(False, description="Whether the fetch ledger is ignored")
+    kind: str = Field("full", description="full for every registered URL, partial for a subset such as the URLs due a retry")
+    shards: int = Field(1, description="Number of shards the URLs are split into")
+    created_at: str = Field(..., description="When the job was created")
+    started_at: Optional[str] = Field(None, description="When a worker first picked the job up")
+    finished_at: Optional[str] = Field(None, description="When the last URL was checkpointed")
+    error: Optional[str] = Field(None, description="Last error raised by a worker")
+    total: int = Field(0, description="URLs in the job")
+    counts: Dict[str, int] = Field(default_factory=dict, description="URLs per outcome: pending, stored, unchanged, blocked, failed")
+    progress: float = Field(0.0, description="Share of URLs checkpointed")
+    shard_status: List[ShardStatus] = Field(default_factory=list, description="Per-shard progress and leases")
@@ -0,0 +1,38 @@
+from enum import Enum
+from langchain_core.documents import Document
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class ScrapeOutcome(str, Enum):
+    """How scraping a single URL ended"""
+
+    SUCCESS = "success"
+    NOT_MODIFIED = "not_modified"
+    BLOCKED = "blocked"
+    ERROR = "error"
+
+class ScrapeResult(BaseModel):
+    """Model for the result of scraping a single URL. Only successes carry a document"""
+
+    url: str = Field(..., description="URL that was scraped")
+    outcome: ScrapeOutcome = Field(..., description="success, not_modified, blocked or error")
+    document: Optional[Document] = Field(None, description="Extracted page text, set on success")
+    status: Optional[int] = Field(None, description="Last HTTP status received, if any")
+    error: Optional[str] = Field(None, description="Why the page could not be scraped")
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome == ScrapeOutcome.SUCCESS
+
+class FetchFailure(BaseModel):
+    """Model for the failure statistics of a URL and its place in the retry queue"""
+
+    url: str = Field(..., description="URL that failed")
+    outcome: str = Field(..., description="blocked or error")
+    status: Optional[int] = Field(None, description="Last HTTP status received, if any")
+    error: Optional[str] = Field(None, description="Last error")
+    consecutive_failures: int = Field(..., description="Failures since the URL last scraped successfully")
+    total_failures: int = Field(..., description="Failures recorded for the URL overall")
+    first_failed_at: str = Field(..., description="When the latest run of consecutive failures started")
+    last_failed_at: str = Field(..., description="When the URL last failed")
+    next_retry_at: Optional[str] = Field(None, description="When the URL is next due a retry, None once retries are exhausted")
@@ -0,0 +1,178 @@
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Iterable, List, Tuple
+from app.core.config import BM25_B, BM25_INDEX_PATH, BM25_K1, BM25_MMAP_SIZE
+
+_TOKEN_RE = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i if in into is it its me my no not of on or
+our she so than that the their them then there these they this to us was we were what when where which
+who will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stopwords. Codes like `ABC-123` become `abc` and `123`"""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Persistent BM25 inverted index of the stored chunks, one namespace per company.
+
+    Postings hold the term frequency of each term in each chunk, and a per-company
+    row keeps the chunk count and total length, so a query reads only the posting
+    lists of its own terms. The SQLite file is memory-mapped, which keeps lookups
+    in the page cache without loading the index into the process.
+    """
+
+    def __init__(self, path: str = BM25_INDEX_PATH, mmap_size: int = BM25_MMAP_SIZE,
+                 k1: float = BM25_K1, b: float = BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS bm25_chunks (
+                company TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                source TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                PRIMARY KEY (company, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS bm25_chunks_source ON bm25_chunks (company, source);
+            CREATE TABLE IF NOT EXISTS bm25_postings (
+                company TEXT NOT NULL,
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (company, term, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS bm25_postings_chunk ON bm25_postings (company, chunk_id);
+            CREATE TABLE IF NOT EXISTS bm25_stats (
+                company TEXT PRIMARY KEY,
+                chunks INTEGER NOT NULL,
+                total_length INTEGER NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _delete_ids(self, company: str, ids: List[str]):
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            marks = ",".join("?" * len(batch))
+            self._conn.execute(f"DELETE FROM bm25_postings WHERE company = ? AND chunk_id IN ({marks})", [company, *batch])
+            self._conn.execute(f"DELETE FROM bm25_chunks WHERE company = ? AND chunk_id IN ({marks})", [company, *batch])
+
+    def _insert(self, company: str, chunks: Iterable[Tuple[str, str, str]]):
+        for id_, source, text in chunks:
+            terms = Counter(tokenize(text))
+            self._conn.execute("DELETE FROM bm25_postings WHERE company = ? AND chunk_id = ?", (company, id_))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO bm25_chunks (company, chunk_id, source, length) VALUES (?, ?, ?, ?)",
+                (company, id_, source, sum(terms.values()))
+            )
+            self._conn.executemany(
+                "INSERT INTO bm25_postings (company, term, chunk_id, tf) VALUES (?, ?, ?, ?)",
+                [(company, term, id_, tf) for term, tf in terms.items()]
+            )
+
+    def _update_stats(self, company: str):
+        self._conn.execute(
+            """
+            INSERT OR REPLACE INTO bm25_stats (company, chunks, total_length)
+            SELECT ?, COUNT(*), COALESCE(SUM(length), 0) FROM bm25_chunks WHERE company = ?
+            """,
+            (company, company)
+        )
+
+    def replace_sources(self, company: str, sources: Iterable[str], chunks: List[Tuple[str, str, str]]):
+        """
+        Index `(chunk_id, source, text)` chunks, dropping every chunk previously indexed
+        for the same source URLs, as the vector store upsert does.
+        """
+        sources = list(sources)
+        with self._lock, self._conn:
+            stale = []
+            for i in range(0, len(sources), 500):
+                batch = sources[i:i + 500]
+                stale.extend(row[0] for row in self._conn.execute(
+                    f"SELECT chunk_id FROM bm25_chunks WHERE company = ? AND source IN ({','.join('?' * len(batch))})",
+                    [company, *batch]
+                ))
+            self._delete_ids(company, stale)
+            self._insert(company, chunks)
+            self._update_stats(company)
+
+    def rebuild(self, company: str, chunks: Iterable[Tuple[str, str, str]]):
+        """Replace everything indexed for a company"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM bm25_postings WHERE company = ?", (company,))
+            self._conn.execute("DELETE FROM bm25_chunks WHERE company = ?", (company,))
+            self._insert(company, chunks)
+            self._update_stats(company)
+
+    def delete_company(self, company: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM bm25_postings WHERE company = ?", (company,))
+            self._conn.execute("DELETE FROM bm25_chunks WHERE company = ?", (company,))
+            self._conn.execute("DELETE FROM bm25_stats WHERE company = ?", (company,))
+
+    def companies(self) -> List[str]:
+        """Companies with indexed chunks"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT company FROM bm25_stats WHERE chunks > 0 ORDER BY company")]
+
+    def rank_companies(self, query: str, companies: Iterable[str], k: int) -> List[str]:
+        """The k companies whose best chunk scores highest for the query, only those with a match"""
+        best = [(hits[0][1], company) for company in companies if (hits := self.search(company, query, 1))]
+        return [company for _, company in heapq.nlargest(k, best)]
+
+    def search(self, company: str, query: str, k: int) -> List[Tuple[str, float]]:
+        """Top-k `(chunk_id, score)` pairs of a company for a query"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            stats = self._conn.execute(
+                "SELECT chunks, total_length FROM bm25_stats WHERE company = ?", (company,)
+            ).fetchone()
+            if not stats or not stats[0]:
+                return []
+            n, avgdl = stats[0], max(stats[1] / stats[0], 1)
+
+            scores = Counter()
+            for term in terms:
+                rows = self._conn.execute(
+                    """
+                    SELECT p.chunk_id, p.tf, c.length FROM bm25_postings p
+                    JOIN bm25_chunks c ON c.company = p.company AND c.chunk_id = p.chunk_id
+                    WHERE p.company = ? AND p.term = ?
+                    """,
+                    (company, term)
+                ).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+                for id_, tf, length in rows:
+                    scores[id_] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avgdl))
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
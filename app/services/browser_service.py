@@ -0,0 +1,80 @@
+import asyncio
+from itertools import cycle
+from typing import Optional, Tuple
+from app.core.config import (
+    BROWSER_MAX_PAGES,
+    BROWSER_PAGE_TIMEOUT,
+    BROWSER_POOL_SIZE,
+    USER_AGENT,
+)
+from app.utils.logging import logger
+
+
+class BrowserPool:
+    """
+    A single headless Chromium shared by every Playwright fallback fetch.
+
+    The browser is launched lazily on the first fetch, keeps `pool_size` browser
+    contexts open and hands them out round-robin, while at most `max_pages` pages
+    are open at any time. Extra fetches wait on the semaphore until a page frees up.
+    """
+
+    def __init__(self, pool_size: Optional[int] = None, max_pages: Optional[int] = None,
+                 page_timeout: Optional[float] = None):
+        self.pool_size = max(1, pool_size or BROWSER_POOL_SIZE)
+        self.max_pages = max(1, max_pages or BROWSER_MAX_PAGES)
+        self.page_timeout = page_timeout or BROWSER_PAGE_TIMEOUT
+        self._playwright = None
+        self._browser = None
+        self._contexts = None
+        self._pages = asyncio.Semaphore(self.max_pages)
+        self._lock = asyncio.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._browser is not None
+
+    async def start(self):
+        """Launch the browser and open the contexts if not already running"""
+        async with self._lock:
+            if self._browser is not None:
+                return
+
+            # Playwright is only imported once a page actually needs the browser
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=True)
+            contexts = [
+                await self._browser.new_context(user_agent=USER_AGENT)
+                for _ in range(self.pool_size)
+            ]
+            self._contexts = cycle(contexts)
+            logger.info(f"Browser pool started with {self.pool_size} contexts and {self.max_pages} pages")
+
+    async def stop(self):
+        """Close the browser and every context it owns"""
+        async with self._lock:
+            if self._browser is None:
+                return
+            try:
+                await self._browser.close()
+            finally:
+                await self._playwright.stop()
+                self._browser = None
+                self._playwright = None
+                self._contexts = None
+                logger.info("Browser pool stopped")
+
+    async def fetch(self, url: str) -> Tuple[str, str]:
+        """Render a page in the pool and return its HTML and the URL it ended up at"""
+        await self.start()
+
+        async with self._pages:
+            context = next(self._contexts)
+            page = await context.new_page()
+            try:
+                await page.goto(url, timeout=self.page_timeout * 1000)
+                await page.wait_for_load_state("networkidle", timeout=self.page_timeout * 1000)
+                return await page.content(), page.url
+            finally:
+                await page.close()
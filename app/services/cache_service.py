@@ -0,0 +1,154 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.core.config import (
+    CHAT_MODE,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_EXACT_TTL,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_SEMANTIC_TTL,
+    RESPONSE_CACHE_SIMILARITY,
+)
+from app.utils.logging import logger
+
+ALL_COMPANIES = "all_companies"
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?!. ")
+
+
+def company_key(company: Optional[str]) -> str:
+    return company.strip().lower() if company else ALL_COMPANIES
+
+
+class ResponseCache:
+    """
+    Two-tier cache of chat answers, scoped per company or comma-joined set of companies
+    and per chat mode, since the modes build different context for the same query.
+
+    The exact tier is keyed on the normalized query. The semantic tier keeps the
+    query embedding of each answer and returns it for a new query whose cosine
+    similarity is at least `similarity`. Both tiers expire entries after their TTL
+    and are cleared for a company whenever its collection is refreshed. Since other
+    processes refresh collections too, each answer is stored with the refresh
+    `version` of its companies read before it was built, and a lookup given a newer
+    version skips it.
+
+    A lookup that misses the exact tier returns the query embedding with its answer,
+    so the caller can hand it to retrieval and back to `put` instead of embedding
+    the query again.
+    """
+
+    def __init__(self, enabled: bool = RESPONSE_CACHE_ENABLED, exact_ttl: float = RESPONSE_CACHE_EXACT_TTL,
+                 semantic_ttl: float = RESPONSE_CACHE_SEMANTIC_TTL, similarity: float = RESPONSE_CACHE_SIMILARITY,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.enabled = enabled
+        self.exact_ttl = exact_ttl
+        self.semantic_ttl = semantic_ttl
+        self.similarity = similarity
+        self.max_entries = max_entries
+        self._exact: OrderedDict[Tuple[str, str, str], Tuple[str, float, int]] = OrderedDict()
+        self._semantic: Dict[Tuple[str, str], List[Tuple[np.ndarray, str, float, int]]] = {}
+
+    async def embed(self, queries: List[str], embeddings: Optional[Embeddings]) -> List[Optional[List[float]]]:
+        """Embed the queries in one call, as retrieval does, or None for each when that fails"""
+        if embeddings is None or not self.enabled:
+            return [None] * len(queries)
+        try:
+            return list(await embeddings.aembed_documents(queries))
+        except Exception as e:
+            logger.warning(f"Semantic cache disabled for these queries: {str(e)}")
+            return [None] * len(queries)
+
+    @staticmethod
+    def _unit(vector: Optional[List[float]]) -> Optional[np.ndarray]:
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    async def lookup(self, query: str, company: Optional[str] = None, embeddings: Optional[Embeddings] = None,
+                     mode: Optional[str] = None, vector: Optional[List[float]] = None,
+                     version: int = 0) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        Return a cached answer for the query, trying the exact tier first, and the query
+        embedding, which is `vector` when given and only computed past the exact tier
+        """
+        if not self.enabled:
+            return None, vector
+
+        now = time.time()
+        scope = (company_key(company), mode or CHAT_MODE)
+        key = (*scope, normalize_query(query))
+
+        hit = self._exact.get(key)
+        if hit is not None:
+            answer, expires_at, answer_version = hit
+            if expires_at > now and answer_version >= version:
+                self._exact.move_to_end(key)
+                return answer, vector
+            del self._exact[key]
+
+        if vector is None:
+            vector, = await self.embed([query], embeddings)
+
+        entries = [entry for entry in self._semantic.get(scope, []) if entry[2] > now and entry[3] >= version]
+        self._semantic[scope] = entries
+        unit = self._unit(vector)
+        if not entries or unit is None:
+            return None, vector
+
+        scores = np.stack([entry[0] for entry in entries]) @ unit
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity:
+            return entries[best][1], vector
+        return None, vector
+
+    async def put(self, query: str, company: Optional[str], answer: str, embeddings: Optional[Embeddings] = None,
+                  mode: Optional[str] = None, vector: Optional[List[float]] = None, version: int = 0):
+        """Store an answer in both tiers, embedding the query unless `vector` is given"""
+        if not self.enabled:
+            return
+
+        now = time.time()
+        scope = (company_key(company), mode or CHAT_MODE)
+        self._exact[(*scope, normalize_query(query))] = (answer, now + self.exact_ttl, version)
+        while len(self._exact) > self.max_entries:
+            self._exact.popitem(last=False)
+
+        if vector is None:
+            vector, = await self.embed([query], embeddings)
+        unit = self._unit(vector)
+        if unit is not None:
+            entries = self._semantic.setdefault(scope, [])
+            entries.append((unit, answer, now + self.semantic_ttl, version))
+            del entries[:-self.max_entries]
+
+    def invalidate(self, company: Optional[str] = None):
+        """
+        Drop the answers whose scope covers a company, including all-company queries
+        which read the same chunks. Without a company, the whole cache is cleared.
+        """
+        if company is None:
+            self._exact.clear()
+            self._semantic.clear()
+            return
+
+        name = company_key(company)
+
+        def covers(scope: str) -> bool:
+            return scope == ALL_COMPANIES or name in scope.split(",")
+
+        for key in [key for key in self._exact if covers(key[0])]:
+            del self._exact[key]
+        for scope in [scope for scope in self._semantic if covers(scope[0])]:
+            del self._semantic[scope]
+
+
+response_cache = ResponseCache()
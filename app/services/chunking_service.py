@@ -0,0 +1,176 @@
+import json
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from langchain_core.documents import Document
+from app.core.config import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, CHUNKING_OVERRIDES_PATH, EMBEDDING_MODEL
+from app.models.chunking import ChunkingSettings
+from app.utils.helpers import count_tokens
+from app.utils.html import HEADING_MARK
+from app.utils.logging import logger
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class Unit(NamedTuple):
+    """A line, sentence or run of words of a page, with its offset in the page text"""
+    offset: int
+    text: str
+    tokens: int
+    # Whether the unit carries on the line of the unit before it
+    continues: bool = False
+
+
+class Chunk(NamedTuple):
+    start_index: int
+    section: str
+    text: str
+    tokens: int
+
+
+def load_chunking_overrides(path: str = CHUNKING_OVERRIDES_PATH) -> Dict[str, ChunkingSettings]:
+    """Per-company chunking settings from a JSON object keyed by company name"""
+    if not path:
+        return {}
+    try:
+        with open(path) as f:
+            overrides = json.load(f)
+        return {company.strip().lower(): ChunkingSettings(**settings) for company, settings in overrides.items()}
+
+    except Exception as e:
+        logger.error(f"Error loading chunking overrides from {path}: {str(e)}")
+        return {}
+
+
+class TokenChunker:
+    """
+    Split page text into chunks of at most `chunk_tokens` embedding-model tokens along
+    the page's sections, a section being a heading line and the text up to the next one.
+
+    Whole sections are packed into a chunk while they fit, so short sections do not
+    each become a chunk of their own. A section too long for one chunk is split between
+    lines, then sentences, then words; each of its chunks starts with the section
+    heading and repeats up to `overlap_tokens` of the lines ending the previous one.
+    """
+
+    def __init__(self, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 model: str = EMBEDDING_MODEL):
+        self.chunk_tokens = max(chunk_tokens, 16)
+        self.overlap_tokens = min(max(overlap_tokens, 0), self.chunk_tokens // 2)
+        self.model = model
+
+    def _unit(self, offset: int, text: str) -> Unit:
+        return Unit(offset, text, count_tokens(text, self.model))
+
+    def _sections(self, text: str) -> List[Tuple[Optional[Unit], List[Unit]]]:
+        """The heading and the lines of every section, in page order"""
+        sections: List[Tuple[Optional[Unit], List[Unit]]] = [(None, [])]
+        offset = 0
+        for line in text.split("\n"):
+            stripped = line.strip()
+            start = offset + len(line) - len(line.lstrip())
+            if stripped.startswith(HEADING_MARK):
+                sections.append((self._unit(start, stripped), []))
+            elif stripped:
+                sections[-1][1].append(self._unit(start, stripped))
+            offset += len(line) + 1
+        return [(heading, lines) for heading, lines in sections if heading or lines]
+
+    def _fit(self, unit: Unit, limit: int) -> List[Unit]:
+        """
+        Split a line over `limit` tokens into its sentences, and a sentence still over it
+        into runs of words up to the limit
+        """
+        if unit.tokens <= limit:
+            return [unit]
+
+        pieces = []
+        for separator in (_SENTENCE_END_RE, _SPACE_RE):
+            pieces, start = [], 0
+            for match in [*separator.finditer(unit.text), None]:
+                end = match.start() if match else len(unit.text)
+                if end > start:
+                    pieces.append(self._unit(unit.offset + start, unit.text[start:end]))
+                start = match.end() if match else start
+            if separator is _SENTENCE_END_RE and len(pieces) > 1:
+                pieces = [piece for sentence in pieces for piece in self._fit(sentence, limit)]
+                break
+
+            packed: List[Unit] = []
+            for piece in pieces:
+                if packed and packed[-1].tokens + piece.tokens <= limit:
+                    last = packed[-1]
+                    packed[-1] = Unit(last.offset, f"{last.text} {piece.text}", last.tokens + piece.tokens)
+                else:
+                    packed.append(piece)
+            pieces = packed
+
+        return [piece._replace(continues=unit.continues or i > 0) for i, piece in enumerate(pieces)]
+
+    def split_text(self, text: str) -> List[Chunk]:
+        chunks: List[Chunk] = []
+        units: List[Unit] = []
+        state = {"tokens": 0, "start": 0, "section": ""}
+
+        def flush():
+            if units:
+                text = units[0].text + "".join(
+                    (" " if unit.continues and not previous.text.startswith(HEADING_MARK) else "\n") + unit.text
+                    for previous, unit in zip(units, units[1:])
+                )
+                chunks.append(Chunk(state["start"], state["section"], text, state["tokens"]))
+            units.clear()
+            state["tokens"] = 0
+
+        def begin(first: Unit, section: str, carried: List[Unit]):
+            units.extend(carried)
+            state["tokens"] = sum(u.tokens for u in carried)
+            state["start"] = first.offset
+            state["section"] = section
+
+        for heading, lines in self._sections(text):
+            section = heading.text[len(HEADING_MARK):] if heading else ""
+            head = [heading] if heading else []
+            size = sum(u.tokens for u in head + lines)
+
+            if units and state["tokens"] + size > self.chunk_tokens:
+                flush()
+            if not units:
+                begin((head + lines)[0], section, [])
+            if state["tokens"] + size <= self.chunk_tokens:
+                units.extend(head + lines)
+                state["tokens"] += size
+                continue
+
+            # The section needs chunks of its own, each starting with its heading
+            units.extend(head)
+            state["tokens"] += sum(u.tokens for u in head)
+            limit = self.chunk_tokens - sum(u.tokens for u in head)
+            body: List[Unit] = []
+            for unit in (piece for line in lines for piece in self._fit(line, limit)):
+                if body and state["tokens"] + unit.tokens > self.chunk_tokens:
+                    flush()
+                    carried: List[Unit] = []
+                    for previous in reversed(body):
+                        if sum(u.tokens for u in carried) + previous.tokens > min(self.overlap_tokens, limit - unit.tokens):
+                            break
+                        carried.insert(0, previous)
+                    begin(unit, section, head + carried)
+                    body = list(carried)
+                units.append(unit)
+                body.append(unit)
+                state["tokens"] += unit.tokens
+
+        flush()
+        return chunks
+
+    def split_documents(self, docs: List[Document]) -> List[Document]:
+        """Chunks of the documents, with the metadata of their page and their offset, section and size"""
+        return [
+            Document(
+                page_content=chunk.text,
+                metadata={**doc.metadata, "start_index": chunk.start_index, "section": chunk.section, "tokens": chunk.tokens}
+            )
+            for doc in docs
+            for chunk in self.split_text(doc.page_content)
+        ]
@@ -0,0 +1,263 @@
+import csv
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+from app.core.config import COMPANIES_SEED_CSV, COMPANY_REGISTRY_PATH
+from app.core.database import Database
+from app.utils.logging import logger
+
+
+def _clean_urls(urls: Iterable[str]) -> List[str]:
+    """Stripped, de-duplicated URLs. Raises ValueError on anything but an http(s) URL"""
+    cleaned = []
+    for url in urls:
+        url = url.strip()
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.netloc:
+            raise ValueError(f"Not an http(s) URL: {url!r}")
+        if url not in cleaned:
+            cleaned.append(url)
+    return cleaned
+
+
+class CompanyRegistry(Database):
+    """
+    Persistent SQLite registry of the companies ITK covers and the URLs scraped for each.
+
+    Companies are keyed by their normalized name, the same key as their vector store
+    collection, and URLs are indexed both ways so a scrape job or a chat request only
+    reads what it needs. Changes are seen by every process sharing the file without a
+    restart. A new registry is seeded once from `seed_csv`, so companies removed later
+    are not added back.
+
+    Each company also has a refresh version, raised whenever its stored chunks change,
+    which lets every process tell whether an answer it cached is still current.
+    """
+
+    def __init__(self, path: str = COMPANY_REGISTRY_PATH, seed_csv: str = COMPANIES_SEED_CSV):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS companies (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS company_urls (
+                company_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                added_at TEXT NOT NULL,
+                PRIMARY KEY (company_id, url)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS company_urls_url ON company_urls (url);
+            CREATE TABLE IF NOT EXISTS registry_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS company_refreshes (
+                company_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            """
+        )
+        self._conn.commit()
+        # Registered names with the data version they were read at, see `names`
+        self._names: Optional[Tuple[int, List[str]]] = None
+        # Refresh versions per company with the data version they were read at
+        self._refreshes: Optional[Tuple[int, Dict[str, int]]] = None
+        self._seed(seed_csv)
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        return name.strip().lower()
+
+    def _seed(self, seed_csv: str):
+        """Import the companies and URLs of the CSV the first time the registry is opened"""
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM registry_meta WHERE key = 'seeded'").fetchone():
+                return
+            rows = []
+            if seed_csv and os.path.exists(seed_csv):
+                try:
+                    with open(seed_csv, newline="") as f:
+                        rows = [(row["Company"], row["URL"]) for row in csv.DictReader(f) if row.get("Company")]
+                except Exception as e:
+                    logger.error(f"Error seeding the company registry from {seed_csv}: {str(e)}")
+                    rows = []
+            now = datetime.now().isoformat()
+            for name, url in rows:
+                try:
+                    urls = _clean_urls([url]) if url and url.strip() else []
+                except ValueError as e:
+                    logger.warning(f"Skipping a URL of {name} in {seed_csv}: {str(e)}")
+                    urls = []
+                self._upsert(name, urls, now)
+            self._conn.execute("INSERT INTO registry_meta VALUES ('seeded', ?)", (seed_csv or "",))
+            self._names = None
+        if rows:
+            logger.info(f"Seeded the company registry with {len(rows)} rows from {seed_csv}")
+
+    def _upsert(self, name: str, urls: List[str], now: str) -> str:
+        company_id = self.normalize(name)
+        self._conn.execute(
+            "INSERT INTO companies (id, name, created_at, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET updated_at = excluded.updated_at",
+            (company_id, name.strip(), now, now)
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO company_urls (company_id, url, added_at) VALUES (?, ?, ?)",
+            [(company_id, url, now) for url in urls]
+        )
+        return company_id
+
+    def _get(self, company_id: str) -> Optional[Dict]:
+        row = self._conn.execute(
+            "SELECT id, name, created_at, updated_at FROM companies WHERE id = ?", (company_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        urls = [r[0] for r in self._conn.execute(
+            "SELECT url FROM company_urls WHERE company_id = ? ORDER BY added_at, url", (company_id,)
+        )]
+        return {"id": row[0], "name": row[1], "urls": urls, "created_at": row[2], "updated_at": row[3]}
+
+    async def save_item(self, item: Dict) -> Dict:
+        """Add a company, or add URLs to the company already registered under the same normalized name"""
+        name = (item.get("name") or "").strip()
+        if not name:
+            raise ValueError("A company needs a name")
+        urls = _clean_urls(item.get("urls") or [])
+        with self._lock, self._conn:
+            company_id = self._upsert(name, urls, datetime.now().isoformat())
+            self._names = None
+            return self._get(company_id)
+
+    async def get_item(self, item_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._get(self.normalize(item_id))
+
+    async def list_items(self) -> List[Dict]:
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute("SELECT id FROM companies ORDER BY id")]
+            return [self._get(company_id) for company_id in ids]
+
+    async def delete_item(self, item_id: str) -> None:
+        company_id = self.normalize(item_id)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM company_urls WHERE company_id = ?", (company_id,))
+            self._conn.execute("DELETE FROM companies WHERE id = ?", (company_id,))
+            self._names = None
+
+    async def update_item(self, item_id: str, updates: Dict) -> Dict:
+        """
+        Change the spelling of a company's name or replace its URLs. Raises KeyError for
+        an unknown company and ValueError for a name that normalizes to another ID.
+        """
+        company_id = self.normalize(item_id)
+        name = updates.get("name")
+        if name is not None and self.normalize(name) != company_id:
+            raise ValueError("A company cannot be renamed to another ID; add it under the new name instead")
+        urls = _clean_urls(updates["urls"]) if updates.get("urls") is not None else None
+
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            if self._get(company_id) is None:
+                raise KeyError(company_id)
+            if name is not None:
+                self._conn.execute("UPDATE companies SET name = ? WHERE id = ?", (name.strip(), company_id))
+                self._names = None
+            if urls is not None:
+                self._conn.execute("DELETE FROM company_urls WHERE company_id = ?", (company_id,))
+                self._upsert(name or company_id, urls, now)
+            self._conn.execute("UPDATE companies SET updated_at = ? WHERE id = ?", (now, company_id))
+            return self._get(company_id)
+
+    async def remove_urls(self, item_id: str, urls: Iterable[str]) -> Dict:
+        """Stop scraping URLs for a company. Raises KeyError for an unknown company"""
+        company_id = self.normalize(item_id)
+        urls = [url.strip() for url in urls]
+        with self._lock, self._conn:
+            if self._get(company_id) is None:
+                raise KeyError(company_id)
+            self._conn.executemany(
+                "DELETE FROM company_urls WHERE company_id = ? AND url = ?", [(company_id, url) for url in urls]
+            )
+            self._conn.execute(
+                "UPDATE companies SET updated_at = ? WHERE id = ?", (datetime.now().isoformat(), company_id)
+            )
+            return self._get(company_id)
+
+    def names(self) -> List[str]:
+        """
+        Names of the registered companies. They are read again only once another process
+        committed to the registry, which SQLite's data version tells without a table scan.
+        """
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._names is None or self._names[0] != version:
+                self._names = (version, [row[0] for row in self._conn.execute("SELECT name FROM companies ORDER BY id")])
+            return list(self._names[1])
+
+    def bump_refresh(self, name: str) -> int:
+        """
+        Raise a company's refresh version above every version handed out so far, so
+        the version of a set of companies is the highest of theirs. Returns it.
+        """
+        company_id = self.normalize(name)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO company_refreshes (company_id, version) "
+                "SELECT ?, COALESCE(MAX(version), 0) + 1 FROM company_refreshes",
+                (company_id,)
+            )
+            self._refreshes = None
+            return self._conn.execute(
+                "SELECT version FROM company_refreshes WHERE company_id = ?", (company_id,)
+            ).fetchone()[0]
+
+    def refresh_version(self, names: Optional[Iterable[str]] = None) -> int:
+        """
+        Highest refresh version of the companies named, or of every company, 0 before
+        any refresh. Read again only after a commit, as in `names`.
+        """
+        with self._lock:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._refreshes is None or self._refreshes[0] != version:
+                self._refreshes = (version, dict(self._conn.execute("SELECT company_id, version FROM company_refreshes")))
+            refreshes = self._refreshes[1]
+        if names is None:
+            return max(refreshes.values(), default=0)
+        return max((refreshes.get(self.normalize(name), 0) for name in names), default=0)
+
+    def url_companies(self, urls: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
+        """Every registered URL, or only those in `urls`, with the names of the companies that list it"""
+        query = "SELECT u.url, c.name FROM company_urls u JOIN companies c ON c.id = u.company_id"
+        with self._lock:
+            if urls is None:
+                rows = self._conn.execute(query + " ORDER BY u.url, c.id").fetchall()
+            else:
+                wanted = list(dict.fromkeys(urls))
+                rows = []
+                for i in range(0, len(wanted), 500):
+                    batch = wanted[i:i + 500]
+                    rows.extend(self._conn.execute(
+                        query + f" WHERE u.url IN ({','.join('?' * len(batch))}) ORDER BY u.url, c.id", batch
+                    ))
+
+        url_companies: Dict[str, List[str]] = {}
+        for url, name in rows:
+            url_companies.setdefault(url, []).append(name)
+        return url_companies
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.core.config import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CONCURRENCY,
+)
+from app.utils.logging import logger
+from app.utils.metrics import metrics, span
+
+EMBEDDED_TEXTS = metrics.counter(
+    "itk_embedding_texts_total", "Texts embedded, by whether the vector came from the cache", ("cache",)
+)
+
+
+class EmbeddingCache:
+    """
+    Persistent SQLite cache of embedding vectors keyed by model name and text hash.
+
+    Vectors are stored as float32 blobs. Once the cache holds more than `max_entries`
+    vectors, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return the cached vectors for the keys that are present and mark them as used"""
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, vectors: Dict[str, List[float]]):
+        """Store vectors and evict the least recently used entries over the limit"""
+        if not vectors:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in vectors.items()]
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves repeated texts from an EmbeddingCache and sends
+    the misses to the underlying model in batches of `batch_size`, with at most
+    `concurrency` batches in flight.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: Optional[EmbeddingCache] = None,
+                 batch_size: int = EMBEDDING_BATCH_SIZE, concurrency: int = EMBEDDING_CONCURRENCY):
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache or EmbeddingCache()
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+
+    def _plan(self, texts: List[str]):
+        keys = [self.cache.key(self.model, text) for text in texts]
+        cached = self.cache.get_many(list(set(keys)))
+        # Each distinct missing text is embedded once, even if it repeats in `texts`
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        return keys, cached, missing
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._plan(texts)
+        missing_keys = list(missing)
+        computed = {}
+        for i in range(0, len(missing_keys), self.batch_size):
+            batch = missing_keys[i:i + self.batch_size]
+            with span("embeddings.model", texts=len(batch)):
+                for key, vector in zip(batch, self.embeddings.embed_documents([missing[k] for k in batch])):
+                    computed[key] = vector
+        self.cache.put_many(computed)
+        vectors.update(computed)
+        EMBEDDED_TEXTS.inc(len(computed), cache="miss")
+        EMBEDDED_TEXTS.inc(len(texts) - len(computed), cache="hit")
+        return [vectors[key] for key in keys]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = await asyncio.to_thread(self._plan, texts)
+        missing_keys = list(missing)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def embed_batch(batch: List[str]) -> Dict[str, List[float]]:
+            async with semaphore:
+                with span("embeddings.model", texts=len(batch)):
+                    result = await self.embeddings.aembed_documents([missing[k] for k in batch])
+            return dict(zip(batch, result))
+
+        batches = [missing_keys[i:i + self.batch_size] for i in range(0, len(missing_keys), self.batch_size)]
+        computed = {}
+        for result in await asyncio.gather(*(embed_batch(batch) for batch in batches)):
+            computed.update(result)
+
+        await asyncio.to_thread(self.cache.put_many, computed)
+        vectors.update(computed)
+        EMBEDDED_TEXTS.inc(len(computed), cache="miss")
+        EMBEDDED_TEXTS.inc(len(texts) - len(computed), cache="hit")
+
+        if texts:
+            logger.debug(f"Embedded {len(computed)} texts, {len(texts) - len(computed)} served from cache")
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+from app.core.config import FINGERPRINT_INDEX_PATH
+from app.services.bm25_service import tokenize
+
+# Four 16-bit bands: two fingerprints within 3 bits of each other share at least one band
+BANDS = 4
+BAND_BITS = 16
+MAX_DISTANCE = BANDS - 1
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the word 3-shingles of a text, 0 when it has no words"""
+    tokens = tokenize(text)
+    shingles = Counter(" ".join(tokens[i:i + 3]) for i in range(max(len(tokens) - 2, 1))) if tokens else {}
+    weights = [0] * 64
+    for shingle, count in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def _bands(fingerprint: int) -> List[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [fingerprint >> (band * BAND_BITS) & mask for band in range(BANDS)]
+
+
+def _signed(fingerprint: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+class FingerprintIndex:
+    """
+    Persistent SimHash fingerprints of the stored chunks, one namespace per company,
+    used to drop chunks that nearly duplicate one already stored for the company.
+
+    Every chunk is recorded, either as kept or as a duplicate of the kept chunk it
+    matched. Near matches are found through band columns: fingerprints within
+    `MAX_DISTANCE` bits agree on at least one band, so only chunks sharing a band
+    are compared. When a kept chunk is replaced, the sources of its duplicates are
+    returned so they can be re-embedded instead of being left unindexed.
+    """
+
+    def __init__(self, path: str = FINGERPRINT_INDEX_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        bands = ", ".join(f"band{band} INTEGER NOT NULL" for band in range(BANDS))
+        self._conn.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                company TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                source TEXT NOT NULL,
+                simhash INTEGER NOT NULL,
+                {bands},
+                duplicate_of TEXT,
+                PRIMARY KEY (company, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS fingerprints_source ON fingerprints (company, source);
+            CREATE INDEX IF NOT EXISTS fingerprints_duplicate_of ON fingerprints (company, duplicate_of);
+            """
+            + "".join(
+                f"CREATE INDEX IF NOT EXISTS fingerprints_band{band} ON fingerprints (company, band{band});"
+                for band in range(BANDS)
+            )
+        )
+        self._conn.commit()
+
+    def _match(self, company: str, fingerprint: int, distance: int) -> Optional[str]:
+        """A kept chunk of the company within `distance` bits of the fingerprint"""
+        bands = _bands(fingerprint)
+        condition = " OR ".join(f"band{band} = ?" for band in range(BANDS))
+        rows = self._conn.execute(
+            f"SELECT chunk_id, simhash FROM fingerprints WHERE company = ? AND duplicate_of IS NULL AND ({condition})",
+            [company, *bands]
+        )
+        for id_, other in rows:
+            if ((other % (1 << 64)) ^ fingerprint).bit_count() <= distance:
+                return id_
+        return None
+
+    def _insert(self, company: str, chunks: Iterable[Tuple[str, str, str]], distance: int) -> List[int]:
+        """Record chunks in order, each checked against those kept so far. Returns the indexes of the kept ones"""
+        distance = min(distance, MAX_DISTANCE)
+        kept = []
+        for i, (id_, source, text) in enumerate(chunks):
+            fingerprint = simhash(text)
+            duplicate_of = self._match(company, fingerprint, distance) if fingerprint and distance >= 0 else None
+            if duplicate_of == id_:
+                duplicate_of = None
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, {', '.join('?' * BANDS)}, ?)",
+                (company, id_, source, _signed(fingerprint), *_bands(fingerprint), duplicate_of)
+            )
+            if duplicate_of is None:
+                kept.append(i)
+        return kept
+
+    def replace_sources(self, company: str, sources: Iterable[str], chunks: List[Tuple[str, str, str]],
+                        distance: int) -> Tuple[List[int], List[str]]:
+        """
+        Record the `(chunk_id, source, text)` chunks of the given source URLs, replacing
+        what was recorded for them before. Returns the indexes of the chunks to store,
+        and the other sources whose chunks were dropped as duplicates of a chunk that
+        is now gone.
+        """
+        sources = list(sources)
+        with self._lock, self._conn:
+            stale = []
+            for i in range(0, len(sources), 500):
+                batch = sources[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                stale.extend(row[0] for row in self._conn.execute(
+                    f"SELECT chunk_id FROM fingerprints WHERE company = ? AND source IN ({marks})", [company, *batch]
+                ))
+                self._conn.execute(f"DELETE FROM fingerprints WHERE company = ? AND source IN ({marks})", [company, *batch])
+
+            kept = self._insert(company, chunks, distance)
+
+            # Duplicates of a chunk that was not stored again lose what stood in for them
+            orphaned = self._orphan(company, set(stale) - {chunks[i][0] for i in kept})
+            return kept, sorted(orphaned - set(sources))
+
+    def forget_sources(self, company: str, sources: Iterable[str]) -> List[str]:
+        """
+        Drop what was recorded for the given source URLs, e.g. when storing their chunks
+        failed after `replace_sources`. Returns the other sources whose chunks were
+        dropped as duplicates of the forgotten ones.
+        """
+        sources = list(sources)
+        with self._lock, self._conn:
+            forgotten = []
+            for i in range(0, len(sources), 500):
+                batch = sources[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                forgotten.extend(row[0] for row in self._conn.execute(
+                    f"SELECT chunk_id FROM fingerprints WHERE company = ? AND source IN ({marks}) AND duplicate_of IS NULL",
+                    [company, *batch]
+                ))
+                self._conn.execute(f"DELETE FROM fingerprints WHERE company = ? AND source IN ({marks})", [company, *batch])
+            return sorted(self._orphan(company, forgotten) - set(sources))
+
+    def _orphan(self, company: str, chunk_ids: Iterable[str]) -> set:
+        """Drop the duplicates of chunks that are no longer stored. Returns their sources"""
+        chunk_ids = list(chunk_ids)
+        orphaned = set()
+        for i in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[i:i + 500]
+            marks = ",".join("?" * len(batch))
+            orphaned.update(row[0] for row in self._conn.execute(
+                f"SELECT source FROM fingerprints WHERE company = ? AND duplicate_of IN ({marks})", [company, *batch]
+            ))
+            self._conn.execute(f"DELETE FROM fingerprints WHERE company = ? AND duplicate_of IN ({marks})", [company, *batch])
+        return orphaned
+
+    def rebuild(self, company: str, chunks: List[Tuple[str, str, str]], distance: int) -> List[str]:
+        """Replace everything recorded for a company. Returns the IDs of the chunks found to be duplicates"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM fingerprints WHERE company = ?", (company,))
+            kept = set(self._insert(company, chunks, distance))
+        return [id_ for i, (id_, _, _) in enumerate(chunks) if i not in kept]
+
+    def delete_company(self, company: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM fingerprints WHERE company = ?", (company,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,71 +1,363 @@
 from abc import abstractmethod
 import asyncio
+import os
+import socket
+import time
+import uuid
+from app.core.config import (
+    BATCH_CONCURRENCY,
+    BATCH_WINDOW_SIZE,
+    CHAT_MODE,
+    CHAT_MODEL,
+    DIRECT_CONTEXT_TOKEN_BUDGET,
+)
+from app.models.batch import BatchChatRequest, BatchChatResult
 from app.models.semantic_search import SemanticSearch
 from app.models.web_search import WebSearchResult
+from app.services.cache_service import normalize_query, response_cache
+from app.services.company_service import CompanyRegistry
 from app.services.llm_service import LLMService
 from langchain_core.prompts import ChatPromptTemplate
-from langchain.schema import Document
-from typing import List
-from app.utils.logging import logger
-from app.services.scrape_service import CompanyWebScraper
+from langchain_core.documents import Document
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterable, List, Literal, Optional, Tuple
+from pydantic import BaseModel
+from app.utils.helpers import count_tokens, normalize_url
+from app.utils.logging import log_event, logger
+from app.utils.metrics import metrics, span
+from app.models.job import ScrapeJob
+from app.models.scrape import ScrapeResult
+from app.services.job_service import ACTIVE_STATUSES, JobStore
+from app.services.ledger_service import FetchLedger
+from app.services.retrieval_service import RetrievalService
 from app.services.vectorstore_service import VectorStoreService
-import pandas as pd
+
+if TYPE_CHECKING:
+    from app.services.pipeline_service import PipelineStats
+    from app.services.scrape_service import CompanyWebScraper
+
+ChatMode = Optional[Literal["structured", "direct"]]
+
+CHAT_REQUESTS = metrics.counter(
+    "itk_chat_requests_total", "Chat queries answered, by path and response cache result", ("path", "cache")
+)
+
+
+def _targets(company_name: Optional[str], companies: Optional[List[str]]) -> Optional[List[str]]:
+    """Companies a query is restricted to, None to let retrieval decide"""
+    if company_name:
+        return [company_name]
+    return list(companies) if companies else None
+
+
+def _scope(company_name: Optional[str], companies: Optional[List[str]]) -> Optional[str]:
+    """Response cache scope for a query's company restriction"""
+    targets = _targets(company_name, companies)
+    return ",".join(sorted({company.strip().lower() for company in targets})) if targets else None
 
 
 class ITKService:
-    def __init__(self):
-        self.scrape_service = CompanyWebScraper()
-        self.vector_store_service = VectorStoreService()
-        self.llm_service = LLMService()
+    def __init__(self, ledger: Optional[FetchLedger] = None, scrape_service: Optional["CompanyWebScraper"] = None,
+                 vector_store_service: Optional[VectorStoreService] = None, llm_service: Optional[LLMService] = None,
+                 jobs: Optional[JobStore] = None, companies: Optional[CompanyRegistry] = None):
+        self.ledger = ledger or FetchLedger()
+        self.jobs = jobs or JobStore()
+        self.companies = companies or CompanyRegistry()
+        self._scrape_service = scrape_service
+        self.vector_store_service = vector_store_service or VectorStoreService()
+        self.retrieval_service = RetrievalService(self.vector_store_service, companies=self.companies.names)
+        self.llm_service = llm_service or LLMService()
+
+    @property
+    def scrape_service(self) -> "CompanyWebScraper":
+        """The scraper, built on first use so processes that only chat never import it"""
+        if self._scrape_service is None:
+            from app.services.scrape_service import CompanyWebScraper
+            self._scrape_service = CompanyWebScraper(ledger=self.ledger)
+        return self._scrape_service
+
+    async def close(self):
+        """Close the scraper's sessions and browser if it was used"""
+        if self._scrape_service is not None:
+            await self._scrape_service.close()
 
-    async def chat(self, query: str, company_name: str = None):
+    async def _resolve_contexts(self, queries: List[str], web_texts: List[str], semantic_texts: List[str],
+                                mode: ChatMode = None, max_concurrency: Optional[int] = None,
+                                return_exceptions: bool = False) -> Tuple[list, list]:
         """
-        Chat with ITK
+        Decide, per query, whether each raw source goes to the final prompt as-is or
+        summarized, and run the summaries as batched LLM calls.
+
+        In "structured" mode both sources are always summarized into WebSearchResult
+        and SemanticSearch. In "direct" mode the raw snippets and chunks are kept, and
+        a source is only summarized when the combined context is over the token budget
+        and that source takes more than half of it.
         """
-        if not company_name:
-            company_name = await self.vector_store_service.get_or_create_vectorstore('all_companies')
-        else:
-            company_name = await self.vector_store_service.get_or_create_vectorstore(company_name)
+        mode = mode or CHAT_MODE
+        web_todo, semantic_todo = [], []
+        for i, (web_text, semantic_text) in enumerate(zip(web_texts, semantic_texts)):
+            if mode == "structured":
+                web_todo.append(i)
+                semantic_todo.append(i)
+                continue
 
-        # Get web search and semantic search results
-        web_search, semantic_search = await asyncio.gather(
-            self.llm_service.web_search_llm(query),
-            self.llm_service.semantic_search_llm(vector_store=company_name, query=query)
-        )
+            web_tokens = count_tokens(web_text, CHAT_MODEL)
+            semantic_tokens = count_tokens(semantic_text, CHAT_MODEL)
+            if web_tokens + semantic_tokens <= DIRECT_CONTEXT_TOKEN_BUDGET:
+                continue
+            if web_tokens > DIRECT_CONTEXT_TOKEN_BUDGET / 2:
+                web_todo.append(i)
+            if semantic_tokens > DIRECT_CONTEXT_TOKEN_BUDGET / 2:
+                semantic_todo.append(i)
 
-        response = await self._itk_chat_chain(query, web_search, semantic_search)
+        with span("chat.summarize", web=len(web_todo), semantic=len(semantic_todo)):
+            web_structured, semantic_structured = await asyncio.gather(
+                self.llm_service.structure_web_search_batch(
+                    [queries[i] for i in web_todo], [web_texts[i] for i in web_todo],
+                    max_concurrency=max_concurrency, return_exceptions=return_exceptions
+                ),
+                self.llm_service.summarize_documents_batch(
+                    [queries[i] for i in semantic_todo], [semantic_texts[i] for i in semantic_todo],
+                    max_concurrency=max_concurrency, return_exceptions=return_exceptions
+                )
+            )
 
-        return response
+        web_results, semantic_results = list(web_texts), list(semantic_texts)
+        for i, result in zip(web_todo, web_structured):
+            web_results[i] = result
+        for i, result in zip(semantic_todo, semantic_structured):
+            semantic_results[i] = result
+        return web_results, semantic_results
 
-    def load_data_from_csv(self, file_path: str):
-        df = pd.read_csv(file_path)
-        return df
-    
-    def parse_results(self, results: List[Document] , df: pd.DataFrame):
+    async def _gather_context(self, query: str, company_name: str = None, mode: ChatMode = None,
+                              companies: Optional[List[str]] = None, vector: Optional[List[float]] = None):
+        """Run the web search and the semantic search for a query concurrently"""
+        with span("chat.context"):
+            web_text, docs = await asyncio.gather(
+                self.llm_service.web_search(query),
+                self.retrieval_service.search(query, _targets(company_name, companies), vector=vector)
+            )
+        semantic_text = self.llm_service.format_documents(docs)
+
+        web_results, semantic_results = await self._resolve_contexts([query], [web_text], [semantic_text], mode)
+        return web_results[0], semantic_results[0]
+
+    async def chat(self, query: str, company_name: str = None, mode: ChatMode = None,
+                   companies: Optional[List[str]] = None):
+        """
+        Chat with ITK. Repeated and near-identical queries are answered from the response cache.
+
+        The database search covers `company_name`, or the `companies` listed, or the
+        companies named in the query, or else every company.
+        """
+        with span("chat", mode=mode or CHAT_MODE) as fields:
+            embeddings = self.vector_store_service.embeddings
+            scope = _scope(company_name, companies)
+            version = self.companies.refresh_version(_targets(company_name, companies))
+            with span("chat.cache_lookup"):
+                cached, vector = await response_cache.lookup(query, scope, embeddings, mode, version=version)
+            fields["cache"] = "hit" if cached is not None else "miss"
+            CHAT_REQUESTS.inc(path="chat", cache=fields["cache"])
+            if cached is not None:
+                return cached
+
+            # Get web search and semantic search results
+            web_search, semantic_search = await self._gather_context(query, company_name, mode, companies, vector)
+
+            response = await self._itk_chat_chain(query, web_search, semantic_search)
+
+            await response_cache.put(query, scope, response, embeddings, mode, vector, version)
+
+            return response
+
+    async def chat_stream(self, query: str, company_name: str = None, mode: ChatMode = None,
+                          companies: Optional[List[str]] = None) -> AsyncIterator[str]:
+        """
+        Chat with ITK, yielding the final answer token by token as the model generates it.
+        A cached answer is yielded whole.
+        """
+        embeddings = self.vector_store_service.embeddings
+        scope = _scope(company_name, companies)
+        version = self.companies.refresh_version(_targets(company_name, companies))
+        with span("chat.cache_lookup"):
+            cached, vector = await response_cache.lookup(query, scope, embeddings, mode, version=version)
+        CHAT_REQUESTS.inc(path="stream", cache="hit" if cached is not None else "miss")
+        if cached is not None:
+            yield cached
+            return
+
+        web_search, semantic_search = await self._gather_context(query, company_name, mode, companies, vector)
+
+        with span("chat.prompt"):
+            messages = self._chat_prompt().format_messages(**self._chat_inputs(query, web_search, semantic_search))
+        parts = []
+        with span("chat.answer", stream=True) as fields:
+            start = time.perf_counter()
+            async for chunk in self.llm_service.model.astream(messages):
+                if chunk.content:
+                    if not parts:
+                        fields["first_token_seconds"] = round(time.perf_counter() - start, 6)
+                    parts.append(chunk.content)
+                    yield chunk.content
+
+        await response_cache.put(query, scope, "".join(parts), embeddings, mode, vector, version)
+
+    async def chat_batch(self, requests: Iterable[BatchChatRequest], mode: ChatMode = None,
+                         concurrency: int = BATCH_CONCURRENCY,
+                         window_size: int = BATCH_WINDOW_SIZE) -> AsyncIterator[BatchChatResult]:
+        """
+        Answer many queries, yielding results in request order one window at a time.
+
+        Within each window of `window_size` requests, cached answers are reused,
+        identical web searches run once, the vector searches of each company go to
+        Chroma as one batched query, and the summaries and final answers use the
+        model's abatch with at most `concurrency` calls in flight. A failing query
+        yields a result with `error` set instead of stopping the batch.
+        """
+        window = []
+        for request in requests:
+            window.append(request)
+            if len(window) >= window_size:
+                with span("chat.batch_window", queries=len(window)):
+                    results = await self._chat_window(window, mode, concurrency)
+                for result in results:
+                    yield result
+                window = []
+        if window:
+            with span("chat.batch_window", queries=len(window)):
+                results = await self._chat_window(window, mode, concurrency)
+            for result in results:
+                yield result
+
+    async def _chat_window(self, requests: List[BatchChatRequest], mode: ChatMode,
+                           concurrency: int) -> List[BatchChatResult]:
+        embeddings = self.vector_store_service.embeddings
+        results: List[Optional[BatchChatResult]] = [None] * len(requests)
+
+        def result(i: int, response: str = None, error: str = None) -> BatchChatResult:
+            request = requests[i]
+            return BatchChatResult(id=request.id, query=request.query, company=request.company,
+                                   response=response, error=error)
+
+        # One embedding call for the window, reused by the cache and the vector search
+        vectors = await response_cache.embed([request.query for request in requests], embeddings)
+        versions = [self.companies.refresh_version(_targets(request.company, request.companies)) for request in requests]
+        pending = []
+        for i, request in enumerate(requests):
+            cached, vectors[i] = await response_cache.lookup(
+                request.query, _scope(request.company, request.companies), embeddings, mode, vectors[i], versions[i]
+            )
+            CHAT_REQUESTS.inc(path="batch", cache="hit" if cached is not None else "miss")
+            if cached is not None:
+                results[i] = result(i, response=cached)
+            else:
+                pending.append(i)
+
+        if pending:
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def search(query: str):
+                async with semaphore:
+                    try:
+                        return await self.llm_service.web_search(query)
+                    except Exception as e:
+                        return e
+
+            # One web search per distinct query
+            unique_queries = {normalize_query(requests[i].query): requests[i].query for i in pending}
+            searches = dict(zip(
+                unique_queries,
+                await asyncio.gather(*(search(query) for query in unique_queries.values()))
+            ))
+
+            # One batched vector search per collection
+            semantic_texts: Dict[int, object] = {}
+            try:
+                docs_list = await self.retrieval_service.search_many(
+                    [requests[i].query for i in pending],
+                    [_targets(requests[i].company, requests[i].companies) for i in pending],
+                    vectors=[vectors[i] for i in pending]
+                )
+                for i, docs in zip(pending, docs_list):
+                    semantic_texts[i] = self.llm_service.format_documents(docs)
+            except Exception as e:
+                for i in pending:
+                    semantic_texts[i] = e
+
+            ready = []
+            for i in pending:
+                web_text = searches[normalize_query(requests[i].query)]
+                failure = next((value for value in (web_text, semantic_texts[i]) if isinstance(value, Exception)), None)
+                if failure is not None:
+                    results[i] = result(i, error=str(failure))
+                else:
+                    ready.append(i)
+
+            web_results, semantic_results = await self._resolve_contexts(
+                [requests[i].query for i in ready],
+                [searches[normalize_query(requests[i].query)] for i in ready],
+                [semantic_texts[i] for i in ready],
+                mode, max_concurrency=concurrency, return_exceptions=True
+            )
+
+            inputs, answerable = [], []
+            for i, web_search, semantic_search in zip(ready, web_results, semantic_results):
+                failure = next((value for value in (web_search, semantic_search) if isinstance(value, Exception)), None)
+                if failure is not None:
+                    results[i] = result(i, error=str(failure))
+                else:
+                    answerable.append(i)
+                    inputs.append(self._chat_inputs(requests[i].query, web_search, semantic_search))
+
+            chain = self._chat_prompt() | self.llm_service.model
+            responses = await chain.abatch(inputs, config={"max_concurrency": concurrency}, return_exceptions=True)
+
+            for i, response in zip(answerable, responses):
+                if isinstance(response, Exception):
+                    results[i] = result(i, error=str(response))
+                else:
+                    results[i] = result(i, response=response.content)
+                    await response_cache.put(
+                        requests[i].query, _scope(requests[i].company, requests[i].companies),
+                        response.content, embeddings, mode, vectors[i], versions[i]
+                    )
+
+        return results
+
+    def parse_results(self, results: List[ScrapeResult]):
         """
         Parse the results from the scrape service and return a dictionary of company documents.
+        Results without a document, i.e. anything but a success, are left out.
+
+        URLs are matched through an index of normalized registered URLs built once, trying
+        the requested URL first and then the URL the fetch was redirected to.
         """
-        company_docs = {}
-        company_results = list(map(lambda result: {
-            f"{df[df['URL'] == result.metadata['source']]['Company'].iloc[0]}" : result},
-              results))
-        
+        url_index = {
+            normalize_url(url): companies[0] for url, companies in self.companies.url_companies().items()
+        }
+
         # Group documents by company
-        
-        for result_dict in company_results:
-            for company, doc in result_dict.items():
-                if company not in company_docs:
-                    company_docs[company] = []
-                company_docs[company].append(doc)
+        company_docs = {}
+        for result in results:
+            if result is None or not result.ok:
+                continue
+            doc = result.document
+            company = None
+            for url in (doc.metadata['source'], doc.metadata.get('final_url')):
+                if url:
+                    company = url_index.get(normalize_url(url))
+                if company is not None:
+                    break
+
+            if company is None:
+                logger.warning(f"No company found for {doc.metadata['source']}")
+                continue
+            company_docs.setdefault(company, []).append(doc)
 
         return company_docs
     
-    async def _itk_chat_chain(self, query: str, web_search: WebSearchResult, semantic_search: SemanticSearch):
-        """
-        Combine web search and semantic search results to provide a comprehensive response to the user's query
-        """
-
-        prompt = ChatPromptTemplate.from_template(
+    def _chat_prompt(self) -> ChatPromptTemplate:
+        """Prompt for the final answer, shared by the blocking and streaming chat paths"""
+        return ChatPromptTemplate.from_template(
             """
             You are an intelligent assistant, I.T.K. (I Too Know), with access to regularly updated information about companies. 
             You have two sources of information:
@@ -91,35 +383,226 @@ class ITKService:
             """
         )
 
-        chain = prompt | self.llm_service.model
-
-        response = await chain.ainvoke({
-            "web_search": web_search.model_dump(),
-            "semantic_search": semantic_search.model_dump(),
+    def _chat_inputs(self, query: str, web_search: WebSearchResult | str, semantic_search: SemanticSearch | str) -> dict:
+        return {
+            "web_search": web_search.model_dump() if isinstance(web_search, BaseModel) else web_search,
+            "semantic_search": semantic_search.model_dump() if isinstance(semantic_search, BaseModel) else semantic_search,
             "query": query
-        })
+        }
+
+    async def _itk_chat_chain(self, query: str, web_search: WebSearchResult | str, semantic_search: SemanticSearch | str):
+        """
+        Combine web search and semantic search results to provide a comprehensive response to the user's query
+        """
+        with span("chat.prompt"):
+            messages = self._chat_prompt().format_messages(**self._chat_inputs(query, web_search, semantic_search))
+
+        with span("chat.answer"):
+            response = await self.llm_service.model.ainvoke(messages)
 
         return response.content
 
-    async def scrape_and_store_data(self, file_path: str):
-        df = self.load_data_from_csv(file_path)
+    async def _record_stored(self, company: str, docs: List[Document]):
+        """
+        Record embedded documents in the fetch ledger and drop the company's cached
+        answers, in this process and, through its refresh version, in every other one
+        """
+        self.companies.bump_refresh(company)
+        response_cache.invalidate(company)
+        for doc in docs:
+            if doc.metadata.get("content_hash"):
+                self.ledger.record(
+                    doc.metadata["source"],
+                    doc.metadata["content_hash"],
+                    doc.metadata.get("etag") or None,
+                    doc.metadata.get("last_modified") or None
+                )
+
+    def create_scrape_job(self, force: bool = False, trigger: str = "manual", shards: Optional[int] = None,
+                          urls: Optional[Iterable[str]] = None) -> Tuple[ScrapeJob, bool]:
+        """
+        Record a durable scrape job for every URL in the company registry, a full job, or
+        only those in `urls`, a partial one. An active job it would duplicate is returned
+        instead so overlapping triggers share one run; otherwise the new job queues behind
+        the active ones. The second value tells whether a new job was created.
+        """
+        url_companies = self.companies.url_companies(urls)
+        kwargs = {"shards": shards} if shards else {}
+        job, created = self.jobs.create(
+            "registry", url_companies, force=force, trigger=trigger, kind="full" if urls is None else "partial", **kwargs
+        )
+        if not created:
+            logger.info(f"Scrape job {job.id} is already {job.status}, joining it")
+        elif job.id != (self.jobs.active() or job).id:
+            logger.info(f"Scrape job {job.id} is queued behind the active scrape job")
+        return job, created
+
+    async def run_scrape_job(self, job_id: str, shards: Optional[List[int]] = None) -> "PipelineStats":
+        """
+        Work on a scrape job until no shard is left to claim, optionally only the given shards.
+
+        Each claimed shard's pending URLs stream through the scrape pipeline, and every URL
+        is checkpointed as soon as it is stored, unchanged or failed, so a crashed run
+        resumes from where it stopped. Re-embedding is limited to pages whose content changed,
+        unless the job was created with `force`.
+        """
+        from app.services.pipeline_service import PipelineStats, ScrapePipeline
+
+        await self._wait_for_turn(job_id, shards)
+        job = self.jobs.get(job_id)
+        worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        total = PipelineStats()
+
+        async def checkpoint(url: str, outcome: str, failure: Optional[ScrapeResult]):
+            self.jobs.checkpoint(job_id, url, outcome, failure.error if failure else None)
+            if failure is not None:
+                self.ledger.record_failure(url, outcome, failure.status, failure.error)
+            else:
+                self.ledger.clear_failure(url)
+
+        pipeline = ScrapePipeline(
+            self.scrape_service, self.vector_store_service,
+            on_stored=self._record_stored, on_url_done=checkpoint
+        )
+
+        while (shard := self.jobs.claim_shard(job_id, worker, shards)) is not None:
+            heartbeat = asyncio.create_task(self._renew_lease(job_id, shard, worker))
+            try:
+                url_companies = self.jobs.pending_urls(job_id, shard)
+                with span("scrape.run", urls=len(url_companies), shard=shard):
+                    stats = await pipeline.run(url_companies, conditional=not job.force)
+            except BaseException as e:
+                self.jobs.record_error(job_id, repr(e))
+                self.jobs.release(job_id, shard, worker, done=False)
+                raise
+            finally:
+                heartbeat.cancel()
 
-        # Scrape content for all URLs in the dataframe
-        all_urls = df['URL'].tolist()
-        results = await self.scrape_service.scrape_content(all_urls)
+            self.jobs.release(job_id, shard, worker, done=True)
+            for field, value in stats.model_dump().items():
+                setattr(total, field, getattr(total, field) + value)
+            log_event("scrape_run", job_id=job_id, shard=shard, **stats.model_dump())
 
-        # Parse the results
-        company_docs = self.parse_results(results, df)
+        if not self.jobs.finish_if_complete(job_id):
+            job = self.jobs.get(job_id)
+            if job.status == "failed":
+                logger.error(f"Scrape job {job_id} failed: {job.error}")
+        logger.info(
+            f"scraped {total.urls} links, stored {total.chunks} chunks from {total.documents} changed pages, "
+            f"skipped {total.unchanged} unchanged, {total.blocked} blocked, {total.failed} failed, "
+            f"{total.embed_failures} not stored"
+        )
+        return total
+
+    async def _wait_for_turn(self, job_id: str, shards: Optional[List[int]] = None):
+        """Until a job is the oldest active one, work on the jobs queued ahead of it, or wait for their workers"""
+        while True:
+            job = self.jobs.get(job_id)
+            active = self.jobs.active()
+            if job is None or job.status not in ACTIVE_STATUSES or active is None or active.id == job_id:
+                return
+            if any(shard.owner is None and not shard.done for shard in active.shard_status):
+                await self.run_scrape_job(active.id, shards)
+            else:
+                await asyncio.sleep(self.jobs.lease_seconds / 3)
+
+    async def _renew_lease(self, job_id: str, shard: int, worker: str):
+        """Keep a shard lease alive while its URLs are being scraped"""
+        while True:
+            await asyncio.sleep(self.jobs.lease_seconds / 3)
+            if not self.jobs.renew(job_id, shard, worker):
+                logger.warning(f"Lost the lease on shard {shard} of scrape job {job_id}")
+                return
 
-        # Store the results in the vector store
-        tasks = []
-        for company, docs in company_docs.items():
-            task = self.vector_store_service.embed_documets(company, docs)
-            tasks.append(task)
+    async def scrape_and_store_data(self, force: bool = False, trigger: str = "manual") -> "PipelineStats":
+        """
+        Scrape every registered URL and re-embed only the pages whose content changed,
+        streaming pages through the scrape pipeline so embedding overlaps scraping.
+        Pass `force` to ignore the fetch ledger and re-embed everything.
 
-        await asyncio.gather(*tasks)
+        The run is a durable job: if a full job is already active, this joins it and works
+        on its remaining shards instead of starting over, and if a partial job is active,
+        the new job runs after it.
+        """
+        job, _ = self.create_scrape_job(force=force, trigger=trigger)
+        return await self.run_scrape_job(job.id)
 
-        logger.info(f"scraped and stored data for {len(results)} links")
+    async def retry_failed_urls(self, trigger: str = "retry") -> Optional["PipelineStats"]:
+        """
+        Scrape the registered URLs whose retry is due after being blocked or failing.
+        Returns None when nothing is due, or when another scrape job is active since
+        that job covers them.
+        """
+        due = self.ledger.due_retries()
+        registered = self.companies.url_companies(due)
+        # URLs removed from the registry since they failed leave the retry queue
+        self.ledger.delete_failures(url for url in due if url not in registered)
+        due = [url for url in due if url in registered]
+        if not due:
+            return None
+
+        job, created = self.create_scrape_job(trigger=trigger, urls=due)
+        if not created:
+            return None
+        logger.info(f"Retrying {job.total} blocked or failed URLs in scrape job {job.id}")
+        return await self.run_scrape_job(job.id)
+
+    async def add_company(self, name: str, urls: Iterable[str] = ()) -> Dict:
+        """
+        Register a company, or add URLs to a registered one. New URLs are dropped from the
+        fetch ledger so the next scrape stores them for this company even when they are
+        unchanged since another company's scrape.
+        """
+        existing = await self.companies.get_item(name)
+        known = set(existing["urls"]) if existing else set()
+        company = await self.companies.save_item({"name": name, "urls": list(urls)})
+        for url in company["urls"]:
+            if url not in known:
+                self.ledger.delete(url)
+        return company
+
+    async def update_company(self, company_id: str, updates: Dict) -> Dict:
+        """Change a registered company, dropping its new URLs from the fetch ledger"""
+        existing = await self.companies.get_item(company_id)
+        known = set(existing["urls"]) if existing else set()
+        company = await self.companies.update_item(company_id, updates)
+        for url in company["urls"]:
+            if url not in known:
+                self.ledger.delete(url)
+        self._forget_unregistered(known - set(company["urls"]))
+        return company
+
+    async def remove_company_urls(self, company_id: str, urls: Iterable[str]) -> Dict:
+        """Stop scraping URLs for a company. Raises KeyError for an unknown company"""
+        urls = list(urls)
+        company = await self.companies.remove_urls(company_id, urls)
+        self._forget_unregistered(urls)
+        return company
+
+    def _forget_unregistered(self, urls: Iterable[str]):
+        """Take the URLs no company lists any more out of the retry queue"""
+        urls = list(urls)
+        registered = self.companies.url_companies(urls)
+        self.ledger.delete_failures(url for url in urls if url not in registered)
+
+    async def remove_company(self, company_id: str, purge: bool = False) -> bool:
+        """
+        Stop scraping a company. With `purge`, its stored chunks and indexes are deleted
+        too. Returns False if the company was not registered.
+        """
+        company = await self.companies.get_item(company_id)
+        if company is None:
+            return False
+        await self.companies.delete_item(company_id)
+        self._forget_unregistered(company["urls"])
+        self.companies.bump_refresh(company["name"])
+        response_cache.invalidate(company["name"])
+        if purge:
+            await self.vector_store_service.delete_company(company["id"])
+            for url in company["urls"]:
+                self.ledger.delete(url)
+        logger.info(f"Removed {company['name']} from the company registry" + (" and the vector store" if purge else ""))
+        return True
 
     @abstractmethod
     def load_data_from_db(self):
@@ -0,0 +1,346 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.core.config import JOB_STORE_PATH, SCRAPE_LEASE_SECONDS, SCRAPE_SHARD_ATTEMPTS, SCRAPE_SHARDS
+from app.models.job import ScrapeJob, ShardStatus
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+def shard_of(url: str, shards: int) -> int:
+    """Stable shard number of a URL"""
+    return zlib.crc32(url.encode("utf-8")) % max(shards, 1)
+
+
+class JobStore:
+    """
+    Persistent SQLite record of scrape jobs, their URLs and the shard leases of their workers.
+
+    A job is either "full", covering every registered URL, or "partial", covering a
+    subset such as the URLs due a retry. Creating a full job while another full job
+    is pending or running returns that one, and creating a partial job returns an
+    active job that already covers its URLs, so overlapping triggers share a run
+    instead of embedding everything twice. Any other job is queued: jobs run one at
+    a time, oldest first, so a small retry job never stands in for the nightly
+    full scrape. A job's URLs are split into shards. A worker leases
+    a shard, renews the lease while it works, and checkpoints every URL as it
+    finishes, so a worker that dies only loses its lease and the next one resumes
+    from the URLs still pending. A shard claimed `max_attempts` times without
+    finishing marks its job failed, so a job that keeps crashing its workers stops
+    blocking the queue. Named leases elect a single process for other work,
+    such as running the scheduler.
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH, lease_seconds: float = SCRAPE_LEASE_SECONDS,
+                 max_attempts: int = SCRAPE_SHARD_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS scrape_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                trigger TEXT NOT NULL,
+                source TEXT NOT NULL,
+                force INTEGER NOT NULL,
+                shards INTEGER NOT NULL,
+                kind TEXT NOT NULL DEFAULT 'full',
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS scrape_job_urls (
+                job_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                companies TEXT NOT NULL,
+                shard INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                updated_at TEXT,
+                PRIMARY KEY (job_id, url)
+            );
+            CREATE INDEX IF NOT EXISTS scrape_job_urls_shard ON scrape_job_urls (job_id, shard, status);
+            CREATE TABLE IF NOT EXISTS scrape_shard_leases (
+                job_id TEXT NOT NULL,
+                shard INTEGER NOT NULL,
+                owner TEXT,
+                expires REAL,
+                done INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_id, shard)
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+            """
+        )
+        # Stores created before jobs had a kind
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(scrape_jobs)")}
+        if "kind" not in columns:
+            self._conn.execute("ALTER TABLE scrape_jobs ADD COLUMN kind TEXT NOT NULL DEFAULT 'full'")
+        # and before shards counted their attempts
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(scrape_shard_leases)")}
+        if "attempts" not in columns:
+            self._conn.execute("ALTER TABLE scrape_shard_leases ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+    def _job(self, row) -> ScrapeJob:
+        return ScrapeJob(
+            id=row[0], status=row[1], trigger=row[2], source=row[3], force=bool(row[4]), shards=row[5],
+            created_at=row[6], started_at=row[7], finished_at=row[8], error=row[9], kind=row[10]
+        )
+
+    _JOB_COLUMNS = "id, status, trigger, source, force, shards, created_at, started_at, finished_at, error, kind"
+
+    def _joinable(self, url_companies: Dict[str, List[str]], kind: str):
+        """The active job a new job of `kind` for the URLs would duplicate, if any"""
+        if kind == "full":
+            return self._conn.execute(
+                f"SELECT {self._JOB_COLUMNS} FROM scrape_jobs WHERE status IN (?, ?) AND kind = 'full' "
+                "ORDER BY created_at LIMIT 1",
+                ACTIVE_STATUSES
+            ).fetchone()
+
+        for row in self._conn.execute(
+            f"SELECT {self._JOB_COLUMNS} FROM scrape_jobs WHERE status IN (?, ?) ORDER BY created_at", ACTIVE_STATUSES
+        ).fetchall():
+            urls = list(url_companies)
+            covered = 0
+            for i in range(0, len(urls), 500):
+                batch = urls[i:i + 500]
+                covered += self._conn.execute(
+                    f"SELECT COUNT(*) FROM scrape_job_urls WHERE job_id = ? AND url IN ({','.join('?' * len(batch))})",
+                    [row[0], *batch]
+                ).fetchone()[0]
+            if covered == len(urls):
+                return row
+        return None
+
+    def create(self, source: str, url_companies: Dict[str, List[str]], force: bool = False,
+               shards: int = SCRAPE_SHARDS, trigger: str = "manual", kind: str = "full") -> Tuple[ScrapeJob, bool]:
+        """
+        Create a job for the URLs, or return the active job it would duplicate. The
+        second value tells whether a new job was created; a new job waits behind any
+        job already active.
+        """
+        shards = max(shards, 1)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._joinable(url_companies, kind)
+                if row is not None:
+                    self._conn.execute("COMMIT")
+                    return self._job(row), False
+
+                job_id = uuid.uuid4().hex
+                now = datetime.now().isoformat()
+                self._conn.execute(
+                    "INSERT INTO scrape_jobs (id, status, trigger, source, force, shards, created_at, kind) "
+                    "VALUES (?, 'pending', ?, ?, ?, ?, ?, ?)",
+                    (job_id, trigger, source, int(force), shards, now, kind)
+                )
+                self._conn.executemany(
+                    "INSERT INTO scrape_job_urls (job_id, url, companies, shard, status) VALUES (?, ?, ?, ?, 'pending')",
+                    [(job_id, url, json.dumps(companies), shard_of(url, shards)) for url, companies in url_companies.items()]
+                )
+                self._conn.executemany(
+                    "INSERT INTO scrape_shard_leases (job_id, shard) VALUES (?, ?)",
+                    [(job_id, shard) for shard in range(shards)]
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return self.get(job_id), True
+
+    def get(self, job_id: str) -> Optional[ScrapeJob]:
+        """Return a job with its per-outcome counts and shard progress"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self._JOB_COLUMNS} FROM scrape_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM scrape_job_urls WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+            shard_rows = self._conn.execute(
+                """
+                SELECT l.shard, l.owner, l.expires, l.done, l.attempts,
+                       (SELECT COUNT(*) FROM scrape_job_urls u WHERE u.job_id = l.job_id AND u.shard = l.shard),
+                       (SELECT COUNT(*) FROM scrape_job_urls u
+                        WHERE u.job_id = l.job_id AND u.shard = l.shard AND u.status = 'pending')
+                FROM scrape_shard_leases l WHERE l.job_id = ? ORDER BY l.shard
+                """,
+                (job_id,)
+            ).fetchall()
+
+        job = self._job(row)
+        job.counts = counts
+        job.total = sum(counts.values())
+        job.progress = round(1 - counts.get("pending", 0) / job.total, 4) if job.total else 1.0
+        now = time.time()
+        job.shard_status = [
+            ShardStatus(
+                shard=shard, total=total, remaining=remaining, done=bool(done), attempts=attempts,
+                owner=owner if expires and expires > now else None,
+                lease_expires=datetime.fromtimestamp(expires).isoformat() if expires and expires > now else None
+            )
+            for shard, owner, expires, done, attempts, total, remaining in shard_rows
+        ]
+        return job
+
+    def active(self) -> Optional[ScrapeJob]:
+        """The oldest pending or running job, the one whose turn it is to run, if any"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM scrape_jobs WHERE status IN (?, ?) ORDER BY created_at LIMIT 1", ACTIVE_STATUSES
+            ).fetchone()
+        return self.get(row[0]) if row else None
+
+    def recent(self, limit: int = 20) -> List[ScrapeJob]:
+        """Most recent jobs first"""
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute(
+                "SELECT id FROM scrape_jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            )]
+        return [self.get(job_id) for job_id in ids]
+
+    def claim_shard(self, job_id: str, owner: str, shards: Optional[List[int]] = None) -> Optional[int]:
+        """
+        Lease an unfinished shard that no live worker holds, optionally restricted to
+        `shards`. Returns the shard number, or None when there is nothing left to claim,
+        including when the job is no longer pending or running. A shard already claimed
+        `max_attempts` times marks the job failed instead.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT l.shard, l.attempts FROM scrape_shard_leases l JOIN scrape_jobs j ON j.id = l.job_id "
+                    "WHERE l.job_id = ? AND l.done = 0 AND (l.owner IS NULL OR l.expires < ?) AND j.status IN (?, ?) "
+                    "ORDER BY l.shard",
+                    (job_id, now, *ACTIVE_STATUSES)
+                ).fetchall()
+                free = [(shard, attempts) for shard, attempts in rows if shards is None or shard in shards]
+                if not free:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                exhausted = [(shard, attempts) for shard, attempts in free if attempts >= self.max_attempts]
+                if exhausted:
+                    shard, attempts = exhausted[0]
+                    self._conn.execute(
+                        "UPDATE scrape_jobs SET status = 'failed', finished_at = ?, "
+                        "error = ? || COALESCE(', last error: ' || error, '') WHERE id = ? AND status IN (?, ?)",
+                        (datetime.now().isoformat(), f"Shard {shard} did not finish in {attempts} attempts",
+                         job_id, *ACTIVE_STATUSES)
+                    )
+                    self._conn.execute("COMMIT")
+                    return None
+
+                self._conn.execute(
+                    "UPDATE scrape_shard_leases SET owner = ?, expires = ?, attempts = attempts + 1 "
+                    "WHERE job_id = ? AND shard = ?",
+                    (owner, now + self.lease_seconds, job_id, free[0][0])
+                )
+                self._conn.execute(
+                    "UPDATE scrape_jobs SET status = 'running', started_at = COALESCE(started_at, ?) "
+                    "WHERE id = ? AND status IN (?, ?)",
+                    (datetime.now().isoformat(), job_id, *ACTIVE_STATUSES)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return free[0][0]
+
+    def renew(self, job_id: str, shard: int, owner: str) -> bool:
+        """Extend a shard lease. Returns False if the lease was lost to another worker"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE scrape_shard_leases SET expires = ? WHERE job_id = ? AND shard = ? AND owner = ?",
+                (time.time() + self.lease_seconds, job_id, shard, owner)
+            )
+        return cursor.rowcount == 1
+
+    def release(self, job_id: str, shard: int, owner: str, done: bool):
+        """Give a shard lease up, marking the shard finished when `done`"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE scrape_shard_leases SET owner = NULL, expires = NULL, done = MAX(done, ?) "
+                "WHERE job_id = ? AND shard = ? AND owner = ?",
+                (int(done), job_id, shard, owner)
+            )
+
+    def pending_urls(self, job_id: str, shard: int) -> Dict[str, List[str]]:
+        """URLs of a shard still to be scraped, with the companies that list them"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, companies FROM scrape_job_urls WHERE job_id = ? AND shard = ? AND status = 'pending'",
+                (job_id, shard)
+            ).fetchall()
+        return {url: json.loads(companies) for url, companies in rows}
+
+    def checkpoint(self, job_id: str, url: str, status: str, error: Optional[str] = None):
+        """Record the outcome of a URL so a resumed job skips it"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE scrape_job_urls SET status = ?, error = ?, updated_at = ? WHERE job_id = ? AND url = ?",
+                (status, error, datetime.now().isoformat(), job_id, url)
+            )
+
+    def record_error(self, job_id: str, error: str):
+        with self._lock:
+            self._conn.execute("UPDATE scrape_jobs SET error = ? WHERE id = ?", (error, job_id))
+
+    def finish_if_complete(self, job_id: str) -> bool:
+        """Mark the job completed once every shard is done. Returns whether it is complete"""
+        with self._lock:
+            remaining = self._conn.execute(
+                "SELECT COUNT(*) FROM scrape_shard_leases WHERE job_id = ? AND done = 0", (job_id,)
+            ).fetchone()[0]
+            if remaining:
+                return False
+            self._conn.execute(
+                "UPDATE scrape_jobs SET status = 'completed', finished_at = COALESCE(finished_at, ?) WHERE id = ?",
+                (datetime.now().isoformat(), job_id)
+            )
+        return True
+
+    def acquire_lease(self, name: str, owner: str) -> bool:
+        """
+        Take a named lease, or extend it if `owner` already holds it. Returns False while
+        another owner holds a lease that has not expired.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE leases.owner = excluded.owner OR leases.expires < ?",
+                (name, owner, now + self.lease_seconds, now)
+            )
+        return cursor.rowcount == 1
+
+    def release_lease(self, name: str, owner: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,173 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from app.core.config import FETCH_LEDGER_PATH, SCRAPE_RETRY_BASE, SCRAPE_RETRY_MAX, SCRAPE_RETRY_MAX_ATTEMPTS
+from app.models.scrape import FetchFailure
+
+
+class FetchLedger:
+    """
+    Persistent per-URL record of the last successful fetch.
+
+    Stores the ETag, Last-Modified and content hash of every URL so a scrape can
+    send conditional GETs and skip re-embedding pages whose content has not changed.
+
+    URLs that were blocked or failed are kept in a retry queue with their failure
+    counts. Each consecutive failure doubles the delay before the URL is due again,
+    and after `retry_max_attempts` it is left to the next full scrape.
+    """
+
+    def __init__(self, path: str = FETCH_LEDGER_PATH, retry_base: float = SCRAPE_RETRY_BASE,
+                 retry_max: float = SCRAPE_RETRY_MAX, retry_max_attempts: int = SCRAPE_RETRY_MAX_ATTEMPTS):
+        self.path = path
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.retry_max_attempts = retry_max_attempts
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS fetch_ledger (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                fetched_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS fetch_failures (
+                url TEXT PRIMARY KEY,
+                outcome TEXT NOT NULL,
+                status INTEGER,
+                error TEXT,
+                consecutive_failures INTEGER NOT NULL,
+                total_failures INTEGER NOT NULL,
+                first_failed_at TEXT NOT NULL,
+                last_failed_at TEXT NOT NULL,
+                next_retry_at TEXT
+            );
+            CREATE INDEX IF NOT EXISTS fetch_failures_due ON fetch_failures (next_retry_at);
+            """
+        )
+        self._conn.commit()
+
+    def get(self, url: str) -> Optional[Dict]:
+        """Return the ledger entry for a URL, if any"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash, fetched_at FROM fetch_ledger WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"url": url, "etag": row[0], "last_modified": row[1], "content_hash": row[2], "fetched_at": row[3]}
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Headers for a conditional GET based on the last recorded fetch"""
+        entry = self.get(url)
+        headers = {}
+        if entry and entry["content_hash"]:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record(self, url: str, content_hash: Optional[str], etag: Optional[str] = None,
+               last_modified: Optional[str] = None):
+        """Insert or replace the entry for a URL"""
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO fetch_ledger (url, etag, last_modified, content_hash, fetched_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    content_hash = COALESCE(excluded.content_hash, fetch_ledger.content_hash),
+                    fetched_at = excluded.fetched_at
+                """,
+                (url, etag, last_modified, content_hash, datetime.now().isoformat())
+            )
+            self._conn.commit()
+
+    def delete(self, url: str):
+        """Forget a URL so its next fetch is unconditional"""
+        with self._lock:
+            self._conn.execute("DELETE FROM fetch_ledger WHERE url = ?", (url,))
+            self._conn.commit()
+
+    def record_failure(self, url: str, outcome: str, status: Optional[int] = None, error: Optional[str] = None):
+        """Count a blocked or failed scrape of a URL and schedule its next retry"""
+        now = datetime.now()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT consecutive_failures, total_failures, first_failed_at FROM fetch_failures WHERE url = ?",
+                (url,)
+            ).fetchone()
+            consecutive, total, first_failed_at = row if row else (0, 0, None)
+            if not consecutive:
+                first_failed_at = now.isoformat()
+            consecutive += 1
+            next_retry_at = None
+            if consecutive < self.retry_max_attempts:
+                delay = min(self.retry_base * 2 ** (consecutive - 1), self.retry_max)
+                next_retry_at = (now + timedelta(seconds=delay)).isoformat()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fetch_failures VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, outcome, status, error, consecutive, total + 1, first_failed_at, now.isoformat(), next_retry_at)
+            )
+            self._conn.commit()
+
+    def clear_failure(self, url: str):
+        """Take a URL that scraped successfully out of the retry queue, keeping its failure total"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE fetch_failures SET consecutive_failures = 0, next_retry_at = NULL "
+                "WHERE url = ? AND consecutive_failures > 0",
+                (url,)
+            )
+            self._conn.commit()
+
+    def delete_failures(self, urls: Iterable[str]):
+        """Drop the failure records of URLs, e.g. once they are no longer scraped"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM fetch_failures WHERE url = ?", [(url,) for url in urls])
+            self._conn.commit()
+
+    def due_retries(self) -> List[str]:
+        """URLs in the retry queue whose next retry is due"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url FROM fetch_failures WHERE next_retry_at <= ? ORDER BY next_retry_at",
+                (datetime.now().isoformat(),)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def failures(self, limit: int = 100, failing_only: bool = True) -> List[FetchFailure]:
+        """Failure records, most recently failed first. Recovered URLs are included unless `failing_only`"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT url, outcome, status, error, consecutive_failures, total_failures,
+                       first_failed_at, last_failed_at, next_retry_at
+                FROM fetch_failures {"WHERE consecutive_failures > 0" if failing_only else ""}
+                ORDER BY last_failed_at DESC LIMIT ?
+                """,
+                (limit,)
+            ).fetchall()
+        return [
+            FetchFailure(
+                url=row[0], outcome=row[1], status=row[2], error=row[3], consecutive_failures=row[4],
+                total_failures=row[5], first_failed_at=row[6], last_failed_at=row[7], next_retry_at=row[8]
+            )
+            for row in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
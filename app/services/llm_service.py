@@ -1,46 +1,109 @@
 import os
+from typing import TYPE_CHECKING, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import LLMResult
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_chroma import Chroma
-from langchain_openai import ChatOpenAI
-from langchain_community.tools import DuckDuckGoSearchRun
+from app.core.config import CHAT_MODEL
 from app.models.web_search import WebSearchResult
 from app.models.semantic_search import SemanticSearch
+from app.services.search_service import WebSearchService, web_search_service
+from app.utils.metrics import metrics, span
+
+if TYPE_CHECKING:
+    import httpx
+    from langchain_chroma import Chroma
+
+LLM_TOKENS = metrics.counter("itk_llm_tokens_total", "Tokens used by chat model calls", ("model", "kind"))
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Count the prompt and completion tokens reported by every chat model call"""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def on_llm_end(self, response: LLMResult, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.inc(usage.get("input_tokens", 0), model=self.model, kind="prompt")
+                    LLM_TOKENS.inc(usage.get("output_tokens", 0), model=self.model, kind="completion")
+
 
 class LLMService:
-    def __init__(self):
-        self.model = ChatOpenAI(
-            model="gpt-4o-mini", 
-            temperature=0, 
-            api_key=os.getenv("OPENAI_API_KEY")
-            )
+    def __init__(self, model: Optional[BaseChatModel] = None, search_service: WebSearchService = web_search_service,
+                 http_client: Optional["httpx.Client"] = None, http_async_client: Optional["httpx.AsyncClient"] = None):
+        if model is None:
+            from langchain_openai import ChatOpenAI
+            model = ChatOpenAI(
+                model=CHAT_MODEL, 
+                temperature=0, 
+                api_key=os.getenv("OPENAI_API_KEY"),
+                stream_usage=True,
+                callbacks=[TokenUsageHandler(CHAT_MODEL)],
+                http_client=http_client,
+                http_async_client=http_async_client
+                )
+        self.model = model
         self.web_search_parser = PydanticOutputParser(pydantic_object=WebSearchResult)
         self.semantic_search_parser = PydanticOutputParser(pydantic_object=SemanticSearch)
+        self.search_service = search_service
 
-    async def semantic_search_llm(self, vector_store: Chroma, query: str) -> SemanticSearch:
-        """
-        Query the vector store for relevant documents and structure them using LLM
-        """
-        # Get relevant documents from vector store
-        docs = await vector_store.asimilarity_search(query, k=2)
+    async def search_documents(self, vector_store: "Chroma", query: str, k: int = 2) -> List[Document]:
+        """Get relevant documents from the vector store"""
+        return await vector_store.asimilarity_search(query, k=k)
 
-        # Combine document contents 
+    def format_documents(self, docs: List[Document]) -> str:
+        """Combine document contents with their timestamp and source"""
         raw_text = ""
 
         for doc in docs:
-            raw_text += f"Timestamp: {doc.metadata['timestamp']}\n"
+            raw_text += f"Timestamp: {doc.metadata.get('timestamp', '')}\n"
             raw_text += f"Content: {doc.page_content}\n"
             raw_text += f"Source: {doc.metadata['source']}\n"
             raw_text += f"-----------------------------------\n"
-        
-        if not raw_text:
-            print(f"No relevant documents found for query: {query}")
-            return SemanticSearch(
-                query="",
-                results=[],
-                result_summary="",
-                metadata={}
-            )
+
+        return raw_text
+
+    async def semantic_search_llm(self, vector_store: "Chroma", query: str) -> SemanticSearch:
+        """
+        Query the vector store for relevant documents and structure them using LLM
+        """
+        docs = await self.search_documents(vector_store, query)
+        return await self.summarize_documents(query, self.format_documents(docs))
+
+    async def summarize_documents(self, query: str, raw_text: str) -> SemanticSearch:
+        """
+        Structure retrieved document text using LLM
+        """
+        return (await self.summarize_documents_batch([query], [raw_text]))[0]
+
+    async def summarize_documents_batch(self, queries: List[str], raw_texts: List[str],
+                                        max_concurrency: Optional[int] = None,
+                                        return_exceptions: bool = False) -> List[SemanticSearch]:
+        """
+        Structure the retrieved document text of several queries with one batched LLM call
+        """
+        results: List[Optional[SemanticSearch]] = [None] * len(queries)
+        pending = []
+        for i, (query, raw_text) in enumerate(zip(queries, raw_texts)):
+            if not raw_text:
+                print(f"No relevant documents found for query: {query}")
+                results[i] = SemanticSearch(
+                    query="",
+                    results=[],
+                    result_summary="",
+                    metadata={}
+                )
+            else:
+                pending.append(i)
+
+        if not pending:
+            return results
 
         # Create prompt template
         prompt = ChatPromptTemplate.from_template(
@@ -59,22 +122,51 @@ class LLMService:
         
         # Create chain and run
         chain = prompt | self.model | self.semantic_search_parser
-        structured_response = await chain.ainvoke({
-            "text": raw_text,
-            "query": query,
-            "format_instructions": self.semantic_search_parser.get_format_instructions()
-        })
+        with span("llm.summarize", queries=len(pending)):
+            structured_responses = await chain.abatch(
+                [{
+                    "text": raw_texts[i],
+                    "query": queries[i],
+                    "format_instructions": self.semantic_search_parser.get_format_instructions()
+                } for i in pending],
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=return_exceptions
+            )
 
-        return structured_response
+        for i, structured_response in zip(pending, structured_responses):
+            results[i] = structured_response
+        return results
+
+    async def web_search(self, query: str) -> str:
+        """
+        Perform web search and return the raw result snippets, cached and rate limited
+        by the shared search service
+        """
+        with span("llm.web_search"):
+            return await self.search_service.search(query)
 
     async def web_search_llm(self, query: str) -> WebSearchResult:
         """
         Perform web search and structure results using LLM
         """
+        search_results = await self.web_search(query)
+        return await self.structure_web_search(query, search_results)
+
+    async def structure_web_search(self, query: str, search_results: str) -> WebSearchResult:
+        """
+        Structure raw web search results using LLM
+        """
+        return (await self.structure_web_search_batch([query], [search_results]))[0]
+
+    async def structure_web_search_batch(self, queries: List[str], search_results: List[str],
+                                         max_concurrency: Optional[int] = None,
+                                         return_exceptions: bool = False) -> List[WebSearchResult]:
+        """
+        Structure the raw web search results of several queries with one batched LLM call
+        """
+        if not queries:
+            return []
 
-        search = DuckDuckGoSearchRun()
-        search_results = await search.ainvoke(f"{query}")
-        
         # Create prompt template
         prompt = ChatPromptTemplate.from_template(
             """You are a helpful assistant that analyzes information.
@@ -93,10 +185,15 @@ class LLMService:
         
         # Create chain and run
         chain = prompt | self.model | self.web_search_parser
-        structured_response = await chain.ainvoke({
-            "text": search_results,
-            "query": query,
-            "format_instructions": self.web_search_parser.get_format_instructions()
-        })
+        with span("llm.structure_web_search", queries=len(queries)):
+            structured_responses = await chain.abatch(
+                [{
+                    "text": text,
+                    "query": query,
+                    "format_instructions": self.web_search_parser.get_format_instructions()
+                } for query, text in zip(queries, search_results)],
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=return_exceptions
+            )
         
-        return structured_response
+        return structured_responses
@@ -0,0 +1,235 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from pydantic import BaseModel
+from app.core.config import (
+    PIPELINE_EMBED_BATCH_CHUNKS,
+    PIPELINE_PARSE_WORKERS,
+    PIPELINE_QUEUE_SIZE,
+)
+from app.models.scrape import ScrapeOutcome, ScrapeResult
+from app.services.scrape_service import CompanyWebScraper, FetchedPage
+from app.services.vectorstore_service import VectorStoreService
+from app.utils.logging import logger
+from app.utils.metrics import span
+
+
+class PipelineStats(BaseModel):
+    """Counters for one scrape pipeline run"""
+
+    urls: int = 0
+    unchanged: int = 0
+    blocked: int = 0
+    failed: int = 0
+    documents: int = 0
+    chunks: int = 0
+    near_duplicates: int = 0
+    embed_failures: int = 0
+    raw_bytes: int = 0
+    indexed_bytes: int = 0
+    chunks_saved: int = 0
+
+
+class ScrapePipeline:
+    """
+    Scrape, parse, split and embed as concurrent stages connected by bounded queues.
+
+    Pages flow fetch -> HTML-to-text -> split -> embed/upsert. Every queue holds at
+    most `queue_size` items, so a slow stage makes the ones before it wait instead of
+    buffering the whole run in memory, and embedding starts with the first pages
+    rather than after the last one. Only pages that scraped successfully are split,
+    and only their chunks that are not near-duplicates of a stored one are embedded.
+
+    The embed stage groups up to `embed_batch_chunks` chunks per embedding call and
+    calls `on_stored` once a company's documents are upserted. `on_url_done` is called
+    once per URL with its final outcome, `stored`, `unchanged`, `blocked` or `failed`,
+    and the failed scrape result if any, after every company listing it is handled.
+    """
+
+    def __init__(self, scrape_service: CompanyWebScraper, vector_store_service: VectorStoreService,
+                 on_stored: Optional[Callable[[str, List[Document]], Awaitable[None]]] = None,
+                 on_url_done: Optional[Callable[[str, str, Optional[ScrapeResult]], Awaitable[None]]] = None,
+                 queue_size: int = PIPELINE_QUEUE_SIZE, parse_workers: int = PIPELINE_PARSE_WORKERS,
+                 embed_batch_chunks: int = PIPELINE_EMBED_BATCH_CHUNKS):
+        self.scrape_service = scrape_service
+        self.vector_store_service = vector_store_service
+        self.on_stored = on_stored
+        self.on_url_done = on_url_done
+        self.queue_size = max(1, queue_size)
+        self.parse_workers = max(1, parse_workers)
+        self.embed_batch_chunks = max(1, embed_batch_chunks)
+
+    async def run(self, url_companies: Dict[str, List[str]], conditional: bool = True) -> PipelineStats:
+        """Scrape every URL and store its chunks under each company that lists it"""
+        stats = PipelineStats(urls=len(url_companies))
+        pages: asyncio.Queue = asyncio.Queue(self.queue_size)
+        documents: asyncio.Queue = asyncio.Queue(self.queue_size)
+        chunks: asyncio.Queue = asyncio.Queue(self.queue_size)
+        boilerplate = self.scrape_service.boilerplate_filter()
+        # Companies each URL still has to be stored for, and the errors of URLs that failed to store
+        remaining: Dict[str, int] = {}
+        store_errors: Dict[str, str] = {}
+
+        async def done(url: str, outcome: str, failure: Optional[ScrapeResult] = None):
+            if self.on_url_done is not None:
+                await self.on_url_done(url, outcome, failure)
+
+        async def settle(url: str, error: Optional[str] = None):
+            if error is not None:
+                store_errors[url] = error
+            remaining[url] -= 1
+            if remaining[url] == 0:
+                del remaining[url]
+                error = store_errors.pop(url, None)
+                if error is None:
+                    await done(url, "stored")
+                else:
+                    await done(url, "failed", ScrapeResult(url=url, outcome=ScrapeOutcome.ERROR, error=error))
+
+        async def on_page(index: int, url: str, page: Optional[FetchedPage]):
+            if page is None:
+                stats.unchanged += 1
+                await done(url, "unchanged")
+            else:
+                await pages.put(page)
+
+        async def fetch_stage():
+            try:
+                await self.scrape_service.fetch_all(list(url_companies), on_page, conditional=conditional)
+            finally:
+                for _ in range(self.parse_workers):
+                    await pages.put(None)
+
+        async def parse_worker():
+            while (page := await pages.get()) is not None:
+                result = await self.scrape_service.parse_page(page, boilerplate)
+                if result.outcome == ScrapeOutcome.NOT_MODIFIED:
+                    stats.unchanged += 1
+                    await done(page.url, "unchanged")
+                    continue
+                if result.outcome == ScrapeOutcome.BLOCKED:
+                    stats.blocked += 1
+                    await done(page.url, "blocked", result)
+                    continue
+                if result.outcome == ScrapeOutcome.ERROR:
+                    stats.failed += 1
+                    await done(page.url, "failed", result)
+                    continue
+
+                stats.documents += 1
+                remaining[page.url] = len(url_companies[page.url])
+                for company in url_companies[page.url]:
+                    await documents.put((company, result.document))
+
+        async def parse_stage():
+            await asyncio.gather(*(parse_worker() for _ in range(self.parse_workers)))
+            await documents.put(None)
+
+        async def split_stage():
+            while (item := await documents.get()) is not None:
+                company, doc = item
+                doc_chunks = self.vector_store_service.split_documents(company, [doc])
+                kept, orphaned = await self.vector_store_service.drop_near_duplicates(
+                    company, doc_chunks, [doc.metadata["source"]]
+                )
+                stats.near_duplicates += len(doc_chunks) - len(kept)
+                self._forget(orphaned)
+                await chunks.put((company, doc, kept))
+            await chunks.put(None)
+
+        async def embed_stage():
+            finished = False
+            while not finished:
+                item = await chunks.get()
+                if item is None:
+                    break
+                batch, size = [item], len(item[2])
+                while size < self.embed_batch_chunks:
+                    try:
+                        item = chunks.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    if item is None:
+                        finished = True
+                        break
+                    batch.append(item)
+                    size += len(item[2])
+                await self._store_batch(batch, stats, settle)
+
+        tasks = [asyncio.create_task(stage) for stage in (fetch_stage(), parse_stage(), split_stage(), embed_stage())]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        stats.raw_bytes = boilerplate.raw_bytes
+        stats.indexed_bytes = boilerplate.indexed_bytes
+        stats.chunks_saved = boilerplate.chunks_saved
+        if boilerplate.pages:
+            logger.info(
+                f"main-content extraction kept {stats.indexed_bytes} of {stats.raw_bytes} bytes "
+                f"from {boilerplate.pages} pages, saving {stats.chunks_saved} chunks"
+            )
+
+        return stats
+
+    def _forget(self, urls: List[str]):
+        """Drop URLs from the fetch ledger so the next run stores them again, however unchanged"""
+        if self.scrape_service.ledger is None:
+            return
+        for url in urls:
+            self.scrape_service.ledger.delete(url)
+
+    async def _unrecord(self, company: str, sources: List[str]):
+        """Forget the fingerprints of sources that failed to store, so they do not hide later chunks"""
+        try:
+            self._forget(await self.vector_store_service.forget_fingerprints(company, sources))
+        except Exception as e:
+            logger.error(f"Error forgetting the fingerprints of {len(sources)} sources for {company}: {str(e)}")
+
+    async def _store_batch(self, batch: List[Tuple[str, Document, List[Document]]], stats: PipelineStats,
+                           settle: Callable[[str, Optional[str]], Awaitable[None]]):
+        """
+        Embed the chunks of a batch in one call, then upsert them company by company,
+        settling each document's URL as stored or failed for that company
+        """
+        texts = [chunk.page_content for _, _, doc_chunks in batch for chunk in doc_chunks]
+        try:
+            with span("pipeline.embed", chunks=len(texts)):
+                vectors = await self.vector_store_service.embeddings.aembed_documents(texts) if texts else []
+        except Exception as e:
+            logger.error(f"Error embedding {len(texts)} chunks: {str(e)}")
+            stats.embed_failures += len(batch)
+            for company, doc, _ in batch:
+                await self._unrecord(company, [doc.metadata["source"]])
+                await settle(doc.metadata["source"], repr(e))
+            return
+
+        by_company: Dict[str, Tuple[List[Document], List[Document], List[List[float]]]] = {}
+        offset = 0
+        for company, doc, doc_chunks in batch:
+            docs, company_chunks, company_vectors = by_company.setdefault(company, ([], [], []))
+            docs.append(doc)
+            company_chunks.extend(doc_chunks)
+            company_vectors.extend(vectors[offset:offset + len(doc_chunks)])
+            offset += len(doc_chunks)
+
+        for company, (docs, company_chunks, company_vectors) in by_company.items():
+            sources = list({doc.metadata["source"] for doc in docs})
+            try:
+                await self.vector_store_service.store_chunks(company, company_chunks, sources, company_vectors)
+                stats.chunks += len(company_chunks)
+                if self.on_stored is not None:
+                    await self.on_stored(company, docs)
+                error = None
+
+            except Exception as e:
+                logger.error(f"Error storing documents for {company}: {str(e)}")
+                stats.embed_failures += len(docs)
+                await self._unrecord(company, sources)
+                error = repr(e)
+
+            for doc in docs:
+                await settle(doc.metadata["source"], error)
@@ -0,0 +1,224 @@
+import asyncio
+import re
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+import numpy as np
+from langchain_core.documents import Document
+from app.core.config import (
+    RETRIEVAL_FETCH_K,
+    RETRIEVAL_HYBRID,
+    RETRIEVAL_K,
+    RETRIEVAL_MAX_COMPANIES,
+    RETRIEVAL_MMR_LAMBDA,
+    RETRIEVAL_RRF_K,
+)
+from app.services.vectorstore_service import VectorStoreService, collection_registry
+from app.utils.logging import logger
+from app.utils.metrics import span
+
+
+class Hit(NamedTuple):
+    """A candidate chunk, with the searches that returned it"""
+    document: Document
+    embedding: np.ndarray
+    vector: bool
+    keyword_score: Optional[float] = None
+
+
+class RetrievalService:
+    """
+    Retrieval across several per-company collections.
+
+    Each query is searched in the collections of the companies it targets: the ones
+    given with the request, otherwise the ones named in the query, otherwise the
+    registered companies with stored chunks. A query naming no company searches at
+    most `max_companies` collections, those whose best BM25 keyword match scores
+    highest. Collections are queried concurrently, `fetch_k` candidates each, and the
+    candidates are merged by cosine similarity to the query and re-ranked with
+    maximal marginal relevance so the top `k` are not near-copies of each other.
+
+    In hybrid mode each collection's BM25 keyword index is searched as well, and the
+    vector and keyword rankings are combined with reciprocal rank fusion before the
+    re-ranking, so exact names, tickers and codes are found even when their
+    embeddings are not close to the query.
+    """
+
+    def __init__(self, vector_store_service: VectorStoreService, k: int = RETRIEVAL_K,
+                 fetch_k: int = RETRIEVAL_FETCH_K, lambda_mult: float = RETRIEVAL_MMR_LAMBDA,
+                 hybrid: bool = RETRIEVAL_HYBRID, rrf_k: int = RETRIEVAL_RRF_K,
+                 companies: Optional[Callable[[], Iterable[str]]] = None,
+                 max_companies: int = RETRIEVAL_MAX_COMPANIES):
+        self.vector_store_service = vector_store_service
+        self.companies = companies
+        self.max_companies = max_companies
+        self.k = k
+        self.fetch_k = max(fetch_k, k)
+        self.lambda_mult = lambda_mult
+        self.hybrid = hybrid
+        self.rrf_k = rrf_k
+
+    @staticmethod
+    def companies_in_query(query: str, companies: Sequence[str]) -> List[str]:
+        """Companies whose name appears in the query as a whole word"""
+        text = query.lower()
+        return [
+            company for company in companies
+            if re.search(rf"(?<!\w){re.escape(company.lower())}(?!\w)", text)
+        ]
+
+    async def search(self, query: str, companies: Optional[Sequence[str]] = None,
+                     k: Optional[int] = None, vector: Optional[List[float]] = None) -> List[Document]:
+        """Top-k chunks for one query"""
+        return (await self.search_many([query], [companies], k, [vector]))[0]
+
+    async def search_many(self, queries: List[str], companies: List[Optional[Sequence[str]]],
+                          k: Optional[int] = None,
+                          vectors: Optional[List[Optional[List[float]]]] = None) -> List[List[Document]]:
+        """
+        Top-k chunks for several queries. The queries without a precomputed vector in
+        `vectors` are embedded in one call, and each collection receives one Chroma
+        query carrying every query that targets it.
+        """
+        if not queries:
+            return []
+        k = k or self.k
+
+        known = None
+        targets = []
+        for query, requested in zip(queries, companies):
+            if not requested:
+                if known is None:
+                    known = await self._known_companies()
+                requested = self.companies_in_query(query, known) or await self._pick_companies(query, known)
+            targets.append(list(dict.fromkeys(collection_registry.normalize(c) for c in requested)))
+
+        vectors = list(vectors or [None] * len(queries))
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            with span("retrieval.embed_queries", queries=len(missing)):
+                embedded = await self.vector_store_service.embeddings.aembed_documents([queries[i] for i in missing])
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+
+        by_company = {}
+        for i, target in enumerate(targets):
+            for company in target:
+                by_company.setdefault(company, []).append(i)
+
+        with span("retrieval.search", queries=len(queries), collections=len(by_company)):
+            results = await asyncio.gather(*(
+                self._query_collection(company, [queries[i] for i in indices], [vectors[i] for i in indices])
+                for company, indices in by_company.items()
+            ))
+
+        candidates: List[List[Hit]] = [[] for _ in queries]
+        for indices, hits_per_query in zip(by_company.values(), results):
+            for i, hits in zip(indices, hits_per_query):
+                candidates[i].extend(hits)
+
+        with span("retrieval.rerank", queries=len(queries)):
+            return [self._mmr(np.asarray(vectors[i], dtype=np.float32), candidates[i], k) for i in range(len(queries))]
+
+    async def _known_companies(self) -> List[str]:
+        """Registered companies with stored chunks, or every collection when no registry is given"""
+        if self.companies is None:
+            return await self.vector_store_service.list_companies()
+        indexed = set(await asyncio.to_thread(self.vector_store_service.keyword_index.companies))
+        return [name for name in self.companies() if collection_registry.normalize(name) in indexed]
+
+    async def _pick_companies(self, query: str, known: List[str]) -> List[str]:
+        """The companies a query naming none of them is searched in, at most `max_companies`"""
+        if self.max_companies <= 0 or len(known) <= self.max_companies:
+            return known
+        names = [collection_registry.normalize(name) for name in known]
+        with span("retrieval.pick_companies", companies=len(names)):
+            picked = await asyncio.to_thread(
+                self.vector_store_service.keyword_index.rank_companies, query, names, self.max_companies
+            )
+        # Without enough keyword matches, the first companies fill the remaining slots
+        return picked + [name for name in names if name not in picked][:self.max_companies - len(picked)]
+
+    def _keyword_search(self, company: str, queries: List[str]):
+        index = self.vector_store_service.keyword_index
+        return [dict(index.search(company, query, self.fetch_k)) for query in queries]
+
+    async def _query_collection(self, company: str, queries: List[str],
+                                vectors: List[List[float]]) -> List[List[Hit]]:
+        """Fetch candidates with their embeddings from one collection, an empty list per query on failure"""
+        include = ["documents", "metadatas", "embeddings"]
+        try:
+            vector_store = await self.vector_store_service.get_or_create_vectorstore(company)
+            searches = [asyncio.to_thread(
+                vector_store._collection.query, query_embeddings=vectors, n_results=self.fetch_k, include=include
+            )]
+            if self.hybrid:
+                searches.append(asyncio.to_thread(self._keyword_search, company, queries))
+            results, *keyword = await asyncio.gather(*searches)
+            keyword_scores: List[Dict[str, float]] = keyword[0] if keyword else [{} for _ in queries]
+
+            # Chunks only the keyword search found are read back with their embeddings
+            missing = {
+                id_ for ids, scores in zip(results["ids"], keyword_scores) for id_ in scores if id_ not in ids
+            }
+            extra = {}
+            if missing:
+                fetched = await asyncio.to_thread(vector_store._collection.get, ids=list(missing), include=include)
+                for id_, document, metadata, embedding in zip(
+                    fetched["ids"], fetched["documents"], fetched["metadatas"], fetched["embeddings"]
+                ):
+                    extra[id_] = (document, metadata, embedding)
+        except Exception as e:
+            logger.error(f"Error searching {company}: {str(e)}")
+            return [[] for _ in vectors]
+
+        def hit(document, metadata, embedding, vector, score):
+            return Hit(
+                Document(page_content=document, metadata={**(metadata or {}), "company": company}),
+                np.asarray(embedding, dtype=np.float32), vector, score
+            )
+
+        hits_per_query = []
+        for ids, documents, metadatas, embeddings, scores in zip(
+            results["ids"], results["documents"], results["metadatas"], results["embeddings"], keyword_scores
+        ):
+            hits = [
+                hit(document, metadata, embedding, True, scores.get(id_))
+                for id_, document, metadata, embedding in zip(ids, documents, metadatas, embeddings)
+            ]
+            hits.extend(hit(*extra[id_], False, score) for id_, score in scores.items() if id_ not in ids and id_ in extra)
+            hits_per_query.append(hits)
+        return hits_per_query
+
+    def _fuse(self, similarity: np.ndarray, hits: List[Hit]) -> np.ndarray:
+        """Reciprocal rank fusion of the vector and keyword rankings, scaled to at most 1"""
+        fused = np.zeros(len(hits), dtype=np.float32)
+        vector = [i for i, hit in enumerate(hits) if hit.vector]
+        keyword = [i for i, hit in enumerate(hits) if hit.keyword_score is not None]
+        for rank, i in enumerate(sorted(vector, key=lambda i: -similarity[i])):
+            fused[i] += 1 / (self.rrf_k + rank + 1)
+        for rank, i in enumerate(sorted(keyword, key=lambda i: -hits[i].keyword_score)):
+            fused[i] += 1 / (self.rrf_k + rank + 1)
+        return fused / fused.max()
+
+    def _mmr(self, query_vector: np.ndarray, hits: List[Hit], k: int) -> List[Document]:
+        """Pick k hits by maximal marginal relevance over the fused ranking, or cosine similarity"""
+        if not hits:
+            return []
+
+        def normalize(matrix: np.ndarray) -> np.ndarray:
+            norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+            return matrix / np.where(norms == 0, 1, norms)
+
+        embeddings = normalize(np.stack([hit.embedding for hit in hits]))
+        relevance = embeddings @ normalize(query_vector)
+        if self.hybrid:
+            relevance = self._fuse(relevance, hits)
+        similarity = embeddings @ embeddings.T
+
+        selected = [int(np.argmax(relevance))]
+        while len(selected) < min(k, len(hits)):
+            redundancy = similarity[:, selected].max(axis=1)
+            scores = self.lambda_mult * relevance - (1 - self.lambda_mult) * redundancy
+            scores[selected] = -np.inf
+            selected.append(int(np.argmax(scores)))
+
+        return [hits[i].document for i in selected]
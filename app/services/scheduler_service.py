@@ -1,16 +1,97 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime
+from typing import Optional
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from app.services.itk_service import ITKService
+from app.core.config import SCHEDULER_MODE, SCHEDULER_POLL_SECONDS, SCRAPE_RETRY_INTERVAL_MINUTES
+from app.core.container import container
+from app.utils.logging import logger
+
+SCHEDULER_LEASE = "scheduler"
 
-itk_service = ITKService()
 scheduler = AsyncIOScheduler()
+_owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_election: Optional[asyncio.Task] = None
+_polling = asyncio.Lock()
+
+
+async def _work_on_active_job():
+    """Join the active scrape job while one of its shards has no live worker"""
+    if _polling.locked():
+        return
+    async with _polling:
+        itk_service = container.itk_service
+        job = itk_service.jobs.active()
+        if job is None or not any(shard.owner is None and not shard.done for shard in job.shard_status):
+            return
+        logger.info(f"Working on scrape job {job.id} at {job.progress:.0%}")
+        await itk_service.run_scrape_job(job.id)
+
 
-async def start_scheduler():
+def _add_jobs():
+    itk_service = container.itk_service
     scheduler.add_job(
         itk_service.scrape_and_store_data, 
         'cron', 
-        args=['sample_data/companies.csv'], 
+        kwargs={'trigger': 'scheduler'},
         hour=0, minute=0, second=0)
-    scheduler.start()
+
+    # Retry blocked and failed URLs as their backoff expires
+    scheduler.add_job(
+        itk_service.retry_failed_urls,
+        'interval',
+        minutes=SCRAPE_RETRY_INTERVAL_MINUTES)
+
+    # Resume a scrape job interrupted by a crash or restart, and run jobs queued by API workers
+    scheduler.add_job(
+        _work_on_active_job,
+        'interval',
+        seconds=SCHEDULER_POLL_SECONDS,
+        next_run_time=datetime.now())
+
+
+async def _elect():
+    """Run the scheduler only while this process holds the scheduler lease, taking over when its holder dies"""
+    jobs = container.itk_service.jobs
+    leading = False
+    while True:
+        held = jobs.acquire_lease(SCHEDULER_LEASE, _owner)
+        if held and not leading:
+            logger.info(f"Elected to run the scheduler as {_owner}")
+            if scheduler.running:
+                scheduler.resume()
+            else:
+                _add_jobs()
+                scheduler.start()
+        elif leading and not held:
+            logger.warning("Lost the scheduler lease, pausing the scheduler")
+            scheduler.pause()
+        leading = held
+        await asyncio.sleep(jobs.lease_seconds / 3)
+
+
+async def start_scheduler(mode: str = SCHEDULER_MODE):
+    """
+    Start the scheduler in the given mode: "embedded" runs it in this process,
+    "elected" only in the one process holding the scheduler lease, and "off" not at all
+    """
+    global _election
+    if mode == "off":
+        logger.info("Scheduler disabled in this process")
+    elif mode == "elected":
+        _election = asyncio.create_task(_elect())
+    else:
+        _add_jobs()
+        scheduler.start()
+
 
 async def stop_scheduler():
-    scheduler.shutdown()
\ No newline at end of file
+    global _election
+    if _election is not None:
+        _election.cancel()
+        _election = None
+        container.itk_service.jobs.release_lease(SCHEDULER_LEASE, _owner)
+    if scheduler.running:
+        scheduler.shutdown()
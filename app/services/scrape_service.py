@@ -1,82 +1,426 @@
 import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
-from app.utils.logging import logger
-from playwright.async_api import async_playwright
+import hashlib
+import multiprocessing
+import random
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from app.core.config import (
+    BROWSER_PERSISTENT,
+    COLLAPSE_REPEATED_BLOCKS,
+    HTML_PARSER,
+    MAIN_CONTENT_EXTRACTION,
+    MAIN_CONTENT_MAX_LINK_DENSITY,
+    MAIN_CONTENT_MIN_WORDS,
+    PARSE_PROCESSES,
+    SCRAPE_BACKOFF_BASE,
+    SCRAPE_BACKOFF_MAX,
+    SCRAPE_CONNECT_TIMEOUT,
+    SCRAPE_MAX_CONCURRENT,
+    SCRAPE_MAX_RETRIES,
+    SCRAPE_PER_HOST_CONCURRENT,
+    SCRAPE_READ_TIMEOUT,
+    USER_AGENT,
+)
+from app.models.scrape import ScrapeOutcome, ScrapeResult
+from app.services.browser_service import BrowserPool
+from app.services.chunking_service import TokenChunker
+from app.services.ledger_service import FetchLedger
+from app.utils.html import (
+    Block,
+    available_parser,
+    blocks_to_marked_text,
+    blocks_to_text,
+    clean_text,
+    extract_blocks,
+    html_to_text,
+)
+from app.utils.logging import log_event, logger
+from app.utils.metrics import metrics, span
 from langchain_core.documents import Document
 from datetime import datetime
-from typing import List
+from multidict import CIMultiDictProxy
+from typing import Any, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+# Statuses meaning the site refused the scraper rather than failed
+BLOCKED_STATUSES = {401, 403, 407, 429, 451}
+
+
+class FetchResponse(NamedTuple):
+    status: int
+    html: Optional[str]
+    headers: Optional[CIMultiDictProxy]
+    url: str
+
+
+class FetchedPage(NamedTuple):
+    url: str
+    html: Optional[str]
+    final_url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    ledger_entry: Optional[Dict]
+    error: Optional[str] = None
+    status: Optional[int] = None
+
+FETCHES = metrics.counter("itk_fetch_total", "Page fetches by outcome", ("outcome",))
+FETCH_SECONDS = metrics.histogram("itk_fetch_seconds", "Time to fetch a page, retries and fallback included", ("outcome",))
+FETCH_RETRIES = metrics.counter("itk_fetch_retries_total", "HTTP fetch attempts retried after an error or retryable status")
+SCRAPE_BYTES = metrics.counter(
+    "itk_scrape_bytes_total", "Bytes fetched, extracted from page HTML and kept for indexing", ("kind",)
+)
+
+
+class BoilerplateFilter:
+    """
+    Per-run memory of the text blocks already kept for each site.
+
+    A block that repeats on another page of the same site (menus, sidebars,
+    call-to-action panels the extractor missed) is dropped from every page
+    after the first. Also counts the bytes removed along the way, and the chunks
+    saved: the chunks `chunker` splits each page's full text into, less those of
+    the text kept for indexing.
+    """
+
+    def __init__(self, collapse: bool = True, chunker: Optional[TokenChunker] = None):
+        self.collapse = collapse
+        self.chunker = chunker or TokenChunker()
+        self._seen: Dict[str, Set[bytes]] = {}
+        self.pages = 0
+        self.raw_bytes = 0
+        self.extracted_bytes = 0
+        self.indexed_bytes = 0
+        self.chunks_saved = 0
+
+    def filter(self, url: str, blocks: List[Block], page_text: str) -> List[Block]:
+        host = urlparse(url).netloc.lower().removeprefix("www.")
+        seen = self._seen.setdefault(host, set())
+
+        kept = [] if self.collapse else blocks
+        for kind, text in blocks if self.collapse else ():
+            key = hashlib.blake2b(text.lower().encode("utf-8"), digest_size=8).digest()
+            if key in seen:
+                continue
+            seen.add(key)
+            kept.append((kind, text))
+
+        raw_bytes = len(page_text.encode("utf-8"))
+        extracted_bytes = len(blocks_to_text(blocks).encode("utf-8"))
+        indexed_bytes = len(blocks_to_text(kept).encode("utf-8"))
+        self.pages += 1
+        self.raw_bytes += raw_bytes
+        self.extracted_bytes += extracted_bytes
+        self.indexed_bytes += indexed_bytes
+        SCRAPE_BYTES.inc(extracted_bytes, kind="extracted")
+        SCRAPE_BYTES.inc(indexed_bytes, kind="indexed")
+
+        # Every page is split on its own, so the saving is counted per page
+        indexed = self.chunker.split_text(blocks_to_marked_text(kept)) if kept else []
+        self.chunks_saved += max(len(self.chunker.split_text(page_text)) - len(indexed), 0)
+        return kept
+
 
 class CompanyWebScraper:
+    def __init__(self, browser_pool: Optional[BrowserPool] = None, persistent_browser: bool = BROWSER_PERSISTENT,
+                 per_host_concurrent: int = SCRAPE_PER_HOST_CONCURRENT, max_retries: int = SCRAPE_MAX_RETRIES,
+                 ledger: Optional[FetchLedger] = None, parser: str = HTML_PARSER,
+                 parse_processes: int = PARSE_PROCESSES, main_content: bool = MAIN_CONTENT_EXTRACTION,
+                 collapse_repeated_blocks: bool = COLLAPSE_REPEATED_BLOCKS):
+        self.browser_pool = browser_pool or BrowserPool()
+        self.ledger = ledger
+        self.parser = available_parser(parser)
+        if self.parser != parser:
+            logger.warning(f"HTML parser {parser} is not installed, using {self.parser}")
+        self.parse_processes = parse_processes
+        self.main_content = main_content
+        self.collapse_repeated_blocks = collapse_repeated_blocks
+        self._parse_executor: Optional[Executor] = None
+        self.persistent_browser = persistent_browser
+        self.per_host_concurrent = max(1, per_host_concurrent)
+        self.max_retries = max(0, max_retries)
+        self.timeout = aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=SCRAPE_CONNECT_TIMEOUT,
+            sock_read=SCRAPE_READ_TIMEOUT
+        )
 
     async def clean_text(self, text):
         """Clean extracted text by removing extra whitespace and normalizing"""
-        import re
-        # Remove special characters but keep basic punctuation 
-        text = re.sub(r'[^\w\s.,!?-]', '', text)
-        return text.strip()
+        return clean_text(text)
+
+    def _executor(self) -> Optional[Executor]:
+        """
+        Process pool for parsing, created on first use. Workers are spawned rather than
+        forked so they do not inherit the event loop or open database handles.
+        With `parse_processes` set to 0, parsing runs in a thread instead.
+        """
+        if self.parse_processes > 0 and self._parse_executor is None:
+            self._parse_executor = ProcessPoolExecutor(
+                max_workers=self.parse_processes,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._parse_executor
+
+    async def _run_parser(self, func: Callable, *args) -> Any:
+        """Run a parsing function off the event loop"""
+        executor = self._executor()
+        if executor is None:
+            return await asyncio.to_thread(func, *args)
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+    async def html_to_text(self, html: str) -> str:
+        """Extract and clean the text of a page off the event loop"""
+        return await self._run_parser(html_to_text, html, self.parser)
+
+    async def extract_blocks(self, html: str):
+        """Extract the main-content blocks of a page off the event loop"""
+        return await self._run_parser(
+            extract_blocks, html, self.parser, MAIN_CONTENT_MIN_WORDS, MAIN_CONTENT_MAX_LINK_DENSITY
+        )
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds to wait before the next attempt, honouring a numeric Retry-After"""
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), SCRAPE_BACKOFF_MAX)
+        delay = SCRAPE_BACKOFF_BASE * (2 ** attempt)
+        return min(delay + random.uniform(0, delay), SCRAPE_BACKOFF_MAX)
+
+    async def _fetch_html(self, url: str, session: aiohttp.ClientSession,
+                          headers: Optional[Dict[str, str]] = None) -> FetchResponse:
+        """
+        GET a URL, retrying timeouts, connection errors and retryable statuses with backoff.
+        Returns the final status, the body when the status is 200, the response headers
+        and the URL the request ended up at after redirects.
+        """
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 200:
+                        return FetchResponse(response.status, await response.text(), response.headers, str(response.url))
+                    if response.status not in RETRYABLE_STATUSES or attempt == self.max_retries:
+                        return FetchResponse(response.status, None, response.headers, str(response.url))
+                    retry_after = response.headers.get("Retry-After")
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"Retrying {url} after error: {e!r}")
+
+            FETCH_RETRIES.inc()
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+
+    def _to_document(self, url: str, text: str, **metadata) -> Document:
+        return Document(
+            page_content=text,
+            metadata={"source": url, "timestamp": datetime.now().isoformat(), **metadata}
+        )
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    async def fetch_page(self, url: str, session: aiohttp.ClientSession, conditional: bool = True) -> Optional[FetchedPage]:
+        """
+        Fetch the HTML of a single URL with aiohttp, falling back to the browser pool on a non-200.
 
-    async def scrape_content(self, urls: List[str] | str, max_concurrent=100):
+        With a ledger, the GET is conditional on the last ETag/Last-Modified and None is
+        returned when the server answers 304. A page whose fetch failed both ways is
+        returned with `error` set and the last HTTP status, if any.
+        """
+        start = time.perf_counter()
+        outcome, status = "failed", None
+        try:
+            entry = self.ledger.get(url) if self.ledger and conditional else None
+            headers = self.ledger.conditional_headers(url) if entry else None
+
+            # First try with aiohttp
+            status, html, response_headers, final_url = await self._fetch_html(url, session, headers=headers)
+            etag = response_headers.get("ETag") if response_headers else None
+            last_modified = response_headers.get("Last-Modified") if response_headers else None
+            outcome = "http"
+
+            if status == 304 and entry:
+                self.ledger.record(url, None, etag or entry["etag"], last_modified or entry["last_modified"])
+                logger.debug(f"{url} not modified")
+                outcome = "not_modified"
+                return None
+
+            if html is None:
+                # Fall back to the shared Playwright pool
+                html, final_url = await self.browser_pool.fetch(url)
+                etag, last_modified = None, None
+                outcome = "browser"
+
+            SCRAPE_BYTES.inc(len(html.encode("utf-8")), kind="fetched")
+            return FetchedPage(url, html, final_url, etag, last_modified, entry, status=status)
+
+        except Exception as e:
+            logger.error(f"Both methods failed for {url}")
+            outcome = "blocked" if status in BLOCKED_STATUSES else "failed"
+            return FetchedPage(url, None, url, None, None, None, error=repr(e), status=status)
+
+        finally:
+            elapsed = time.perf_counter() - start
+            FETCHES.inc(outcome=outcome)
+            FETCH_SECONDS.observe(elapsed, outcome=outcome)
+            log_event("fetch", url=url, outcome=outcome, status=status, seconds=round(elapsed, 6))
+
+    async def parse_page(self, page: FetchedPage, boilerplate: Optional[BoilerplateFilter] = None) -> ScrapeResult:
+        """
+        Extract and clean the text of a fetched page. The result is `not_modified` when
+        the text hashes to the value recorded in the ledger, `blocked` or `error` when
+        the page could not be fetched or holds no text, and only carries a document
+        on success.
+
+        With main-content extraction on, only the page's content blocks are kept, and
+        `boilerplate` drops blocks already kept from another page of the same site.
+        The ledger hash is taken before that cross-page step, so it only changes
+        when the page itself does.
+        """
+        if page.html is None:
+            outcome = ScrapeOutcome.BLOCKED if page.status in BLOCKED_STATUSES else ScrapeOutcome.ERROR
+            return ScrapeResult(url=page.url, outcome=outcome, status=page.status, error=page.error)
+
+        blocks = None
+        try:
+            with span("scrape.parse", parser=self.parser):
+                if self.main_content:
+                    blocks, page_text = await self.extract_blocks(page.html)
+                    clean_content = blocks_to_text(blocks)
+                else:
+                    clean_content = await self.html_to_text(page.html)
+        except Exception as e:
+            logger.error(f"Error parsing {page.url}: {str(e)}")
+            return ScrapeResult(url=page.url, outcome=ScrapeOutcome.ERROR, status=page.status, error=repr(e))
+
+        if not clean_content.strip():
+            return ScrapeResult(url=page.url, outcome=ScrapeOutcome.ERROR, status=page.status, error="No text extracted")
+
+        content_hash = self.content_hash(clean_content)
+        if page.ledger_entry and page.ledger_entry["content_hash"] == content_hash:
+            self.ledger.record(page.url, content_hash, page.etag, page.last_modified)
+            logger.debug(f"{page.url} content unchanged")
+            return ScrapeResult(url=page.url, outcome=ScrapeOutcome.NOT_MODIFIED, status=page.status)
+
+        # Headings are marked so the chunker can split along the page's sections
+        if blocks is not None:
+            if boilerplate is not None:
+                blocks = boilerplate.filter(page.final_url or page.url, blocks, page_text)
+            clean_content = blocks_to_marked_text(blocks)
+
+        # The ledger is only updated once the document has been embedded
+        document = self._to_document(
+            page.url, clean_content,
+            final_url=page.final_url,
+            content_hash=content_hash,
+            etag=page.etag or "",
+            last_modified=page.last_modified or ""
+        )
+        return ScrapeResult(url=page.url, outcome=ScrapeOutcome.SUCCESS, document=document, status=page.status)
+
+    def boilerplate_filter(self) -> BoilerplateFilter:
+        """A fresh cross-page filter for one scrape run"""
+        return BoilerplateFilter(collapse=self.collapse_repeated_blocks)
+
+    async def process_url(self, url: str, session: aiohttp.ClientSession, conditional: bool = True) -> ScrapeResult:
+        """Fetch and parse a single URL"""
+        page = await self.fetch_page(url, session, conditional)
+        if page is None:
+            return ScrapeResult(url=url, outcome=ScrapeOutcome.NOT_MODIFIED, status=304)
+        return await self.parse_page(page)
+
+    async def fetch_all(self, urls: List[str], handle: Callable[[int, str, Optional[FetchedPage]], Awaitable[None]],
+                        max_concurrent: int = SCRAPE_MAX_CONCURRENT, conditional: bool = True):
+        """
+        Fetch URLs concurrently and pass each page to `handle` as soon as it arrives.
+
+        URLs wait in one queue per host and `max_concurrent` workers take them from the
+        hosts in turn, skipping hosts that already have `per_host_concurrent` fetches in
+        flight. A new fetch starts as soon as any slot frees up, and a worker finding
+        every host with waiting URLs saturated sleeps until a fetch finishes. A worker
+        waits for `handle` before taking the next URL, so a slow consumer applies
+        backpressure to the fetches.
+        """
+        pending: Dict[str, Deque[Tuple[int, str]]] = {}
+        for index, url in enumerate(urls):
+            pending.setdefault(urlparse(url).netloc.lower(), deque()).append((index, url))
+        in_flight: Dict[str, int] = {host: 0 for host in pending}
+        slot_freed = asyncio.Condition()
+
+        def take() -> Optional[Tuple[str, int, str]]:
+            """The next URL of the first host below its limit, which then goes to the back of the turn"""
+            for host in pending:
+                if in_flight[host] < self.per_host_concurrent:
+                    waiting = pending.pop(host)
+                    index, url = waiting.popleft()
+                    if waiting:
+                        pending[host] = waiting
+                    in_flight[host] += 1
+                    return host, index, url
+            return None
+
+        async def worker(session):
+            while True:
+                async with slot_freed:
+                    while (taken := take()) is None:
+                        if not pending:
+                            return
+                        await slot_freed.wait()
+                host, index, url = taken
+                try:
+                    page = await self.fetch_page(url, session, conditional)
+                finally:
+                    async with slot_freed:
+                        in_flight[host] -= 1
+                        slot_freed.notify_all()
+                await handle(index, url, page)
+
+        connector = aiohttp.TCPConnector(limit=max_concurrent)
+        try:
+            async with aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=connector,
+                headers={"User-Agent": USER_AGENT}
+            ) as session:
+                workers = [worker(session) for _ in range(min(max_concurrent, len(urls)))]
+                await asyncio.gather(*workers)
+        finally:
+            if not self.persistent_browser:
+                await self.browser_pool.stop()
+
+    async def scrape_content(self, urls: List[str] | str, max_concurrent=SCRAPE_MAX_CONCURRENT,
+                             conditional: bool = True):
         """
         Scrape content from multiple URLs concurrently using BeautifulSoup first,
-        falling back to Playwright if needed
+        falling back to Playwright if needed.
+
+        Results keep the order of `urls`. Pages are only `not_modified` when
+        `conditional` and a ledger are set.
         """
 
         if isinstance(urls, str):
             urls = [urls]
 
-        results = []
-        
-        async def process_url(url, session):
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-            try:
-                # First try with aiohttp
-                async with session.get(url, headers=headers) as response:     
-                    if response.status == 200:
-                        html = await response.text()
-                        soup = BeautifulSoup(html, "html.parser")
-                        
-                        # Extract text
-                        text = ' \n'.join(soup.stripped_strings)
-                        clean_content = await self.clean_text(text)
-                        return Document(
-                            page_content=clean_content,
-                            metadata={"source": url, "timestamp": datetime.now().isoformat()}
-                        )
-                    else:
-                        # Fall back to Playwright
-                        async with async_playwright() as p:
-                            browser = await p.chromium.launch(headless=True)
-                            page = await browser.new_page()
-                            
-                            await page.goto(url)
-                            await page.wait_for_load_state("networkidle")
-                            
-                            html = await page.content()
-                            soup = BeautifulSoup(html, "html.parser")
-                            
-                            text = ' \n'.join(soup.stripped_strings)
-                            clean_content = await self.clean_text(text)
-                            
-                            await browser.close()
-                            return Document(
-                                page_content=clean_content,
-                                metadata={"source": url, "timestamp": datetime.now().isoformat()}
-                            )            
-            except Exception as e:
-                logger.error(f"Both methods failed for {url}")
-                return Document(
-                    page_content="No content found",
-                    metadata={"source": url, "timestamp": datetime.now().isoformat()}
-                )     
-
-        async with aiohttp.ClientSession() as session:
-            for i in range(0, len(urls), max_concurrent):
-                chunk = urls[i:i + max_concurrent]
-                chunk_tasks = [process_url(url, session) for url in chunk]
-                chunk_results = await asyncio.gather(*chunk_tasks)
-                results.extend(chunk_results)
+        results: List[Optional[ScrapeResult]] = [None] * len(urls)
+        boilerplate = self.boilerplate_filter()
+
+        async def handle(index: int, url: str, page: Optional[FetchedPage]):
+            if page is None:
+                results[index] = ScrapeResult(url=url, outcome=ScrapeOutcome.NOT_MODIFIED, status=304)
+            else:
+                results[index] = await self.parse_page(page, boilerplate)
+
+        await self.fetch_all(urls, handle, max_concurrent=max_concurrent, conditional=conditional)
                 
         return results
+
+    async def close(self):
+        """Release the shared browser pool and the parse processes"""
+        await self.browser_pool.stop()
+        if self._parse_executor is not None:
+            self._parse_executor.shutdown(wait=False, cancel_futures=True)
+            self._parse_executor = None
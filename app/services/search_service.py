@@ -0,0 +1,144 @@
+import asyncio
+import importlib
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from app.core.config import (
+    WEB_SEARCH_BACKEND,
+    WEB_SEARCH_BURST,
+    WEB_SEARCH_CACHE_MAX_ENTRIES,
+    WEB_SEARCH_CACHE_TTL,
+    WEB_SEARCH_RATE,
+)
+from app.services.cache_service import normalize_query
+from app.utils.logging import logger
+
+
+class SearchBackend(ABC):
+    """Abstract base class defining a web search provider"""
+
+    @abstractmethod
+    async def search(self, query: str) -> str:
+        """Return the raw result snippets for a query"""
+        pass
+
+
+class DuckDuckGoBackend(SearchBackend):
+    """DuckDuckGo through one shared search tool"""
+
+    def __init__(self):
+        from langchain_community.tools import DuckDuckGoSearchRun
+        self.client = DuckDuckGoSearchRun()
+
+    async def search(self, query: str) -> str:
+        return await self.client.ainvoke(query)
+
+
+def load_backend(name: str = WEB_SEARCH_BACKEND) -> SearchBackend:
+    """Build the backend named `duckduckgo`, or given as a `package.module:ClassName` path"""
+    if name == "duckduckgo":
+        return DuckDuckGoBackend()
+    module, _, attribute = name.partition(":")
+    return getattr(importlib.import_module(module), attribute)()
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, in bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class WebSearchService:
+    """
+    Web search shared by every chat.
+
+    Results are cached per normalized query for `ttl` seconds. Concurrent searches
+    for the same query wait on a single request, and requests to the backend are
+    rate limited by a token bucket so bursts of chats stay under the provider's limits.
+    Failed searches are not cached.
+    """
+
+    def __init__(self, backend: Optional[SearchBackend] = None, ttl: float = WEB_SEARCH_CACHE_TTL,
+                 max_entries: int = WEB_SEARCH_CACHE_MAX_ENTRIES, rate: float = WEB_SEARCH_RATE,
+                 burst: int = WEB_SEARCH_BURST):
+        self._backend = backend
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.limiter = TokenBucket(rate, burst)
+        self._cache: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def backend(self) -> SearchBackend:
+        """The search backend, loaded from the configuration on first use"""
+        if self._backend is None:
+            self._backend = load_backend()
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend: SearchBackend):
+        self._backend = backend
+        self.clear()
+
+    def clear(self):
+        self._cache.clear()
+
+    async def search(self, query: str) -> str:
+        """Return the result snippets for a query from the cache, an in-flight search, or the backend"""
+        key = normalize_query(query)
+
+        hit = self._cache.get(key)
+        if hit is not None:
+            results, expires_at = hit
+            if expires_at > time.time():
+                self._cache.move_to_end(key)
+                return results
+            del self._cache[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            await self.limiter.acquire()
+            results = await self.backend.search(query)
+        except Exception as e:
+            logger.warning(f"Web search failed for {query!r}: {str(e)}")
+            future.set_exception(e)
+            # Retrieve the exception so it is not reported when no one else waited
+            future.exception()
+            raise
+        else:
+            future.set_result(results)
+            self._cache[key] = (results, time.time() + self.ttl)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            return results
+        finally:
+            del self._inflight[key]
+            if not future.done():
+                future.cancel()
+
+
+web_search_service = WebSearchService()
@@ -1,45 +1,354 @@
-from typing import List
-from langchain.schema import Document
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import asyncio
+import hashlib
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 import os
+from app.core.config import (
+    CHROMA_HOST,
+    CHROMA_PERSIST_DIRECTORY,
+    CHROMA_PORT,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MODEL,
+)
+from app.models.chunking import ChunkingSettings
+from app.services.bm25_service import BM25Index
+from app.services.chunking_service import TokenChunker, load_chunking_overrides
+from app.services.embedding_service import CachedEmbeddings
+from app.services.fingerprint_service import FingerprintIndex
 from app.utils.logging import logger
+from app.utils.metrics import metrics, span
 from dotenv import load_dotenv
-# import chromadb
 load_dotenv()
 
-class VectorStoreService:
+if TYPE_CHECKING:
+    import chromadb
+    import httpx
+    from langchain_chroma import Chroma
+
+COLLECTION_SUFFIX = "_vectorstore"
+LEGACY_ALL_COMPANIES = f"all_companies{COLLECTION_SUFFIX}"
+
+NEAR_DUPLICATES = metrics.counter("itk_near_duplicate_chunks_total", "Chunks dropped as near-duplicates of a stored chunk")
+
+
+def chunk_id(chunk: Document) -> str:
+    """Deterministic ID for a chunk from its source URL, offset in the page and content hash"""
+    content_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+    key = f"{chunk.metadata.get('source', '')}|{chunk.metadata.get('start_index', '')}|{content_hash}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class CollectionRegistry:
+    """
+    Process-wide cache of opened Chroma collection handles keyed by normalized company name.
+
+    Handles are created lazily on first use. Creation is serialized so concurrent
+    coroutines asking for the same collection share one handle, and so the Chroma
+    client for the persist directory is never initialised from two threads at once.
+    """
+
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000,chunk_overlap=100)
-        self.embeddings = OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"), model='text-embedding-3-small')
-        # self.chroma_client = chromadb.HttpClient(host='localhost', port=8000)
+        self._handles: Dict[str, "Chroma"] = {}
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def normalize(company: str) -> str:
+        return company.strip().lower()
+
+    async def get(self, company: str, factory: Callable[[str], "Chroma"]) -> "Chroma":
+        """Return the handle for a company, building it with `factory` on first use"""
+        key = self.normalize(company)
+        handle = self._handles.get(key)
+        if handle is not None:
+            return handle
+
+        async with self._lock:
+            if key not in self._handles:
+                self._handles[key] = await asyncio.to_thread(factory, key)
+        return self._handles[key]
+
+    def discard(self, company: str):
+        """Forget a handle, e.g. after its collection was deleted"""
+        self._handles.pop(self.normalize(company), None)
+
+    def items(self) -> List[Tuple[str, "Chroma"]]:
+        return list(self._handles.items())
+
+
+collection_registry = CollectionRegistry()
+
+
+class VectorStoreService:
+    def __init__(self, embeddings: Optional[Embeddings] = None, keyword_index: Optional[BM25Index] = None,
+                 fingerprints: Optional[FingerprintIndex] = None,
+                 chunking_overrides: Optional[Dict[str, ChunkingSettings]] = None,
+                 http_client: Optional["httpx.Client"] = None,
+                 http_async_client: Optional["httpx.AsyncClient"] = None):
+        self.chunking_overrides = load_chunking_overrides() if chunking_overrides is None else chunking_overrides
+        self._chunkers: Dict[str, TokenChunker] = {}
+        if embeddings is None:
+            from langchain_openai import OpenAIEmbeddings
+            embeddings = OpenAIEmbeddings(
+                api_key=os.getenv("OPENAI_API_KEY"), model=EMBEDDING_MODEL, chunk_size=EMBEDDING_BATCH_SIZE,
+                http_client=http_client, http_async_client=http_async_client
+            )
+        self.embeddings = CachedEmbeddings(embeddings, model=EMBEDDING_MODEL)
+        self.keyword_index = keyword_index or BM25Index()
+        self.fingerprints = fingerprints or FingerprintIndex()
+        self._chroma_client = None
+        self._chroma_client_lock = threading.Lock()
+
+    def chroma_client(self) -> "chromadb.ClientAPI":
+        """
+        Client of the Chroma server at ITK_CHROMA_HOST, or of the local persist directory
+        when no host is set. Only a server is safe to write to from several processes.
+        """
+        with self._chroma_client_lock:
+            if self._chroma_client is None:
+                import chromadb
+                if CHROMA_HOST:
+                    self._chroma_client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+                else:
+                    self._chroma_client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIRECTORY)
+            return self._chroma_client
+
+    def _open_vectorstore(self, company: str) -> "Chroma":
+        from langchain_chroma import Chroma
+        with span("vectorstore.open", company=company):
+            return Chroma(
+                client=self.chroma_client(),
+                collection_name=f'{company}{COLLECTION_SUFFIX}',
+                embedding_function=self.embeddings
+            )
 
     async def get_or_create_vectorstore(self, company: str):
         try:    
-            langchain_chroma = Chroma(
-                # client=self.chroma_client,
-                collection_name=f'{company.strip().lower()}_vectorstore',
-                embedding_function=self.embeddings,
-                persist_directory=f'./chroma_db'
-            )
-            return langchain_chroma
+            return await collection_registry.get(company, self._open_vectorstore)
         
         except Exception as e:
             logger.error(f"Error creating vectorstore: {str(e)}")
             raise
 
-    async def embed_documets(self, company: str, docs: List[Document]) -> list:
-        try:    
-            vector_store = await self.get_or_create_vectorstore(company)
-            text = self.text_splitter.split_documents(docs)
-            await vector_store.aadd_documents(text)
+    async def list_companies(self) -> List[str]:
+        """Normalized names of the companies that have a collection in the store"""
+        entries = await asyncio.to_thread(self.chroma_client().list_collections)
+        names = [entry if isinstance(entry, str) else entry.name for entry in entries]
+        return sorted(
+            name[:-len(COLLECTION_SUFFIX)] for name in names
+            if name.endswith(COLLECTION_SUFFIX) and name != LEGACY_ALL_COMPANIES
+        )
+
+    async def delete_company(self, company: str):
+        """Delete a company's collection with its keyword and fingerprint indexes"""
+        name = collection_registry.normalize(company)
+        collection_registry.discard(name)
+        try:
+            await asyncio.to_thread(self.chroma_client().delete_collection, f"{name}{COLLECTION_SUFFIX}")
+        except Exception as e:
+            logger.warning(f"No collection deleted for {name}: {str(e)}")
+        self.keyword_index.delete_company(name)
+        self.fingerprints.delete_company(name)
 
-            logger.info(f"web content successfully added to {company}")
+    async def warmup(self, companies: Iterable[str]):
+        """Open the collections of every company ahead of the first request"""
+        names = list(dict.fromkeys(companies))
+        await asyncio.gather(*(self.get_or_create_vectorstore(name) for name in names))
+        logger.info(f"Warmed up {len(names)} vector store collections")
 
-            all_companies = await self.get_or_create_vectorstore('all_companies')
-            await all_companies.aadd_documents(text)
+    async def health(self) -> Dict:
+        """Report the opened collections and their chunk counts, and whether the Chroma server answers"""
+        try:
+            report = {"status": "healthy"}
+            if CHROMA_HOST:
+                await asyncio.to_thread(self.chroma_client().heartbeat)
+                report["server"] = f"{CHROMA_HOST}:{CHROMA_PORT}"
+            collections = {}
+            for name, handle in collection_registry.items():
+                collections[name] = await asyncio.to_thread(handle._collection.count)
+            report["collections"] = collections
+            return report
+
+        except Exception as e:
+            logger.error(f"Vector store health check failed: {str(e)}")
+            return {"status": "unhealthy", "error": str(e)}
+
+    async def delete_sources(self, vector_store: "Chroma", sources: List[str], keep_ids: List[str] = ()) -> int:
+        """Delete the chunks split from the given source URLs, except those in `keep_ids`"""
+        if not sources:
+            return 0
+        existing = await asyncio.to_thread(vector_store.get, where={"source": {"$in": list(sources)}}, include=[])
+        keep = set(keep_ids)
+        ids = [id_ for id_ in existing.get("ids", []) if id_ not in keep]
+        if ids:
+            await asyncio.to_thread(vector_store.delete, ids=ids)
+        return len(ids)
+
+    async def upsert_documents(self, vector_store: "Chroma", chunks: List[Document], sources: List[str],
+                               embeddings: Optional[List[List[float]]] = None):
+        """
+        Upsert chunks under their deterministic IDs and drop stale chunks of the same sources.
+        Precomputed `embeddings` are written as-is so a vector can be shared between collections.
+        """
+        # Identical chunks from the same source collapse onto one ID
+        unique = {}
+        for i, chunk in enumerate(chunks):
+            unique[chunk_id(chunk)] = i
+        ids = list(unique)
+        await self.delete_sources(vector_store, sources, keep_ids=ids)
+        if not ids:
+            return
+
+        if embeddings is None:
+            embeddings = await self.embeddings.aembed_documents([chunk.page_content for chunk in chunks])
+
+        await asyncio.to_thread(
+            vector_store._collection.upsert,
+            ids=ids,
+            embeddings=[embeddings[i] for i in unique.values()],
+            metadatas=[chunks[i].metadata for i in unique.values()],
+            documents=[chunks[i].page_content for i in unique.values()]
+        )
+
+    async def store_chunks(self, company: str, chunks: List[Document], sources: List[str],
+                           embeddings: Optional[List[List[float]]] = None):
+        """
+        Upsert already split chunks into the company collection and its keyword index,
+        replacing any chunks previously stored for the same source URLs. Queries across
+        companies fan out over the company collections, so nothing is duplicated into a shared one.
+        """
+        vector_store = await self.get_or_create_vectorstore(company)
+        with span("vectorstore.upsert", company=company, chunks=len(chunks)):
+            await self.upsert_documents(vector_store, chunks, sources, embeddings)
+        with span("vectorstore.keyword_index", company=company, chunks=len(chunks)):
+            await asyncio.to_thread(
+                self.keyword_index.replace_sources,
+                collection_registry.normalize(company),
+                sources,
+                [(chunk_id(chunk), chunk.metadata.get("source", ""), chunk.page_content) for chunk in chunks]
+            )
+
+        logger.info(f"web content successfully added to {company}")
+
+    def chunking_settings(self, company: str) -> ChunkingSettings:
+        """The company's chunking overrides, or the configured defaults"""
+        return self.chunking_overrides.get(collection_registry.normalize(company)) or ChunkingSettings()
+
+    def split_documents(self, company: str, docs: List[Document]) -> List[Document]:
+        """Split documents into chunks sized for the company"""
+        key = collection_registry.normalize(company)
+        if key not in self._chunkers:
+            settings = self.chunking_settings(company)
+            self._chunkers[key] = TokenChunker(settings.chunk_tokens, settings.overlap_tokens)
+        return self._chunkers[key].split_documents(docs)
+
+    async def drop_near_duplicates(self, company: str, chunks: List[Document],
+                                   sources: List[str]) -> Tuple[List[Document], List[str]]:
+        """
+        Record the fingerprints of the chunks split from `sources` and keep only those that
+        do not nearly duplicate a chunk already stored for the company.
+
+        Also returns the other sources that had chunks dropped as duplicates of a chunk
+        these replace. Those sources have to be stored again for their text to be searchable.
+        """
+        with span("vectorstore.dedupe", company=company, chunks=len(chunks)):
+            kept, orphaned = await asyncio.to_thread(
+                self.fingerprints.replace_sources,
+                collection_registry.normalize(company),
+                sources,
+                [(chunk_id(chunk), chunk.metadata.get("source", ""), chunk.page_content) for chunk in chunks],
+                self.chunking_settings(company).near_duplicate_distance
+            )
+        NEAR_DUPLICATES.inc(len(chunks) - len(kept))
+        return [chunks[i] for i in kept], orphaned
+
+    async def forget_fingerprints(self, company: str, sources: List[str]) -> List[str]:
+        """
+        Undo `drop_near_duplicates` for sources whose chunks could not be stored, so
+        later chunks are not dropped as duplicates of text that is not in the store.
+        Returns the other sources that have to be stored again.
+        """
+        return await asyncio.to_thread(
+            self.fingerprints.forget_sources, collection_registry.normalize(company), sources
+        )
+
+    async def embed_documets(self, company: str, docs: List[Document]) -> list:
+        """
+        Split and upsert documents into the company collection, replacing any chunks
+        previously stored for the same source URLs and leaving out near-duplicates.
+        Returns the other sources that have to be stored again, see `drop_near_duplicates`.
+        """
+        try:    
+            sources = list({doc.metadata["source"] for doc in docs})
+            text, orphaned = await self.drop_near_duplicates(company, self.split_documents(company, docs), sources)
+            try:
+                await self.store_chunks(company, text, sources)
+            except Exception:
+                await self.forget_fingerprints(company, sources)
+                raise
+            return orphaned
 
         except Exception as e:
             logger.error(f"Error embedding documents: {str(e)}")
             raise
+
+    def compact(self, batch_size: int = 1000) -> Dict[str, int]:
+        """
+        Remove duplicate chunks from every collection in the store, and the
+        legacy all_companies collection that duplicated every chunk. The fingerprint and
+        keyword indexes of each collection are rebuilt from the chunks kept.
+
+        Chunks are duplicates when they share a source URL and identical content, or
+        when their fingerprints are near-duplicates within the company; the first one
+        found is kept. Returns the number of chunks removed per collection.
+        """
+        client = self.chroma_client()
+        removed = {}
+
+        for entry in client.list_collections():
+            name = entry if isinstance(entry, str) else entry.name
+            collection = client.get_collection(name)
+
+            if name == LEGACY_ALL_COMPANIES:
+                removed[name] = collection.count()
+                client.delete_collection(name)
+                collection_registry.discard('all_companies')
+                self.keyword_index.delete_company('all_companies')
+                self.fingerprints.delete_company('all_companies')
+                logger.info(f"Dropped {name} with {removed[name]} chunks")
+                continue
+
+            seen = set()
+            duplicates = []
+            kept = []
+            offset = 0
+
+            while True:
+                page = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+                if not page["ids"]:
+                    break
+                for id_, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                    source = (metadata or {}).get("source", "")
+                    key = (source, hashlib.sha256((document or "").encode("utf-8")).hexdigest())
+                    if key in seen:
+                        duplicates.append(id_)
+                    else:
+                        seen.add(key)
+                        kept.append((id_, source, document or ""))
+                offset += len(page["ids"])
+
+            if name.endswith(COLLECTION_SUFFIX):
+                company = name[:-len(COLLECTION_SUFFIX)]
+                near = set(self.fingerprints.rebuild(company, kept, self.chunking_settings(company).near_duplicate_distance))
+                duplicates.extend(near)
+                kept = [chunk for chunk in kept if chunk[0] not in near]
+                self.keyword_index.rebuild(company, kept)
+
+            for i in range(0, len(duplicates), batch_size):
+                collection.delete(ids=duplicates[i:i + batch_size])
+
+            removed[name] = len(duplicates)
+            logger.info(f"Compacted {name}: removed {len(duplicates)} duplicate chunks, kept {len(kept)}")
+
+        return removed
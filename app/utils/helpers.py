@@ -1,22 +1,86 @@
-import os
-import pandas as pd
-from typing import List
+import json
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import tiktoken
+from typing import Any, Iterable, List, Optional, Tuple
+from pydantic import ValidationError
+from app.models.batch import BatchChatRequest, BatchChatResult
 
-def get_companies_from_csv(file_path: str) -> List[str]:
+def normalize_url(url: str) -> str:
     """
-    Read CSV file and return list of company names.
-    
-    Args:
-        file_path: Path to CSV file containing company data
-        
-    Returns:
-        List of company names from the CSV
+    Canonical form of a URL for matching: scheme, default port, "www.", fragment,
+    trailing slash and utm_* tracking parameters are dropped, and the remaining
+    query parameters are sorted.
     """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/")
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_")
+    ))
+    return f"{host}{path}" + (f"?{query}" if query else "")
+
+
+def sse_event(data: Any, event: Optional[str] = None) -> str:
+    """
+    Format a Server-Sent Event. The payload is JSON-encoded so tokens containing
+    newlines stay on a single `data:` line.
+    """
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def read_batch_requests(lines: Iterable[str], companies: Optional[List[str]] = None
+                        ) -> Tuple[List[BatchChatRequest], List[BatchChatResult]]:
+    """
+    Parse JSONL batch chat lines into requests. Lines that are not valid requests,
+    or name a company outside `companies`, are returned as error results.
+    """
+    requests, invalid = [], []
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            request = BatchChatRequest.model_validate_json(line)
+        except ValidationError as e:
+            invalid.append(BatchChatResult(id=f"line {line_number}", query="", error=str(e)))
+            continue
+
+        unknown = [
+            company for company in [request.company, *(request.companies or [])]
+            if company and companies is not None and company not in companies
+        ]
+        if unknown:
+            invalid.append(BatchChatResult(
+                id=request.id, query=request.query, company=request.company,
+                error=f"Unknown company: {', '.join(unknown)}"
+            ))
+            continue
+        requests.append(request)
+
+    return requests, invalid
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str) -> Optional[tiktoken.Encoding]:
     try:
-        if not os.path.exists(file_path):
-            return []
-        df = pd.read_csv(file_path)
-        return df['Company'].unique().tolist()
-    
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
     except Exception:
-        return []
+        # The encoding files could not be loaded, e.g. no network on first use
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Number of tokens `text` takes up for `model`, estimated at 4 characters per token without tiktoken"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text or "") // 4 + 1
+    return len(encoding.encode(text or "", disallowed_special=()))
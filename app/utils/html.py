@@ -0,0 +1,186 @@
+import re
+from typing import Iterator, List, Optional, Tuple
+from bs4 import BeautifulSoup
+from bs4.element import PreformattedString
+
+# Remove special characters but keep basic punctuation
+_CLEAN_TEXT_RE = re.compile(r'[^\w\s.,!?-]')
+_CLASS_WORD_RE = re.compile(r'[-_]+')
+
+PARSERS = ("html.parser", "lxml", "selectolax")
+
+# Elements whose text is never page content
+BOILERPLATE_TAGS = {
+    "script", "style", "noscript", "template", "nav", "footer", "aside",
+    "form", "button", "select", "iframe", "svg", "canvas", "dialog",
+}
+BOILERPLATE_ROLES = {"navigation", "contentinfo", "banner", "dialog", "alertdialog", "menu", "menubar"}
+# Words of an id or class token that mark cookie and consent banners, popups and the like
+BANNER_WORDS = {
+    "cookie", "cookies", "consent", "gdpr", "banner", "popup", "modal", "newsletter", "subscribe",
+    "breadcrumb", "breadcrumbs", "skip-link",
+}
+# Page-level elements, whose classes describe page state (e.g. "cookies-not-set", "modal-open") rather than their content
+PAGE_TAGS = {"html", "body", "main", "article"}
+
+# Elements that start a new block of text
+BLOCK_TAGS = {
+    "title", "p", "li", "dt", "dd", "td", "th", "caption", "blockquote", "pre", "figcaption",
+    "h1", "h2", "h3", "h4", "h5", "h6", "article", "section", "main", "div", "header", "body",
+}
+HEADING_TAGS = {"title", "h1", "h2", "h3", "h4", "h5", "h6"}
+
+# A block is (kind, text) where kind is "heading" or "text"
+Block = Tuple[str, str]
+
+# Starts a heading line in marked page text. clean_text strips "#", so text never starts with it
+HEADING_MARK = "# "
+
+
+def clean_text(text: str) -> str:
+    """Clean extracted text by removing special characters and surrounding whitespace"""
+    return _CLEAN_TEXT_RE.sub('', text).strip()
+
+
+def available_parser(parser: str) -> str:
+    """Return `parser` if its backend is installed, otherwise the built-in html.parser"""
+    try:
+        if parser == "lxml":
+            import lxml  # noqa: F401
+        elif parser == "selectolax":
+            import selectolax  # noqa: F401
+        elif parser != "html.parser":
+            return "html.parser"
+        return parser
+    except ImportError:
+        return "html.parser"
+
+
+def extract_text(html: str, parser: str = "html.parser") -> str:
+    """Join the stripped text nodes of a page, one per line"""
+    if parser == "selectolax":
+        from selectolax.lexbor import LexborHTMLParser
+
+        tree = LexborHTMLParser(html)
+        tree.strip_tags(["script", "style", "noscript", "template"])
+        return tree.root.text(separator=' \n', strip=True) if tree.root else ""
+
+    soup = BeautifulSoup(html, parser)
+    return ' \n'.join(soup.stripped_strings)
+
+
+def html_to_text(html: str, parser: str = "html.parser") -> str:
+    """
+    Extract and clean the text of a page.
+    Runs in the parse process pool, so it only takes and returns picklable values.
+    """
+    return clean_text(extract_text(html, parser))
+
+
+def _is_boilerplate(tag: str, attrs: dict) -> bool:
+    if tag in BOILERPLATE_TAGS:
+        return True
+    if (attrs.get("role") or "").lower() in BOILERPLATE_ROLES or attrs.get("aria-hidden") == "true":
+        return True
+    if tag in PAGE_TAGS:
+        return False
+    classes = attrs.get("class") or ""
+    if isinstance(classes, str):
+        classes = classes.split()
+    for token in [attrs.get("id") or "", *classes]:
+        token = token.lower()
+        if token in BANNER_WORDS or any(word in BANNER_WORDS for word in _CLASS_WORD_RE.split(token)):
+            return True
+    return False
+
+
+def _text_nodes(html: str, parser: str) -> Iterator[Tuple[str, Iterator[Tuple[object, str, dict]]]]:
+    """Yield each text node with its ancestors as (identity, tag, attributes), nearest first"""
+    if parser == "selectolax":
+        from selectolax.lexbor import LexborHTMLParser
+
+        def ancestors(node):
+            node = node.parent
+            while node is not None and node.tag != "-document":
+                yield node.mem_id, node.tag, node.attributes
+                node = node.parent
+
+        tree = LexborHTMLParser(html)
+        for node in tree.root.traverse(include_text=True) if tree.root else []:
+            if node.tag == "-text":
+                yield node.text_content, ancestors(node)
+        return
+
+    soup = BeautifulSoup(html, parser)
+    for string in soup.find_all(string=True):
+        if isinstance(string, PreformattedString):
+            continue
+        yield str(string), ((id(tag), tag.name, tag.attrs) for tag in string.parents if tag.name != "[document]")
+
+
+def extract_blocks(html: str, parser: str = "html.parser", min_words: int = 3,
+                   max_link_density: float = 0.5) -> Tuple[List[Block], int]:
+    """
+    Extract the main content of a page as cleaned blocks of text.
+
+    Text inside script, style, navigation, footer, form and cookie or consent banners
+    is dropped. The remaining text is grouped by its nearest block-level element,
+    and a block is kept when it is a heading, or when it has at least `min_words`
+    words and no more than `max_link_density` of its text inside links.
+
+    Returns the blocks and all the text on the page, one text node per line.
+    Runs in the parse process pool, so it only takes and returns picklable values.
+    """
+    page_text = []
+    blocks = {}
+
+    for text, ancestors in _text_nodes(html, parser):
+        text = text.strip()
+        if not text:
+            continue
+        page_text.append(text)
+
+        block_key: Optional[object] = None
+        block_tag = "body"
+        in_link = False
+        skip = False
+        for key, tag, attrs in ancestors:
+            if _is_boilerplate(tag, attrs):
+                skip = True
+                break
+            if tag == "a":
+                in_link = True
+            if block_key is None and tag in BLOCK_TAGS:
+                block_key, block_tag = key, tag
+        if skip:
+            continue
+
+        texts, link_chars, _ = blocks.setdefault(block_key, ([], [0], block_tag))
+        texts.append(text)
+        if in_link:
+            link_chars[0] += len(text)
+
+    result = []
+    for texts, link_chars, tag in blocks.values():
+        text = clean_text(" ".join(texts))
+        if not text:
+            continue
+        if tag in HEADING_TAGS:
+            result.append(("heading", text))
+            continue
+        if link_chars[0] / max(len(" ".join(texts)), 1) > max_link_density:
+            continue
+        if len(text.split()) < min_words:
+            continue
+        result.append(("text", text))
+
+    return result, "\n".join(page_text)
+
+
+def blocks_to_text(blocks: List[Block]) -> str:
+    return ' \n'.join(text for _, text in blocks)
+
+
+def blocks_to_marked_text(blocks: List[Block]) -> str:
+    """Page text with every heading on a line of its own starting with HEADING_MARK"""
+    return ' \n'.join(f"{HEADING_MARK}{text}" if kind == "heading" else text for kind, text in blocks)
@@ -1,5 +1,8 @@
+import json
 import logging
+from datetime import datetime, timezone
 from typing import Optional
+from app.core.config import METRICS_LOG
 
 def get_logger(name: Optional[str] = None) -> logging.Logger:
 
@@ -23,3 +26,38 @@ def get_logger(name: Optional[str] = None) -> logging.Logger:
 
 logger = get_logger(__name__)
 
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the event name and its fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        return json.dumps(payload, default=str)
+
+
+def get_event_logger(name: str = "itk.events") -> logging.Logger:
+
+    event_logger = logging.getLogger(name)
+
+    if not event_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        event_logger.addHandler(handler)
+        event_logger.setLevel(logging.INFO if METRICS_LOG else logging.WARNING)
+        event_logger.propagate = False
+
+    return event_logger
+
+event_logger = get_event_logger()
+
+
+def log_event(event: str, **fields):
+    """Write a structured event, such as a timing span or a fetch outcome, as a JSON line"""
+    if event_logger.isEnabledFor(logging.INFO):
+        event_logger.info(event, extra={"fields": fields})
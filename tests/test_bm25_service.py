@@ -0,0 +1,48 @@
+import pytest
+from app.services.bm25_service import BM25Index, tokenize
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(path=str(tmp_path / "bm25.db"))
+    index.replace_sources("acme", ["a", "b"], [
+        ("a1", "a", "Acme rockets are built in Lagos"),
+        ("a2", "a", "The Acme board approved the XR-7 launch"),
+        ("b1", "b", "Careers at Acme: engineers and technicians wanted"),
+    ])
+    yield index
+    index.close()
+
+
+def test_tokenize_drops_stopwords_and_splits_codes():
+    assert tokenize("The XR-7 is an Acme rocket") == ["xr", "7", "acme", "rocket"]
+
+
+def test_search_ranks_exact_terms(index):
+    assert [id_ for id_, _ in index.search("acme", "XR-7 launch", 3)] == ["a2"]
+    assert [id_ for id_, _ in index.search("acme", "Lagos rockets", 3)][0] == "a1"
+    assert index.search("acme", "the of", 3) == []
+    assert index.search("globex", "rockets", 3) == []
+
+
+def test_rarer_terms_score_higher(index):
+    scores = dict(index.search("acme", "acme lagos", 3))
+    # "acme" is in every chunk, "lagos" only in a1
+    assert scores["a1"] > scores["a2"]
+
+
+def test_replacing_a_source_drops_its_old_chunks(index):
+    index.replace_sources("acme", ["a"], [("a3", "a", "Acme moved its rocket works to Accra")])
+    assert index.search("acme", "Lagos", 3) == []
+    assert [id_ for id_, _ in index.search("acme", "Accra", 3)] == ["a3"]
+    assert [id_ for id_, _ in index.search("acme", "engineers", 3)] == ["b1"]
+
+
+def test_companies_and_rebuild(index):
+    index.rebuild("globex", [("g1", "g", "Globex insurance")])
+    assert index.companies() == ["acme", "globex"]
+    assert index.rank_companies("globex insurance", ["acme", "globex"], 1) == ["globex"]
+    assert index.rank_companies("weather", ["acme", "globex"], 2) == []
+
+    index.delete_company("globex")
+    assert index.companies() == ["acme"]
@@ -0,0 +1,112 @@
+import asyncio
+from typing import List
+import pytest
+from langchain_core.embeddings import Embeddings
+from app.services.cache_service import ResponseCache, normalize_query
+
+
+class WordEmbeddings(Embeddings):
+    """Bag-of-words vectors over a tiny vocabulary, enough to tell paraphrases apart"""
+
+    VOCABULARY = ["acme", "revenue", "founded", "when", "what", "is", "was", "the"]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        words = text.lower().rstrip("?").split()
+        return [float(words.count(word)) for word in self.VOCABULARY]
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(enabled=True, exact_ttl=60, semantic_ttl=60, similarity=0.9, max_entries=10)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def answer(cache: ResponseCache, *args, **kwargs):
+    return run(cache.lookup(*args, **kwargs))[0]
+
+
+def test_normalize_query():
+    assert normalize_query("  When was   Acme founded?? ") == "when was acme founded"
+
+
+def test_exact_hits_are_scoped_by_company_and_mode(cache):
+    run(cache.put("When was Acme founded?", "Acme", "1999", mode="structured"))
+
+    assert answer(cache, "when was acme founded", "acme", mode="structured") == "1999"
+    assert answer(cache, "when was acme founded", "Globex", mode="structured") is None
+    assert answer(cache, "when was acme founded", "acme", mode="direct") is None
+
+
+def test_semantic_hits_are_scoped_by_mode(cache):
+    embeddings = WordEmbeddings()
+    run(cache.put("When was Acme founded", "acme", "1999", embeddings, mode="direct"))
+
+    assert answer(cache, "Acme was founded when", "acme", embeddings, mode="direct") == "1999"
+    assert answer(cache, "Acme was founded when", "acme", embeddings, mode="structured") is None
+    assert answer(cache, "What is the Acme revenue", "acme", embeddings, mode="direct") is None
+
+
+def test_expired_entries_are_not_returned(cache):
+    cache.exact_ttl = cache.semantic_ttl = -1
+    run(cache.put("When was Acme founded", "acme", "1999", WordEmbeddings()))
+    assert answer(cache, "When was Acme founded", "acme", WordEmbeddings()) is None
+
+
+def test_invalidate_drops_the_company_and_all_company_answers(cache):
+    embeddings = WordEmbeddings()
+    run(cache.put("When was Acme founded", "acme", "1999", embeddings))
+    run(cache.put("When was Acme founded", "acme,globex", "1999", embeddings))
+    run(cache.put("When was Acme founded", None, "1999", embeddings))
+    run(cache.put("When was Globex founded", "globex", "2001", embeddings))
+
+    cache.invalidate("Acme")
+
+    assert answer(cache, "When was Acme founded", "acme", embeddings) is None
+    assert answer(cache, "When was Acme founded", "acme,globex", embeddings) is None
+    assert answer(cache, "When was Acme founded", None, embeddings) is None
+    assert answer(cache, "When was Globex founded", "globex", embeddings) == "2001"
+
+
+def test_exact_tier_is_bounded(cache):
+    cache.max_entries = 2
+    for year in ("1999", "2000", "2001"):
+        run(cache.put(f"query {year}", "acme", year))
+    assert answer(cache, "query 1999", "acme") is None
+    assert answer(cache, "query 2001", "acme") == "2001"
+
+
+class CountingEmbeddings(WordEmbeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return super().embed_documents(texts)
+
+
+def test_a_miss_hands_back_its_query_embedding(cache):
+    embeddings = CountingEmbeddings()
+    cached, vector = run(cache.lookup("When was Acme founded", "acme", embeddings))
+    assert cached is None and vector == embeddings.embed_query("When was Acme founded")
+
+    run(cache.put("When was Acme founded", "acme", "1999", embeddings, vector=vector))
+    assert embeddings.calls == 1
+    # An exact hit needs no embedding at all
+    assert run(cache.lookup("when was acme founded?", "acme", embeddings)) == ("1999", None)
+    assert embeddings.calls == 1
+
+
+def test_answers_older_than_the_refresh_version_are_skipped(cache):
+    embeddings = WordEmbeddings()
+    run(cache.put("When was Acme founded", "acme", "1999", embeddings, version=1))
+
+    assert answer(cache, "When was Acme founded", "acme", embeddings, version=1) == "1999"
+    assert answer(cache, "Acme was founded when", "acme", embeddings, version=1) == "1999"
+    assert answer(cache, "Acme was founded when", "acme", embeddings, version=2) is None
+    assert answer(cache, "When was Acme founded", "acme", embeddings, version=2) is None
@@ -0,0 +1,60 @@
+from langchain_core.documents import Document
+from app.services.chunking_service import TokenChunker
+from app.utils.helpers import count_tokens
+from app.utils.html import HEADING_MARK
+
+SENTENCE = "Acme builds reliable rockets for customers across the whole of West Africa."
+
+
+def page(*sections):
+    """Page text with a heading line per section"""
+    return "\n".join(f"{HEADING_MARK}{heading}\n" + "\n".join(lines) for heading, lines in sections)
+
+
+def test_short_sections_are_packed_into_one_chunk():
+    text = page(("About", ["Acme was founded in Lagos."]), ("Contact", ["Write to hello@acme.example."]))
+    chunks = TokenChunker(chunk_tokens=200, overlap_tokens=0).split_text(text)
+
+    assert len(chunks) == 1
+    assert chunks[0].start_index == 0 and chunks[0].section == "About"
+    assert "Lagos" in chunks[0].text and "hello@acme.example" in chunks[0].text
+
+
+def test_chunks_stay_within_the_token_budget():
+    text = page(("History", [SENTENCE] * 40), ("Products", [SENTENCE] * 40))
+    chunker = TokenChunker(chunk_tokens=64, overlap_tokens=16)
+    chunks = chunker.split_text(text)
+
+    assert len(chunks) > 2
+    for chunk in chunks:
+        assert chunk.tokens <= 64
+        assert sum(count_tokens(line, chunker.model) for line in chunk.text.split("\n")) <= 64
+
+
+def test_a_long_section_repeats_its_heading_and_overlaps():
+    lines = [f"Line {i}: {SENTENCE}" for i in range(30)]
+    chunks = TokenChunker(chunk_tokens=64, overlap_tokens=24).split_text(page(("History", lines)))
+
+    assert len(chunks) > 1
+    assert all(chunk.section == "History" and chunk.text.startswith(f"{HEADING_MARK}History") for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.text.split("\n")[-1] in chunk.text
+
+
+def test_an_overlong_sentence_is_split_into_words():
+    text = " ".join(["word"] * 400)
+    chunks = TokenChunker(chunk_tokens=32, overlap_tokens=0).split_text(text)
+
+    assert len(chunks) > 1
+    assert all(chunk.tokens <= 32 for chunk in chunks)
+    assert " ".join(chunk.text for chunk in chunks).split() == text.split()
+
+
+def test_documents_keep_their_metadata():
+    docs = [Document(page_content=page(("About", [SENTENCE])), metadata={"source": "https://acme.example/"})]
+    chunk, = TokenChunker(chunk_tokens=200).split_documents(docs)
+
+    assert chunk.metadata["source"] == "https://acme.example/"
+    assert chunk.metadata["section"] == "About"
+    assert chunk.metadata["start_index"] == 0
+    assert chunk.metadata["tokens"] > 0
@@ -0,0 +1,108 @@
+import asyncio
+import sqlite3
+import pytest
+from app.services.company_service import CompanyRegistry
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def seed_csv(tmp_path):
+    path = tmp_path / "companies.csv"
+    path.write_text(
+        "Company,URL\n"
+        "Acme,https://acme.example/\n"
+        "Acme,https://acme.example/about\n"
+        "Globex,not a url\n"
+        "Initech,\n"
+    )
+    return str(path)
+
+
+@pytest.fixture
+def registry(tmp_path, seed_csv):
+    registry = CompanyRegistry(path=str(tmp_path / "companies.db"), seed_csv=seed_csv)
+    yield registry
+    registry.close()
+
+
+def test_seeded_once_from_the_csv(tmp_path, seed_csv, registry):
+    assert registry.names() == ["Acme", "Globex", "Initech"]
+    assert run(registry.get_item("ACME"))["urls"] == ["https://acme.example/", "https://acme.example/about"]
+    assert run(registry.get_item("globex"))["urls"] == []
+
+    # Removed companies are not seeded again when the registry is reopened
+    run(registry.delete_item("Initech"))
+    reopened = CompanyRegistry(path=registry.path, seed_csv=seed_csv)
+    assert reopened.names() == ["Acme", "Globex"]
+    reopened.close()
+
+
+def test_save_adds_urls_to_the_same_company(registry):
+    company = run(registry.save_item({"name": " acme ", "urls": ["https://acme.example/careers"]}))
+    assert company["id"] == "acme" and company["name"] == "Acme"
+    assert company["urls"][-1] == "https://acme.example/careers" and len(company["urls"]) == 3
+
+    with pytest.raises(ValueError):
+        run(registry.save_item({"name": "Acme", "urls": ["ftp://acme.example/"]}))
+    with pytest.raises(ValueError):
+        run(registry.save_item({"name": " ", "urls": []}))
+
+
+def test_update_replaces_urls_and_respells_the_name(registry):
+    company = run(registry.update_item("acme", {"name": "ACME", "urls": ["https://acme.example/new"]}))
+    assert company["name"] == "ACME" and company["urls"] == ["https://acme.example/new"]
+
+    with pytest.raises(ValueError):
+        run(registry.update_item("acme", {"name": "Acme Rockets"}))
+    with pytest.raises(KeyError):
+        run(registry.update_item("umbrella", {"urls": []}))
+
+
+def test_remove_urls(registry):
+    company = run(registry.remove_urls("acme", ["https://acme.example/about"]))
+    assert company["urls"] == ["https://acme.example/"]
+    with pytest.raises(KeyError):
+        run(registry.remove_urls("umbrella", ["https://umbrella.example/"]))
+
+
+def test_url_companies(registry):
+    run(registry.save_item({"name": "Globex", "urls": ["https://acme.example/"]}))
+
+    assert registry.url_companies() == {
+        "https://acme.example/": ["Acme", "Globex"],
+        "https://acme.example/about": ["Acme"],
+    }
+    assert registry.url_companies(["https://acme.example/about", "https://unknown.example/"]) == {
+        "https://acme.example/about": ["Acme"]
+    }
+
+
+def test_names_see_changes_from_other_processes(registry):
+    assert registry.names() == ["Acme", "Globex", "Initech"]
+
+    other = sqlite3.connect(registry.path)
+    other.execute("INSERT INTO companies VALUES ('umbrella', 'Umbrella', '2024-01-01', '2024-01-01')")
+    other.commit()
+    other.close()
+
+    assert registry.names() == ["Acme", "Globex", "Initech", "Umbrella"]
+    run(registry.delete_item("umbrella"))
+    assert registry.names() == ["Acme", "Globex", "Initech"]
+
+
+def test_refresh_versions(registry):
+    assert registry.refresh_version() == 0
+    assert registry.bump_refresh("Acme") == 1
+    assert registry.bump_refresh("Globex") == 2
+    assert registry.refresh_version(["acme"]) == 1
+    assert registry.refresh_version(["Acme", "Globex"]) == registry.refresh_version() == 2
+    assert registry.refresh_version(["Initech"]) == 0
+
+    # A refresh in another process is seen on the next read
+    other = CompanyRegistry(path=registry.path)
+    assert other.bump_refresh("acme") == 3
+    other.close()
+    assert registry.refresh_version(["Acme"]) == 3
@@ -0,0 +1,74 @@
+import pytest
+from app.services.fingerprint_service import BANDS, MAX_DISTANCE, FingerprintIndex, _bands, simhash
+
+TEXT = "Acme builds reliable rockets for customers across the whole of West Africa from its Lagos base"
+NEAR = TEXT + " today"
+OTHER = "The annual report lists revenue, staff numbers and the board of directors for the last five years"
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = FingerprintIndex(path=str(tmp_path / "fingerprints.db"))
+    yield index
+    index.close()
+
+
+def test_simhash_is_stable_and_close_for_near_duplicates():
+    assert simhash(TEXT) == simhash(TEXT)
+    assert simhash("") == 0
+    assert (simhash(TEXT) ^ simhash(NEAR)).bit_count() < (simhash(TEXT) ^ simhash(OTHER)).bit_count()
+
+
+def test_fingerprints_within_max_distance_share_a_band():
+    fingerprint = simhash(TEXT)
+    # Flip MAX_DISTANCE bits, one in each band but the last
+    flipped = fingerprint
+    for band in range(MAX_DISTANCE):
+        flipped ^= 1 << (band * 16)
+    shared = [a == b for a, b in zip(_bands(fingerprint), _bands(flipped))]
+    assert len(shared) == BANDS
+    assert any(shared)
+
+
+def test_near_duplicates_of_another_source_are_dropped(index):
+    kept, orphaned = index.replace_sources("acme", ["a"], [("a1", "a", TEXT), ("a2", "a", OTHER)], MAX_DISTANCE)
+    assert kept == [0, 1] and orphaned == []
+
+    distance = (simhash(TEXT) ^ simhash(NEAR)).bit_count()
+    kept, _ = index.replace_sources("acme", ["b"], [("b1", "b", NEAR)], MAX_DISTANCE)
+    assert kept == ([] if distance <= MAX_DISTANCE else [0])
+
+    # Another company keeps its own copy
+    kept, _ = index.replace_sources("globex", ["a"], [("a1", "a", TEXT)], MAX_DISTANCE)
+    assert kept == [0]
+
+
+def test_negative_distance_keeps_every_chunk(index):
+    index.replace_sources("acme", ["a"], [("a1", "a", TEXT)], MAX_DISTANCE)
+    kept, _ = index.replace_sources("acme", ["b"], [("b1", "b", TEXT)], -1)
+    assert kept == [0]
+
+
+def test_replacing_a_kept_chunk_orphans_its_duplicates(index):
+    index.replace_sources("acme", ["a"], [("a1", "a", TEXT)], MAX_DISTANCE)
+    kept, _ = index.replace_sources("acme", ["b"], [("b1", "b", TEXT)], MAX_DISTANCE)
+    assert kept == []
+
+    kept, orphaned = index.replace_sources("acme", ["a"], [("a3", "a", OTHER)], MAX_DISTANCE)
+    assert kept == [0]
+    assert orphaned == ["b"]
+
+
+def test_forgetting_sources_that_failed_to_store(index):
+    index.replace_sources("acme", ["a"], [("a1", "a", TEXT)], MAX_DISTANCE)
+    index.replace_sources("acme", ["b"], [("b1", "b", TEXT)], MAX_DISTANCE)
+
+    # Storing "a" failed: its chunk no longer stands in for "b", which has to be stored again
+    assert index.forget_sources("acme", ["a"]) == ["b"]
+    kept, _ = index.replace_sources("acme", ["c"], [("c1", "c", TEXT)], MAX_DISTANCE)
+    assert kept == [0]
+
+
+def test_rebuild_reports_duplicates(index):
+    chunks = [("a1", "a", TEXT), ("b1", "b", TEXT), ("c1", "c", OTHER)]
+    assert index.rebuild("acme", chunks, MAX_DISTANCE) == ["b1"]
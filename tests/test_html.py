@@ -0,0 +1,38 @@
+import pytest
+from app.utils.html import extract_blocks
+
+ARTICLE = (
+    "<main><h1>About Acme</h1>"
+    "<p>Acme builds reliable rockets for customers across the whole of West Africa.</p>"
+    "<p>The company was founded in Lagos and now employs over two hundred engineers.</p></main>"
+)
+
+
+def texts(html: str):
+    blocks, _ = extract_blocks(html)
+    return [text for _, text in blocks]
+
+
+@pytest.mark.parametrize("body_class", ["home cookies-not-set", "modal-open", "has-banner", "page consent-given"])
+def test_page_state_classes_keep_the_page(body_class):
+    plain = texts(f"<html><body>{ARTICLE}</body></html>")
+    marked = texts(f'<html><body class="{body_class}">{ARTICLE}</body></html>')
+    assert marked == plain
+    assert "About Acme" in marked
+
+
+def test_banner_elements_are_dropped():
+    html = (
+        f"<body>{ARTICLE}"
+        '<div class="cookie-banner"><p>We use cookies to improve your experience on this site.</p></div>'
+        '<div id="newsletter_signup"><p>Subscribe to our newsletter for weekly updates and news.</p></div>'
+        "</body>"
+    )
+    kept = texts(html)
+    assert not any("cookies" in text or "newsletter" in text for text in kept)
+    assert "About Acme" in kept
+
+
+def test_class_words_match_whole_words_only():
+    html = f'<body><div class="bannerless-layout modality">{ARTICLE}</div></body>'
+    assert "About Acme" in texts(html)
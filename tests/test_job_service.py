@@ -0,0 +1,141 @@
+import pytest
+from app.services.job_service import JobStore, shard_of
+
+URLS = {f"https://acme.example/{i}": ["Acme"] for i in range(20)}
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    store = JobStore(path=str(tmp_path / "jobs.db"), lease_seconds=60, max_attempts=2)
+    yield store
+    store.close()
+
+
+def test_urls_are_split_into_stable_shards(jobs):
+    job, created = jobs.create("registry", URLS, shards=4)
+    assert created and job.status == "pending" and job.total == len(URLS)
+
+    for shard in range(4):
+        pending = jobs.pending_urls(job.id, shard)
+        assert all(shard_of(url, 4) == shard for url in pending)
+    assert sum(len(jobs.pending_urls(job.id, shard)) for shard in range(4)) == len(URLS)
+
+
+def test_a_leased_shard_is_not_claimed_twice(jobs):
+    job, _ = jobs.create("registry", URLS, shards=2)
+    first = jobs.claim_shard(job.id, "worker-1")
+    second = jobs.claim_shard(job.id, "worker-2")
+    assert {first, second} == {0, 1}
+    assert jobs.claim_shard(job.id, "worker-3") is None
+    assert jobs.get(job.id).status == "running"
+
+    assert jobs.renew(job.id, first, "worker-1")
+    assert not jobs.renew(job.id, first, "worker-2")
+
+
+def test_an_expired_lease_is_taken_over(jobs):
+    job, _ = jobs.create("registry", URLS, shards=1)
+    jobs.lease_seconds = -1
+    assert jobs.claim_shard(job.id, "worker-1") == 0
+    assert jobs.claim_shard(job.id, "worker-2") == 0
+    assert not jobs.renew(job.id, 0, "worker-1")
+
+
+def test_checkpoints_and_completion(jobs):
+    job, _ = jobs.create("registry", URLS, shards=1)
+    shard = jobs.claim_shard(job.id, "worker")
+    url = next(iter(URLS))
+    jobs.checkpoint(job.id, url, "stored")
+    assert url not in jobs.pending_urls(job.id, shard)
+    assert not jobs.finish_if_complete(job.id)
+
+    jobs.release(job.id, shard, "worker", done=True)
+    assert jobs.finish_if_complete(job.id)
+    job = jobs.get(job.id)
+    assert job.status == "completed" and job.counts == {"stored": 1, "pending": len(URLS) - 1}
+
+
+def test_full_jobs_join_and_partial_jobs_queue(jobs):
+    full, _ = jobs.create("registry", URLS)
+    again, created = jobs.create("registry", URLS)
+    assert not created and again.id == full.id
+
+    covered, created = jobs.create("registry", dict(list(URLS.items())[:2]), kind="partial")
+    assert not created and covered.id == full.id
+
+    retry, created = jobs.create("registry", {"https://globex.example/": ["Globex"]}, kind="partial")
+    assert created and retry.status == "pending"
+    assert jobs.active().id == full.id
+
+    # A full job does not join a partial one
+    jobs.release(full.id, jobs.claim_shard(full.id, "worker"), "worker", done=True)
+    jobs.finish_if_complete(full.id)
+    assert jobs.active().id == retry.id
+    _, created = jobs.create("registry", URLS)
+    assert created
+
+
+def test_a_shard_out_of_attempts_fails_the_job(jobs):
+    job, _ = jobs.create("registry", URLS, shards=1)
+    for attempt in range(2):
+        assert jobs.claim_shard(job.id, f"worker-{attempt}") == 0
+        jobs.record_error(job.id, "RuntimeError('boom')")
+        jobs.release(job.id, 0, f"worker-{attempt}", done=False)
+    assert jobs.get(job.id).shard_status[0].attempts == 2
+
+    assert jobs.claim_shard(job.id, "worker-2") is None
+    job = jobs.get(job.id)
+    assert job.status == "failed"
+    assert "2 attempts" in job.error and "boom" in job.error
+    assert jobs.active() is None
+
+    # New jobs are no longer held behind it
+    _, created = jobs.create("registry", URLS)
+    assert created
+
+
+def test_a_failed_job_is_not_claimed_again(jobs):
+    job, _ = jobs.create("registry", URLS, shards=2)
+    for attempt in range(2):
+        assert jobs.claim_shard(job.id, f"worker-{attempt}", shards=[0]) == 0
+        jobs.release(job.id, 0, f"worker-{attempt}", done=False)
+    assert jobs.claim_shard(job.id, "worker-2", shards=[0]) is None
+    assert jobs.get(job.id).status == "failed"
+
+    # Shard 1 is still free, but the job stays failed
+    assert jobs.claim_shard(job.id, "worker-3", shards=[1]) is None
+    assert jobs.claim_shard(job.id, "worker-3") is None
+    job = jobs.get(job.id)
+    assert job.status == "failed" and job.shard_status[1].attempts == 0
+
+
+def test_named_leases(jobs):
+    assert jobs.acquire_lease("scheduler", "a")
+    assert jobs.acquire_lease("scheduler", "a")
+    assert not jobs.acquire_lease("scheduler", "b")
+    jobs.release_lease("scheduler", "a")
+    assert jobs.acquire_lease("scheduler", "b")
+
+
+def test_old_stores_are_migrated(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE scrape_jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, trigger TEXT NOT NULL,
+            source TEXT NOT NULL, force INTEGER NOT NULL, shards INTEGER NOT NULL, created_at TEXT NOT NULL,
+            started_at TEXT, finished_at TEXT, error TEXT);
+        CREATE TABLE scrape_shard_leases (job_id TEXT NOT NULL, shard INTEGER NOT NULL, owner TEXT, expires REAL,
+            done INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (job_id, shard));
+        INSERT INTO scrape_jobs VALUES ('old', 'pending', 'cli', 'registry', 0, 1, '2024-01-01', NULL, NULL, NULL);
+        INSERT INTO scrape_shard_leases (job_id, shard) VALUES ('old', 0);
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    store = JobStore(path=path)
+    job = store.get("old")
+    assert job.kind == "full" and job.shard_status[0].attempts == 0
+    store.close()
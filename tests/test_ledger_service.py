@@ -0,0 +1,76 @@
+from datetime import datetime
+import pytest
+from app.services.ledger_service import FetchLedger
+
+URL = "https://acme.example/about"
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = FetchLedger(path=str(tmp_path / "ledger.db"), retry_base=60, retry_max=300, retry_max_attempts=4)
+    yield ledger
+    ledger.close()
+
+
+def delay(ledger: FetchLedger, url: str = URL) -> float:
+    failure, = [failure for failure in ledger.failures() if failure.url == url]
+    return (datetime.fromisoformat(failure.next_retry_at) - datetime.fromisoformat(failure.last_failed_at)).total_seconds()
+
+
+def test_conditional_headers_follow_the_last_fetch(ledger):
+    assert ledger.conditional_headers(URL) == {}
+    ledger.record(URL, "hash", etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+    assert ledger.conditional_headers(URL) == {
+        "If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"
+    }
+
+    ledger.delete(URL)
+    assert ledger.get(URL) is None
+
+
+def test_retry_delay_doubles_up_to_the_cap(ledger):
+    delays = []
+    for _ in range(3):
+        ledger.record_failure(URL, "blocked", status=429)
+        delays.append(delay(ledger))
+    assert delays == [60, 120, 240]
+
+    ledger.retry_max_attempts = 10
+    ledger.record_failure(URL, "blocked", status=429)
+    assert delay(ledger) == 300
+
+
+def test_urls_leave_the_queue_after_max_attempts(ledger):
+    for _ in range(4):
+        ledger.record_failure(URL, "failed", error="timeout")
+    failure, = ledger.failures()
+    assert failure.consecutive_failures == 4 and failure.next_retry_at is None
+
+
+def test_due_retries(ledger):
+    ledger.retry_base = 0
+    ledger.record_failure(URL, "failed", error="timeout")
+    ledger.retry_base = 3600
+    ledger.record_failure("https://acme.example/later", "failed", error="timeout")
+    assert ledger.due_retries() == [URL]
+
+
+def test_success_clears_the_streak_but_keeps_the_total(ledger):
+    ledger.record_failure(URL, "failed", error="timeout")
+    ledger.record_failure(URL, "failed", error="timeout")
+    ledger.clear_failure(URL)
+    assert ledger.failures() == []
+
+    failure, = ledger.failures(failing_only=False)
+    assert failure.consecutive_failures == 0 and failure.total_failures == 2 and failure.next_retry_at is None
+
+    # A new streak starts again from the base delay
+    ledger.record_failure(URL, "failed", error="timeout")
+    assert delay(ledger) == 60
+
+
+def test_delete_failures(ledger):
+    ledger.record_failure(URL, "failed", error="timeout")
+    ledger.record_failure("https://acme.example/other", "failed", error="timeout")
+    ledger.delete_failures([URL])
+    assert [failure.url for failure in ledger.failures()] == ["https://acme.example/other"]
@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from app.services.bm25_service import BM25Index
+from app.services.retrieval_service import Hit, RetrievalService
+
+
+@pytest.fixture
+def keyword_index(tmp_path):
+    index = BM25Index(path=str(tmp_path / "bm25.db"))
+    index.replace_sources("acme", ["a"], [("a1", "a", "Acme builds reliable rockets in Lagos")])
+    index.replace_sources("globex", ["g"], [("g1", "g", "Globex sells insurance and rocket insurance")])
+    index.replace_sources("initech", ["i"], [("i1", "i", "Initech writes banking software")])
+    yield index
+    index.close()
+
+
+def retrieval(keyword_index, names, max_companies):
+    async def list_companies():
+        raise AssertionError("the registry is the source of the companies")
+
+    vector_store_service = SimpleNamespace(keyword_index=keyword_index, list_companies=list_companies)
+    return RetrievalService(vector_store_service, companies=lambda: names, max_companies=max_companies)
+
+
+def test_known_companies_are_registered_and_indexed(keyword_index):
+    service = retrieval(keyword_index, ["Acme", "Globex", "Initech", "Unscraped"], 0)
+    assert asyncio.run(service._known_companies()) == ["Acme", "Globex", "Initech"]
+
+
+def test_unscoped_queries_search_at_most_max_companies(keyword_index):
+    service = retrieval(keyword_index, ["Acme", "Globex", "Initech"], 2)
+    known = asyncio.run(service._known_companies())
+
+    assert asyncio.run(service._pick_companies("banking software", known)) == ["initech", "acme"]
+    assert asyncio.run(service._pick_companies("insurance", known)) == ["globex", "acme"]
+    assert len(asyncio.run(service._pick_companies("weather", known))) == 2
+
+
+def test_without_a_cap_every_company_is_searched(keyword_index):
+    service = retrieval(keyword_index, ["Acme", "Globex", "Initech"], 0)
+    known = asyncio.run(service._known_companies())
+    assert asyncio.run(service._pick_companies("insurance", known)) == known
+
+
+def test_companies_named_in_the_query():
+    assert RetrievalService.companies_in_query("Who founded Acme?", ["Acme", "Acme Rockets", "Globex"]) == ["Acme"]
+
+
+def hit(embedding, vector=True, keyword_score=None, source=""):
+    return Hit(Document(page_content=source, metadata={"source": source}), np.asarray(embedding, dtype=np.float32),
+               vector, keyword_score)
+
+
+def test_rank_fusion_rewards_chunks_both_searches_found():
+    service = RetrievalService(SimpleNamespace(), hybrid=True, rrf_k=60)
+    hits = [hit([1, 0]), hit([0.9, 0.1], keyword_score=2.0), hit([0, 1], vector=False, keyword_score=5.0)]
+    fused = service._fuse(np.array([1.0, 0.9, 0.0], dtype=np.float32), hits)
+
+    assert fused.max() == pytest.approx(1.0)
+    # Second by similarity but found by both searches
+    assert int(np.argmax(fused)) == 1
+    # Top of the keyword ranking alone ties with the top of the vector ranking alone
+    assert fused[0] == pytest.approx(fused[2])
+
+
+def test_mmr_skips_near_copies():
+    hits = [hit([1, 0], source="a"), hit([0.99, 0.01], source="copy of a"), hit([0.6, 0.8], source="b")]
+    query = np.asarray([1, 0], dtype=np.float32)
+
+    diverse = RetrievalService(SimpleNamespace(), k=2, lambda_mult=0.3, hybrid=False)
+    assert [doc.metadata["source"] for doc in diverse._mmr(query, hits, 2)] == ["a", "b"]
+
+    relevance_only = RetrievalService(SimpleNamespace(), k=2, lambda_mult=1.0, hybrid=False)
+    assert [doc.metadata["source"] for doc in relevance_only._mmr(query, hits, 2)] == ["a", "copy of a"]
+
+
+def test_precomputed_query_vectors_are_not_embedded_again():
+    embedded = []
+
+    async def aembed_documents(texts):
+        embedded.extend(texts)
+        return [[0.0, 1.0] for _ in texts]
+
+    service = RetrievalService(SimpleNamespace(embeddings=SimpleNamespace(aembed_documents=aembed_documents)))
+    searched = []
+
+    async def query_collection(company, queries, vectors):
+        searched.extend(vectors)
+        return [[] for _ in queries]
+
+    service._query_collection = query_collection
+    asyncio.run(service.search_many(["cached", "new"], [["acme"], ["acme"]], vectors=[[1.0, 0.0], None]))
+    assert embedded == ["new"]
+    assert searched == [[1.0, 0.0], [0.0, 1.0]]
@@ -0,0 +1,59 @@
+import asyncio
+from collections import Counter
+from app.services.chunking_service import TokenChunker
+from app.services.scrape_service import BoilerplateFilter, CompanyWebScraper
+from app.utils.html import extract_blocks
+
+
+def fetch_everything(urls, max_concurrent, per_host_concurrent):
+    """Run fetch_all with a fake fetch, returning the handled URLs and the peak fetches per host"""
+    scraper = CompanyWebScraper(per_host_concurrent=per_host_concurrent, persistent_browser=True)
+    in_flight, peak, handled = Counter(), Counter(), []
+
+    async def fetch_page(url, session, conditional=True):
+        host = url.split("/")[2]
+        in_flight[host] += 1
+        peak[host] = max(peak[host], in_flight[host])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        return None
+
+    async def handle(index, url, page):
+        handled.append((index, url))
+
+    scraper.fetch_page = fetch_page
+    asyncio.run(scraper.fetch_all(urls, handle, max_concurrent=max_concurrent))
+    return handled, peak
+
+
+def test_every_url_is_handled_once_within_the_host_limit():
+    urls = [f"https://a.example/{i}" for i in range(12)] + [f"https://b.example/{i}" for i in range(3)]
+    handled, peak = fetch_everything(urls, max_concurrent=6, per_host_concurrent=2)
+
+    assert sorted(handled) == list(enumerate(urls))
+    assert peak == {"a.example": 2, "b.example": 2}
+
+
+def test_a_saturated_host_does_not_hold_back_the_others():
+    urls = [f"https://a.example/{i}" for i in range(10)] + ["https://b.example/0", "https://c.example/0"]
+    handled, _ = fetch_everything(urls, max_concurrent=3, per_host_concurrent=1)
+
+    # b and c are fetched alongside the first URLs of a, not after all of them
+    order = [url for _, url in handled]
+    assert order.index("https://b.example/0") < 3
+    assert order.index("https://c.example/0") < 3
+
+
+def test_boilerplate_filter_counts_the_chunks_it_saves():
+    article = "".join(f"<p>Acme shipped rocket number {i} to a customer in West Africa this year.</p>" for i in range(10))
+    menu = "".join(f"<li><a href='/{i}'>Menu entry {i} with a long label</a></li>" for i in range(60))
+    blocks, page_text = extract_blocks(f"<body><nav><ul>{menu}</ul></nav><main>{article}</main></body>")
+    chunker = TokenChunker(chunk_tokens=64, overlap_tokens=0)
+    boilerplate = BoilerplateFilter(chunker=chunker)
+
+    kept = boilerplate.filter("https://acme.example/", blocks, page_text)
+    assert kept == blocks
+    assert boilerplate.raw_bytes == len(page_text.encode("utf-8")) > boilerplate.indexed_bytes
+    assert boilerplate.chunks_saved == len(chunker.split_text(page_text)) - len(chunker.split_text(
+        "\n".join(text for _, text in blocks)
+    )) > 0